@@ -1,6 +1,38 @@
 load(":helpers.bzl", "write_executable_shell_script")
-load(":env_helpers.bzl", "python_runner_source")
-load(":xls_toolchain.bzl", "declare_xls_toolchain_toml", "get_tool_artifact_inputs", "require_tools_toolchain")
+load(":xls_toolchain.bzl", "declare_xls_toolchain_toml", "get_tool_artifact_inputs", "require_tools_toolchain", "resource_class_cpus", "run_xls_tool_action", "xlsynth_runner_attr")
+
+def _dslx_format_batched(ctx, runner, toolchain, toolchain_file, toolchain_inputs):
+    # One action formats every source from a thread pool inside the runner and
+    # writes a single report of unified diffs; the test only prints it. The
+    # pool is no larger than the CPUs the action's resource class reserves.
+    input_files = [src[DefaultInfo].files.to_list()[0] for src in ctx.attr.srcs]
+    report_file = ctx.actions.declare_file(ctx.label.name + ".fmt_report")
+    jobs = min(resource_class_cpus(ctx, toolchain, "DSLXFMTBATCH"), len(input_files))
+    run_xls_tool_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        tool = "dslx_fmt",
+        arguments = [input_file.path for input_file in input_files],
+        inputs = input_files + toolchain_inputs,
+        outputs = [report_file],
+        mnemonic = "DSLXFMTBATCH",
+        progress_message = "Checking formatting of %d DSLX files" % len(input_files),
+        runner_flags = ["--fmt_report", report_file.path, "--fmt_jobs", str(jobs)],
+    )
+
+    diff_script_file = write_executable_shell_script(
+        ctx = ctx,
+        filename = ctx.label.name + "-diff.sh",
+        cmd = 'if [ -s "{report}" ]; then cat "{report}"; exit 1; fi'.format(report = report_file.short_path),
+    )
+    return DefaultInfo(
+        runfiles = ctx.runfiles(files = [report_file, diff_script_file]),
+        files = depset(direct = [diff_script_file, report_file]),
+        executable = diff_script_file,
+    )
+
 
 def _dslx_format_impl(ctx):
     src_depset_files = ctx.attr.srcs
@@ -8,34 +40,31 @@ def _dslx_format_impl(ctx):
     input_files = []
     formatted_files = []
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = require_tools_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "dslx_fmt")
     toolchain_inputs = [toolchain_file] + get_tool_artifact_inputs(toolchain, "dslx_fmt")
 
+    if ctx.attr.batched:
+        return _dslx_format_batched(ctx, runner, toolchain, toolchain_file, toolchain_inputs)
+
     for src in src_depset_files:
         input_file = src[DefaultInfo].files.to_list()[0]
         input_files.append(input_file)
         formatted_file = ctx.actions.declare_file(input_file.basename + ".fmt")
         formatted_files.append(formatted_file)
 
-        ctx.actions.run(
+        run_xls_tool_action(
+            ctx,
+            runner = runner,
+            toolchain = toolchain,
+            toolchain_file = toolchain_file,
+            tool = "dslx_fmt",
+            arguments = [input_file.path],
             inputs = [input_file] + toolchain_inputs,
-            executable = runner,
             outputs = [formatted_file],
-            arguments=[
-                "tool",
-                "--toolchain",
-                toolchain_file.path,
-                "--runtime_library_path",
-                toolchain.runtime_library_path,
-                "--stdout_path",
-                formatted_file.path,
-                "dslx_fmt",
-                input_file.path,
-            ],
-            use_default_shell_env = False,
+            mnemonic = "DSLXFMT",
+            stdout = formatted_file,
         )
 
     diff_commands = []
@@ -60,8 +89,65 @@ dslx_fmt_test = rule(
     implementation=_dslx_format_impl,
     attrs={
         "srcs": attr.label_list(allow_files=[".x"], allow_empty=False, doc="Source files to check formatting"),
+        "batched": attr.bool(
+            default = False,
+            doc = "Format all srcs in one action, using a pool of dslx_fmt processes inside the runner, and report every difference in one consolidated diff.",
+        ),
+        "_runner": xlsynth_runner_attr(),
     },
     doc="A rule that checks if the given DSLX files are properly formatted.",
     test = True,
     toolchains = ["//:toolchain_type"],
 )
+
+
+def _dslx_fmt_workspace_impl(ctx):
+    runner = ctx.executable._runner
+    toolchain = require_tools_toolchain(ctx)
+    toolchain_file = declare_xls_toolchain_toml(ctx, name = "dslx_fmt")
+    cmd_parts = [
+        "/usr/bin/env",
+        "python3",
+        "-I",
+        "-S",
+        runner.short_path,
+        "tool",
+        "--toolchain",
+        toolchain_file.short_path,
+    ]
+    if toolchain.runtime_library_path:
+        cmd_parts.extend(["--runtime_library_path", toolchain.runtime_library_path])
+    cmd_parts.extend(["--fmt_in_place", ctx.attr.scope, "dslx_fmt"] + ctx.attr.paths)
+
+    # Arguments after `bazel run ... --` can narrow the paths or override the
+    # scope, e.g. `-- --fmt_in_place=changed:origin/main`.
+    cmd = " ".join(["\"{}\"".format(part) for part in cmd_parts]) + ' "$@"'
+    executable_file = write_executable_shell_script(
+        ctx = ctx,
+        filename = ctx.label.name + ".sh",
+        cmd = cmd,
+    )
+    return DefaultInfo(
+        runfiles = ctx.runfiles([runner, toolchain_file] + get_tool_artifact_inputs(toolchain, "dslx_fmt")),
+        files = depset(direct = [executable_file]),
+        executable = executable_file,
+    )
+
+
+dslx_fmt_workspace = rule(
+    implementation = _dslx_fmt_workspace_impl,
+    attrs = {
+        "scope": attr.string(
+            default = "all",
+            doc = "Which files to format: `all` .x files in the workspace, or only those `changed` relative to " +
+                  "git HEAD (`changed:<rev>` compares against another revision).",
+        ),
+        "paths": attr.string_list(
+            doc = "Workspace-relative directories or .x files to restrict formatting to. Defaults to the whole workspace.",
+        ),
+        "_runner": xlsynth_runner_attr(cfg = "target"),
+    },
+    doc = "A `bazel run` target that reformats DSLX files in place, in parallel, skipping files unchanged since its previous run.",
+    executable = True,
+    toolchains = ["//:toolchain_type"],
+)
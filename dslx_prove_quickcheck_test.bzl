@@ -1,33 +1,36 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":helpers.bzl", "write_executable_shell_script", "get_srcs_from_lib")
-load(":env_helpers.bzl", "python_runner_source")
+load(":helpers.bzl", "write_executable_shell_script", "get_transitive_srcs_from_lib")
 load(
     ":xls_toolchain.bzl",
     "XlsArtifactBundleInfo",
     "declare_xls_toolchain_toml",
     "get_selected_tools_toolchain",
     "get_tool_artifact_inputs",
+    "resource_class_attr",
+    "runner_setting_arguments",
+    "test_execution_info",
+    "xlsynth_runner_attr",
 )
 
 
 def _dslx_prove_quickcheck_test_impl(ctx):
     lib = ctx.attr.lib[DslxInfo]
-    lib_srcs = lib.dag.to_list()[-1].srcs
-    if len(lib_srcs) != 1:
-        fail("Expected exactly one source file for the library; got: " + str(lib_srcs))
-    lib_src = lib_srcs[0]
+    if len(lib.srcs) != 1:
+        fail("Expected exactly one source file for the library; got: " + str(lib.srcs))
+    lib_src = lib.main_src
 
-    srcs = get_srcs_from_lib(ctx)
+    srcs = get_transitive_srcs_from_lib(ctx)
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_tools_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "prove_quickcheck", toolchain = toolchain)
     cmd_parts = [
         "/usr/bin/env",
         "python3",
+        "-I",
+        "-S",
         runner.short_path,
         "tool",
         "--toolchain",
@@ -35,22 +38,40 @@ def _dslx_prove_quickcheck_test_impl(ctx):
     ]
     if toolchain.runtime_library_path:
         cmd_parts.extend(["--runtime_library_path", toolchain.runtime_library_path])
+    cmd_parts.extend(runner_setting_arguments(ctx, toolchain, "prove_quickcheck_main"))
+    if ctx.attr.jobs != 1:
+        cmd_parts.extend(["--quickcheck_jobs", str(ctx.attr.jobs)])
+    fallback_inputs = []
+    if ctx.attr.proof_timeout_seconds > 0:
+        cmd_parts.extend(["--quickcheck_timeout", str(ctx.attr.proof_timeout_seconds)])
+        fallback_inputs = get_tool_artifact_inputs(toolchain, "dslx_interpreter_main")
     cmd_parts.extend(["prove_quickcheck_main", lib_src.short_path])
     cmd = " ".join(["\"{}\"".format(part) for part in cmd_parts])
     if ctx.attr.top:
         cmd += " --test_filter=" + ctx.attr.top
 
-    runfiles = ctx.runfiles(srcs + [runner, toolchain_file] + get_tool_artifact_inputs(toolchain, "prove_quickcheck_main"))
+    runfiles = ctx.runfiles(
+        [runner, toolchain_file] + get_tool_artifact_inputs(toolchain, "prove_quickcheck_main") + fallback_inputs,
+        transitive_files = srcs,
+    )
     executable_file = write_executable_shell_script(
         ctx = ctx,
         filename = ctx.label.name + ".sh",
         cmd = cmd,
     )
-    return DefaultInfo(
+    providers = [DefaultInfo(
         runfiles = runfiles,
         files = depset(direct = [executable_file]),
         executable = executable_file,
-    )
+    )]
+
+    # Concurrent proofs reserve a CPU each, so the scheduler does not run
+    # other tests on the cores they use. With `top`, only one proof runs.
+    proof_jobs = 1 if ctx.attr.top else max(ctx.attr.jobs, 1)
+    execution_info = test_execution_info(ctx, toolchain, "PROVEQUICKCHECK", minimum_cpus = proof_jobs)
+    if execution_info != None:
+        providers.append(execution_info)
+    return providers
 
 
 dslx_prove_quickcheck_test = rule(
@@ -65,10 +86,23 @@ dslx_prove_quickcheck_test = rule(
         "top": attr.string(
             doc = "The quickcheck function to be tested. If none is provided, all quickcheck functions in the library will be tested.",
         ),
+        "jobs": attr.int(
+            doc = "When top is empty, prove up to this many quickcheck functions concurrently, each in its own process. " +
+                  "0 uses every available core. The test reserves `jobs` CPUs; with 0, add a `cpu:N` tag or set `resource_class`.",
+            default = 1,
+        ),
+        "proof_timeout_seconds": attr.int(
+            doc = "Per-quickcheck proof time budget in seconds; 0 means no budget. A quickcheck whose proof runs longer " +
+                  "is sampled with dslx_interpreter_main instead and reported as unproven if every sample passes. " +
+                  "Per-function timings go to quickcheck_results.json in the test's undeclared outputs.",
+            default = 0,
+        ),
+        "resource_class": resource_class_attr(),
         "xls_bundle": attr.label(
             doc = "Optional XLS bundle override.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(cfg = "target"),
     },
     test = True,
     toolchains = ["//:toolchain_type"],
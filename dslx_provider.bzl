@@ -1,26 +1,32 @@
 # SPDX-License-Identifier: Apache-2.0
 
-load(":env_helpers.bzl", "python_runner_source")
 load(
     ":xls_toolchain.bzl",
     "XlsArtifactBundleInfo",
     "declare_xls_toolchain_toml",
     "get_selected_tools_toolchain",
     "get_tool_artifact_inputs",
+    "run_xls_tool_action",
+    "xlsynth_runner_attr",
 )
 
 DslxInfo = provider(
     doc = "Contains DAG info per node in a struct.",
     fields = {
         "dag": "A depset of the DAG entries to propagate upwards.",
+        "main_src": "The library's entry DSLX file (its last source), or None.",
+        "srcs": "The library's own DSLX sources.",
+        "transitive_srcs": "A postorder depset of every DSLX source the library depends on, its own last.",
     },
 )
 
 
 def make_dag_entry(srcs, deps, label):
+    # `deps` may be targets or labels; entries keep only labels so the DAG does
+    # not hold every dependency's Target alive.
     return struct(
         srcs = tuple(srcs),
-        deps = tuple(deps),
+        deps = tuple([getattr(dep, "label", dep) for dep in deps]),
         label = label,
     )
 
@@ -28,12 +34,26 @@ def make_dag_entry(srcs, deps, label):
 def make_dslx_info(
         new_entries = (),
         old_infos = ()):
+    srcs = [src for entry in new_entries for src in entry.srcs]
+    if srcs:
+        main_src = srcs[-1]
+    elif old_infos:
+        main_src = old_infos[-1].main_src
+    else:
+        main_src = None
     return DslxInfo(
         dag = depset(
             direct = new_entries,
             order = "postorder",
             transitive = [x.dag for x in old_infos],
         ),
+        main_src = main_src,
+        srcs = tuple(srcs),
+        transitive_srcs = depset(
+            direct = srcs,
+            order = "postorder",
+            transitive = [x.transitive_srcs for x in old_infos],
+        ),
     )
 
 
@@ -56,44 +76,45 @@ def _dslx_library_impl(ctx):
     )
 
     typecheck_output = ctx.actions.declare_file(ctx.label.name + ".typecheck")
-
-    dag_entries = []
-    for dep in ctx.attr.deps:
-        dag_entries.extend(dep[DslxInfo].dag.to_list())
-
-    srcs = []
-    for entry in dag_entries:
-        srcs += [src for src in list(entry.srcs)]
-    for src in ctx.files.srcs:
-        srcs.append(src)
+    main_src = dslx_info.main_src
+    if main_src == None:
+        fail("dslx_library {} has no DSLX sources to typecheck".format(ctx.label))
+    srcs = dslx_info.transitive_srcs
 
     # Run typechecking via the embedded runner so env is read at action runtime.
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_tools_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "typecheck", toolchain = toolchain)
-    action_inputs = srcs + [toolchain_file] + get_tool_artifact_inputs(toolchain, "typecheck_main")
-    ctx.actions.run(
-        inputs = action_inputs,
-        outputs = [typecheck_output],
-        executable = runner,
+    action_inputs = depset(
+        direct = [toolchain_file] + get_tool_artifact_inputs(toolchain, "typecheck_main"),
+        transitive = [srcs],
+    )
+    run_xls_tool_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        tool = "typecheck_main",
         arguments = [
-            "tool",
-            "--toolchain",
-            toolchain_file.path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "typecheck_main",
-            srcs[-1].path,
+            main_src.path,
             "--output_path",
             typecheck_output.path,
         ],
-        use_default_shell_env = False,
+        inputs = action_inputs,
+        outputs = [typecheck_output],
+        mnemonic = "DSLXTYPECHECK",
+        progress_message = "Typechecking DSLX",
+        dslx_main = main_src,
+        dslx_srcs = srcs,
     )
 
+    # Nothing downstream consumes the typecheck result, so it is also a
+    # validation output: Bazel runs it alongside IR conversion and codegen for
+    # every library in the build and still fails the build on type errors.
     return [
         dslx_info,
         DefaultInfo(files = depset([typecheck_output])),
+        OutputGroupInfo(_validation = depset([typecheck_output])),
     ]
 
 
@@ -115,6 +136,7 @@ dslx_library = rule(
             doc = "Optional XLS bundle override.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(),
     },
     toolchains = ["//:toolchain_type"],
 )
@@ -1,22 +1,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":helpers.bzl", "get_srcs_from_lib")
-load(":env_helpers.bzl", "python_runner_source")
-load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain")
+load(":helpers.bzl", "get_single_main_src", "get_transitive_srcs_from_lib")
+load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain", "run_xls_driver_action", "xlsynth_runner_attr")
 
 
 def _dslx_stitch_pipeline_impl(ctx):
-    lib_info = ctx.attr.lib[DslxInfo]
-    lib_dag_list = lib_info.dag.to_list()
-    if not lib_dag_list:
-        fail("DAG for library {} is empty".format(ctx.attr.lib.label))
-    main_srcs = lib_dag_list[-1].srcs
-    if len(main_srcs) != 1:
-        fail("Expected exactly one source file for the library {}; got: {}".format(ctx.attr.lib.label, [s.path for s in main_srcs]))
-    main_src = main_srcs[0]
-
-    srcs = get_srcs_from_lib(ctx)
+    main_src = get_single_main_src(ctx.attr.lib)
+    srcs = get_transitive_srcs_from_lib(ctx)
 
     passthrough = [
         "--use_system_verilog={}".format(str(ctx.attr.use_system_verilog).lower()),
@@ -48,8 +39,7 @@ def _dslx_stitch_pipeline_impl(ctx):
         value = getattr(ctx.attr, flag)
         passthrough.append("--{}={}".format(flag, str(value).lower()))
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "dslx_stitch_pipeline", toolchain = toolchain)
 
@@ -58,28 +48,26 @@ def _dslx_stitch_pipeline_impl(ctx):
         dslx_top_arg = ctx.attr.top
 
     arguments = [
-        "driver",
-        "--driver_path",
-        toolchain.driver_path,
-        "--runtime_library_path",
-        toolchain.runtime_library_path,
-        "--toolchain",
-        toolchain_file.path,
-        "--stdout_path",
-        ctx.outputs.sv_file.path,
-        "dslx-stitch-pipeline",
         "--dslx_input_file=" + main_src.path,
     ]
     if dslx_top_arg:
         arguments.append("--dslx_top=" + dslx_top_arg)
     arguments.extend(passthrough)
 
-    ctx.actions.run(
-        inputs = srcs + [toolchain_file] + get_driver_artifact_inputs(toolchain),
-        executable = runner,
-        outputs = [ctx.outputs.sv_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "dslx-stitch-pipeline",
         arguments = arguments,
-        use_default_shell_env = False,
+        inputs = depset([toolchain_file] + get_driver_artifact_inputs(toolchain), transitive = [srcs]),
+        outputs = [ctx.outputs.sv_file],
+        mnemonic = "DSLXSTITCHPIPELINE",
+        stdout = ctx.outputs.sv_file,
+        progress_message = "Stitching DSLX pipeline stages",
+        dslx_main = main_src,
+        dslx_srcs = srcs,
     )
 
     return DefaultInfo(
@@ -132,6 +120,7 @@ dslx_stitch_pipeline = rule(
             doc = "Optional override bundle repo label, for example @legacy_xls_toolchain//:bundle.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(),
     },
     outputs = {
         "sv_file": "%{name}.sv",
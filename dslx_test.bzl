@@ -1,14 +1,15 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":helpers.bzl", "get_srcs_from_deps", "get_srcs_from_lib", "write_executable_shell_script")
-load(":env_helpers.bzl", "python_runner_source")
+load(":helpers.bzl", "write_executable_shell_script")
 load(
     ":xls_toolchain.bzl",
     "XlsArtifactBundleInfo",
     "declare_xls_toolchain_toml",
     "get_selected_tools_toolchain",
     "get_tool_artifact_inputs",
+    "runner_setting_arguments",
+    "xlsynth_runner_attr",
 )
 
 
@@ -27,27 +28,44 @@ def _dslx_test_impl(ctx):
     if not ctx.attr.src and not ctx.attr.lib and len(ctx.attr.deps) != 1:
         fail("Must provide src or lib with zero or more dependencies; alternatively, provide exactly one dependency.")
 
-    srcs_from_deps = get_srcs_from_deps(ctx)
+    deps_infos = [dep[DslxInfo] for dep in ctx.attr.deps]
     if ctx.attr.src:
-        test_src = [ctx.file.src]
+        test_main = ctx.file.src
+        if any([test_main in info.srcs for info in deps_infos]):
+            fail("Don't provide the test through more than one attribute: src/lib/deps.")
+        srcs_infos = deps_infos
     elif ctx.attr.lib:
-        test_src = get_srcs_from_lib(ctx)
+        test_main = ctx.attr.lib[DslxInfo].main_src
+        srcs_infos = [ctx.attr.lib[DslxInfo]] + deps_infos
     else:
-        test_src = []
+        test_main = deps_infos[0].main_src
+        srcs_infos = deps_infos
+    srcs = depset(
+        order = "postorder",
+        transitive = [info.transitive_srcs for info in srcs_infos],
+    )
 
-    if len(test_src) == 1 and test_src[0] in srcs_from_deps:
-        fail("Don't provide the test through more than one attribute: src/lib/deps.")
+    # dslx_interpreter_main runs tests from the first file, so the test module
+    # leads; the remaining sources are expanded from the depset only when the
+    # params file is written, which keeps long import chains out of argv.
+    def _other_src_short_path(src):
+        return None if src == test_main else src.short_path
 
-    # The order of the srcs matters. dslx_interpreter_main runs tests from the first file.
-    srcs = test_src + srcs_from_deps
+    srcs_args = ctx.actions.args()
+    srcs_args.set_param_file_format("multiline")
+    srcs_args.add(test_main.short_path)
+    srcs_args.add_all(srcs, map_each = _other_src_short_path, allow_closure = True)
+    srcs_params = ctx.actions.declare_file(ctx.label.name + ".srcs.params")
+    ctx.actions.write(output = srcs_params, content = srcs_args)
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_tools_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "dslx_test", toolchain = toolchain)
     cmd_parts = [
         "/usr/bin/env",
         "python3",
+        "-I",
+        "-S",
         runner.short_path,
         "tool",
         "--toolchain",
@@ -55,11 +73,14 @@ def _dslx_test_impl(ctx):
     ]
     if toolchain.runtime_library_path:
         cmd_parts.extend(["--runtime_library_path", toolchain.runtime_library_path])
-    cmd_parts.append("dslx_interpreter_main")
-    cmd_parts.extend([src.short_path for src in srcs])
+    cmd_parts.extend(runner_setting_arguments(ctx, toolchain, "dslx_interpreter_main"))
+    cmd_parts.extend(["--passthrough_file", srcs_params.short_path, "dslx_interpreter_main"])
     cmd = " ".join(["\"{}\"".format(part) for part in cmd_parts])
 
-    runfiles = ctx.runfiles(srcs + [runner, toolchain_file] + get_tool_artifact_inputs(toolchain, "dslx_interpreter_main"))
+    runfiles = ctx.runfiles(
+        [test_main, srcs_params, runner, toolchain_file] + get_tool_artifact_inputs(toolchain, "dslx_interpreter_main"),
+        transitive_files = srcs,
+    )
     executable_file = write_executable_shell_script(
         ctx = ctx,
         filename = ctx.label.name + ".sh",
@@ -92,6 +113,7 @@ dslx_test = rule(
             doc = "Optional XLS bundle override.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(cfg = "target"),
     },
     test = True,
     toolchains = ["//:toolchain_type"],
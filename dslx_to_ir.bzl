@@ -1,94 +1,75 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":helpers.bzl", "get_srcs_from_lib", "mangle_dslx_name")
+load(":helpers.bzl", "get_single_main_src", "get_transitive_srcs_from_lib", "mangle_dslx_name")
 load(":ir_provider.bzl", "IrInfo")
-load(":env_helpers.bzl", "python_runner_source")
 load(
     ":xls_toolchain.bzl",
     "XlsArtifactBundleInfo",
     "declare_xls_toolchain_toml",
     "get_driver_artifact_inputs",
     "get_selected_driver_toolchain",
+    "run_xls_driver_action",
+    "xlsynth_runner_attr",
 )
 
 def _dslx_to_ir_impl(ctx):
-    # Get the DslxInfo from the direct library target
-    lib_info = ctx.attr.lib[DslxInfo]
-    # Convert the DAG depset to a list. The last element corresponds to the direct target due to postorder traversal.
-    lib_dag_list = lib_info.dag.to_list()
-    if not lib_dag_list:
-        fail("DAG for library {} is empty".format(ctx.attr.lib.label))
-    main_srcs = lib_dag_list[-1].srcs
-    if len(main_srcs) != 1:
-        fail("Expected exactly one source file for the library {}; got: {}".format(ctx.attr.lib.label, [s.path for s in main_srcs]))
-    main_src = main_srcs[0]
+    main_src = get_single_main_src(ctx.attr.lib)
+    all_transitive_srcs = get_transitive_srcs_from_lib(ctx)
 
-    all_transitive_srcs = get_srcs_from_lib(ctx)
-
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "dslx_to_ir", toolchain = toolchain)
     dslx2ir_inputs = [toolchain_file] + get_driver_artifact_inputs(toolchain, ["ir_converter_main"])
     ir2opt_inputs = [toolchain_file] + get_driver_artifact_inputs(toolchain, ["opt_main"])
 
     # Stage 1: dslx2ir
-    ctx.actions.run(
-        inputs = all_transitive_srcs + dslx2ir_inputs,
-        executable = runner,
-        outputs = [ctx.outputs.ir_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "dslx2ir",
         arguments = [
-            "driver",
-            "--driver_path",
-            toolchain.driver_path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "--toolchain",
-            toolchain_file.path,
-            "--stdout_path",
-            ctx.outputs.ir_file.path,
-            "dslx2ir",
             "--dslx_input_file",
             main_src.path,
             "--dslx_top",
             ctx.attr.top,
         ],
-        use_default_shell_env = False,
-        progress_message = "Generating IR for DSLX",
+        inputs = depset(dslx2ir_inputs, transitive = [all_transitive_srcs]),
+        outputs = [ctx.outputs.ir_file],
         mnemonic = "DSLX2IR",
+        stdout = ctx.outputs.ir_file,
+        progress_message = "Generating IR for DSLX",
+        dslx_main = main_src,
+        dslx_srcs = all_transitive_srcs,
     )
 
     ir_top = mangle_dslx_name(main_src.basename, ctx.attr.top)
 
     # Stage 2: ir2opt
-    ctx.actions.run(
-        inputs = [ctx.outputs.ir_file] + ir2opt_inputs,
-        executable = runner,
-        outputs = [ctx.outputs.opt_ir_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "ir2opt",
         arguments = [
-            "driver",
-            "--driver_path",
-            toolchain.driver_path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "--toolchain",
-            toolchain_file.path,
-            "--stdout_path",
-            ctx.outputs.opt_ir_file.path,
-            "ir2opt",
             ctx.outputs.ir_file.path,
             "--top",
             ir_top,
         ],
-        use_default_shell_env = False,
-        progress_message = "Optimizing IR",
+        inputs = [ctx.outputs.ir_file] + ir2opt_inputs,
+        outputs = [ctx.outputs.opt_ir_file],
         mnemonic = "IR2OPT",
+        stdout = ctx.outputs.opt_ir_file,
+        progress_message = "Optimizing IR",
     )
 
     return IrInfo(
         ir_file = ctx.outputs.ir_file,
         opt_ir_file = ctx.outputs.opt_ir_file,
+        top = ir_top,
     )
 
 dslx_to_ir = rule(
@@ -108,6 +89,7 @@ dslx_to_ir = rule(
             doc = "Optional XLS bundle override.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(),
     },
     outputs = {
         "ir_file": "%{name}.ir",
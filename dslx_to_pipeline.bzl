@@ -1,17 +1,31 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":helpers.bzl", "get_srcs_from_deps")
-load(":env_helpers.bzl", "python_runner_source")
-load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain")
-
-def _dslx_to_pipeline_impl(ctx):
-    srcs = get_srcs_from_deps(ctx)
-
+load(":helpers.bzl", "get_main_src_from_deps", "get_transitive_srcs_from_deps")
+load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain", "resource_class_attr", "run_xls_driver_action", "xlsynth_runner_attr")
+
+def pipeline_codegen_arguments(ctx, delay_model = None, pipeline_stages = None, clock_period_ps = None):
+    """Returns the scheduling and codegen flags for a rule with `PipelineCodegenAttrs`.
+
+    Args:
+      ctx: Rule context of a pipeline codegen rule.
+      delay_model: Overrides `ctx.attr.delay_model` when not None.
+      pipeline_stages: Overrides `ctx.attr.pipeline_stages` when not None.
+      clock_period_ps: Overrides `ctx.attr.clock_period_ps` when not None.
+
+    Returns:
+      A list of `--flag=value` driver arguments.
+    """
+    if delay_model == None:
+        delay_model = ctx.attr.delay_model
+    if pipeline_stages == None:
+        pipeline_stages = ctx.attr.pipeline_stages
+    if clock_period_ps == None:
+        clock_period_ps = ctx.attr.clock_period_ps
     passthrough = []
 
     # Delay model flag (required)
-    passthrough.append("--delay_model=" + ctx.attr.delay_model)
+    passthrough.append("--delay_model=" + delay_model)
 
     # Forward string-valued flags when a non-empty value is provided.
     for flag in ["input_valid_signal", "output_valid_signal", "module_name"]:
@@ -20,13 +34,13 @@ def _dslx_to_pipeline_impl(ctx):
             passthrough.append("--{}={}".format(flag, value))
 
     # Forward integer-valued timing flags when >0.
-    if ctx.attr.pipeline_stages > 0:
-        passthrough.append("--pipeline_stages={}".format(ctx.attr.pipeline_stages))
-    if ctx.attr.clock_period_ps > 0:
-        passthrough.append("--clock_period_ps={}".format(ctx.attr.clock_period_ps))
+    if pipeline_stages > 0:
+        passthrough.append("--pipeline_stages={}".format(pipeline_stages))
+    if clock_period_ps > 0:
+        passthrough.append("--clock_period_ps={}".format(clock_period_ps))
 
     # Validate that either pipeline_stages or clock_period_ps is specified (>0).
-    if ctx.attr.pipeline_stages == 0 and ctx.attr.clock_period_ps == 0:
+    if pipeline_stages == 0 and clock_period_ps == 0:
         fail("Please specify either 'pipeline_stages' (>0) or 'clock_period_ps' (>0)")
 
     # Boolean flags that are forwarded verbatim to the driver as
@@ -47,21 +61,27 @@ def _dslx_to_pipeline_impl(ctx):
     if ctx.attr.add_invariant_assertions != "":
         passthrough.append("--add_invariant_assertions={}".format(ctx.attr.add_invariant_assertions))
 
+    if ctx.attr.reset:
+        passthrough.append("--reset={}".format(ctx.attr.reset))
+    return passthrough
+
+def _dslx_to_pipeline_impl(ctx):
+    srcs = get_transitive_srcs_from_deps(ctx)
+    main_src = get_main_src_from_deps(ctx)
+
+    passthrough = pipeline_codegen_arguments(ctx)
+
     # Top entry function flag
     if ctx.attr.top:
         top_entry = ctx.attr.top
     else:
         fail("Please specify the 'top' entry function to use")
 
-    if ctx.attr.reset:
-        passthrough.append("--reset={}".format(ctx.attr.reset))
-
     output_sv_file = ctx.outputs.sv_file
     output_unopt_ir_file = ctx.outputs.unopt_ir_file
     output_opt_ir_file = ctx.outputs.opt_ir_file
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(
         ctx,
@@ -70,41 +90,39 @@ def _dslx_to_pipeline_impl(ctx):
         add_invariant_assertions = ctx.attr.add_invariant_assertions,
     )
 
-    ctx.actions.run(
-        inputs = srcs + [toolchain_file] + get_driver_artifact_inputs(
-            toolchain,
-            ["ir_converter_main", "opt_main", "codegen_main"],
-        ),
-        executable = runner,
-        outputs = [output_sv_file, output_unopt_ir_file, output_opt_ir_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "dslx2pipeline",
         arguments = [
-            "driver",
-            "--driver_path",
-            toolchain.driver_path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "--toolchain",
-            toolchain_file.path,
-            "--stdout_path",
-            output_sv_file.path,
-            "dslx2pipeline",
-            "--dslx_input_file=" + srcs[0].path,
+            "--dslx_input_file=" + main_src.path,
             "--dslx_top=" + top_entry,
             "--output_unopt_ir=" + output_unopt_ir_file.path,
             "--output_opt_ir=" + output_opt_ir_file.path,
         ] + passthrough,
-        use_default_shell_env = False,
+        inputs = depset(
+            [toolchain_file] + get_driver_artifact_inputs(
+                toolchain,
+                ["ir_converter_main", "opt_main", "codegen_main"],
+            ),
+            transitive = [srcs],
+        ),
+        outputs = [output_sv_file, output_unopt_ir_file, output_opt_ir_file],
+        mnemonic = "DSLX2PIPELINE",
+        stdout = output_sv_file,
+        progress_message = "Generating pipeline for DSLX",
+        dslx_main = main_src,
+        dslx_srcs = srcs,
     )
 
     return DefaultInfo(
         files = depset(direct = [output_sv_file]),
     )
 
-DslxToPipelineAttrs = {
-    "deps": attr.label_list(
-        doc = "The list of DSLX libraries to be tested.",
-        providers = [DslxInfo],
-    ),
+# Scheduling and codegen attributes shared by the rules that emit a pipeline.
+PipelineCodegenAttrs = {
     "delay_model": attr.string(
         doc = "The delay model to be used (e.g., 'asap7').",
         mandatory = True,
@@ -152,16 +170,26 @@ DslxToPipelineAttrs = {
         doc = "The reset signal to use in generation.",
         default = "",
     ),
-    "top": attr.string(
-        doc = "The top entry function within the dependency module.",
-        mandatory = True,
-    ),
+    "resource_class": resource_class_attr(),
     "xls_bundle": attr.label(
         doc = "Optional override bundle repo label, for example @legacy_xls_toolchain//:bundle.",
         providers = [XlsArtifactBundleInfo],
     ),
+    "_runner": xlsynth_runner_attr(),
 }
 
+DslxToPipelineAttrs = dict(
+    PipelineCodegenAttrs,
+    deps = attr.label_list(
+        doc = "The list of DSLX libraries to be tested.",
+        providers = [DslxInfo],
+    ),
+    top = attr.string(
+        doc = "The top entry function within the dependency module.",
+        mandatory = True,
+    ),
+)
+
 # Keep the public rule signature stable
 DslxToPipelineOutputs = {
     "sv_file": "%{name}.sv",
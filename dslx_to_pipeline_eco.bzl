@@ -1,12 +1,12 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":env_helpers.bzl", "python_runner_source")
-load(":helpers.bzl", "get_srcs_from_deps")
-load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain")
+load(":helpers.bzl", "get_main_src_from_deps", "get_transitive_srcs_from_deps")
+load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain", "run_xls_driver_action", "xlsynth_runner_attr")
 
 def _dslx_to_pipeline_eco_impl(ctx):
-    srcs = get_srcs_from_deps(ctx)
+    srcs = get_transitive_srcs_from_deps(ctx)
+    main_src = get_main_src_from_deps(ctx)
 
     passthrough = []
 
@@ -55,7 +55,6 @@ def _dslx_to_pipeline_eco_impl(ctx):
 
     if not ctx.file.baseline_unopt_ir:
         fail("Please specify the 'baseline_unopt_ir' file to use")
-    srcs.append(ctx.file.baseline_unopt_ir)
 
     if ctx.attr.reset:
         passthrough.append("--reset={}".format(ctx.attr.reset))
@@ -67,8 +66,7 @@ def _dslx_to_pipeline_eco_impl(ctx):
     output_baseline_verilog_file = ctx.outputs.baseline_verilog_file
     output_eco_edit_file = ctx.outputs.eco_edit_file
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(
         ctx,
@@ -77,25 +75,14 @@ def _dslx_to_pipeline_eco_impl(ctx):
         add_invariant_assertions = ctx.attr.add_invariant_assertions,
     )
 
-    ctx.actions.run(
-        inputs = srcs + [toolchain_file] + get_driver_artifact_inputs(
-            toolchain,
-            ["ir_converter_main", "opt_main", "codegen_main", "block_to_verilog_main"],
-        ),
-        executable = runner,
-        outputs = [output_sv_file, output_unopt_ir_file, output_opt_ir_file, output_baseline_verilog_file, output_eco_edit_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "dslx2pipeline-eco",
         arguments = [
-            "driver",
-            "--driver_path",
-            toolchain.driver_path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "--toolchain",
-            toolchain_file.path,
-            "--stdout_path",
-            output_sv_file.path,
-            "dslx2pipeline-eco",
-            "--dslx_input_file=" + srcs[0].path,
+            "--dslx_input_file=" + main_src.path,
             "--dslx_top=" + top_entry,
             "--baseline_unopt_ir=" + baseline_unopt_ir_file.path,
             "--output_unopt_ir=" + output_unopt_ir_file.path,
@@ -103,7 +90,17 @@ def _dslx_to_pipeline_eco_impl(ctx):
             "--output_baseline_verilog_path=" + output_baseline_verilog_file.path,
             "--edits_debug_out=" + output_eco_edit_file.path,
         ] + passthrough,
-        use_default_shell_env = False,
+        inputs = depset(
+            [baseline_unopt_ir_file, toolchain_file] + get_driver_artifact_inputs(
+                toolchain,
+                ["ir_converter_main", "opt_main", "codegen_main", "block_to_verilog_main"],
+            ),
+            transitive = [srcs],
+        ),
+        outputs = [output_sv_file, output_unopt_ir_file, output_opt_ir_file, output_baseline_verilog_file, output_eco_edit_file],
+        mnemonic = "DSLX2PIPELINEECO",
+        stdout = output_sv_file,
+        progress_message = "Generating ECO pipeline for DSLX",
     )
 
     return DefaultInfo(
@@ -175,6 +172,7 @@ DslxToPipelineEcoAttrs = {
         doc = "Optional override bundle repo label, for example @legacy_xls_toolchain//:bundle.",
         providers = [XlsArtifactBundleInfo],
     ),
+    "_runner": xlsynth_runner_attr(),
 }
 
 # Keep the public rule signature stable
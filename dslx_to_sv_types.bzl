@@ -1,9 +1,8 @@
 # SPDX-License-Identifier: Apache-2.0
 
 load(":dslx_provider.bzl", "DslxInfo")
-load(":env_helpers.bzl", "python_runner_source")
-load(":helpers.bzl", "get_srcs_from_deps")
-load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain")
+load(":helpers.bzl", "get_main_src_from_deps", "get_transitive_srcs_from_deps")
+load(":xls_toolchain.bzl", "XlsArtifactBundleInfo", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "get_selected_driver_toolchain", "run_xls_driver_action", "xlsynth_runner_attr")
 
 _SV_ENUM_CASE_NAMING_POLICIES = [
     "unqualified",
@@ -18,27 +17,17 @@ _SV_STRUCT_FIELD_ORDERING_POLICIES = [
 _DEFAULT_SV_STRUCT_FIELD_ORDERING_POLICY = "as_declared"
 
 def _dslx_to_sv_types_impl(ctx):
-    srcs = get_srcs_from_deps(ctx)
+    srcs = get_transitive_srcs_from_deps(ctx)
+    main_src = get_main_src_from_deps(ctx)
 
     output_sv_file = ctx.outputs.sv_file
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "dslx_to_sv_types", toolchain = toolchain)
     arguments = [
-        "driver",
-        "--driver_path",
-        toolchain.driver_path,
-        "--runtime_library_path",
-        toolchain.runtime_library_path,
-        "--toolchain",
-        toolchain_file.path,
-        "--stdout_path",
-        output_sv_file.path,
-        "dslx2sv-types",
         "--dslx_input_file",
-        srcs[0].path,
+        main_src.path,
     ]
 
     if toolchain.driver_supports_sv_struct_field_ordering:
@@ -55,12 +44,20 @@ def _dslx_to_sv_types_impl(ctx):
         if ctx.attr.sv_enum_case_naming_policy != "unqualified":
             fail("sv_enum_case_naming_policy={} requires a selected XLS bundle whose xlsynth-driver supports that flag".format(ctx.attr.sv_enum_case_naming_policy))
 
-    ctx.actions.run(
-        inputs = srcs + [toolchain_file] + get_driver_artifact_inputs(toolchain),
-        executable = runner,
-        outputs = [output_sv_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "dslx2sv-types",
         arguments = arguments,
-        use_default_shell_env = False,
+        inputs = depset([toolchain_file] + get_driver_artifact_inputs(toolchain), transitive = [srcs]),
+        outputs = [output_sv_file],
+        mnemonic = "DSLX2SVTYPES",
+        stdout = output_sv_file,
+        progress_message = "Generating SystemVerilog types for DSLX",
+        dslx_main = main_src,
+        dslx_srcs = srcs,
     )
 
     return DefaultInfo(
@@ -89,6 +86,7 @@ dslx_to_sv_types = rule(
             doc = "Optional override bundle repo label, for example @legacy_xls_toolchain//:bundle.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(),
     },
     outputs = {
         "sv_file": "%{name}.sv",
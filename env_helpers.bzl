@@ -9,13 +9,17 @@ def python_runner_source():
     return """#!/usr/bin/env python3
 # SPDX-License-Identifier: Apache-2.0
 
-import argparse
-import ast
+# This runner starts once per action or test, so the rules launch it in
+# isolated mode without `site` (`python3 -I -S`) and it imports only `os` and
+# `sys` up front.
+# Everything else (subprocess, json, threading) is imported by the code paths
+# that need it, and the typing names exist only for type checkers.
 import os
-import subprocess
 import sys
-from enum import Enum
-from typing import Any, Dict, List, NamedTuple, Optional
+
+MYPY = False
+if MYPY:
+    from typing import Any, Dict, List, Optional, Tuple
 
 
 _TOOL_CONFIG = {
@@ -46,45 +50,77 @@ _TOOL_CONFIG = {
 }
 
 
-class EnvFlagMode(Enum):
-    PASSTHROUGH_IF_NONEMPTY = "passthrough_if_nonempty"
+# DSLX settings that are forwarded as `--<name>=<value>` when non-empty.
+_PASSTHROUGH_IF_NONEMPTY_SETTINGS = (
+    "dslx_path",
+    "enable_warnings",
+    "disable_warnings",
+)
 
 
-class EnvFlagSpec(NamedTuple):
-    flag_name: str
-    mode: EnvFlagMode
+def _setting_flag_builder(setting_name: str, value: str) -> "List[str]":
+    if setting_name not in _PASSTHROUGH_IF_NONEMPTY_SETTINGS:
+        return []
+    return [f"--{setting_name}={value}"] if value else []
 
 
-_DSLX_FLAG_SPECS: Dict[str, EnvFlagSpec] = {
-    "dslx_path":
-    EnvFlagSpec("dslx_path", EnvFlagMode.PASSTHROUGH_IF_NONEMPTY),
-    "enable_warnings":
-    EnvFlagSpec("enable_warnings", EnvFlagMode.PASSTHROUGH_IF_NONEMPTY),
-    "disable_warnings":
-    EnvFlagSpec("disable_warnings", EnvFlagMode.PASSTHROUGH_IF_NONEMPTY),
+_TOML_ESCAPES = {
+    "\\"": "\\"",
+    "\\\\": "\\\\",
+    "n": "\\n",
+    "t": "\\t",
 }
 
 
-def _setting_flag_builder(setting_name: str, value: str) -> List[str]:
-    spec = _DSLX_FLAG_SPECS.get(setting_name)
-    if not spec:
-        return []
-
-    if spec.mode == EnvFlagMode.PASSTHROUGH_IF_NONEMPTY:
-        return [f"--{spec.flag_name}={value}"] if value else []
+def _parse_toml_string(text: str, start: int) -> "Any":
+    # Parses the basic string starting at text[start] == '"'; returns the value
+    # and the index just past the closing quote.
+    chars = []
+    index = start + 1
+    while index < len(text):
+        char = text[index]
+        if char == "\\\\":
+            index += 1
+            if index >= len(text) or text[index] not in _TOML_ESCAPES:
+                raise ValueError("Unsupported TOML escape in: {}".format(text))
+            chars.append(_TOML_ESCAPES[text[index]])
+        elif char == "\\"":
+            return "".join(chars), index + 1
+        else:
+            chars.append(char)
+        index += 1
+    raise ValueError("Unterminated TOML string: {}".format(text))
 
-    return []
 
-
-def _parse_scalar(value_text: str) -> Any:
+def _parse_scalar(value_text: str) -> "Any":
+    # The rules only emit booleans, integers, basic strings, and arrays of
+    # basic strings, so those are the only TOML forms handled here.
     if value_text == "true":
         return True
     if value_text == "false":
         return False
-    return ast.literal_eval(value_text)
+    if value_text.startswith("\\""):
+        value, end = _parse_toml_string(value_text, 0)
+        if value_text[end:].strip():
+            raise ValueError("Unexpected text after TOML string: {}".format(value_text))
+        return value
+    if value_text.startswith("[") and value_text.endswith("]"):
+        items: List[str] = []
+        index = 1
+        body_end = len(value_text) - 1
+        while True:
+            while index < body_end and value_text[index] in " \\t,":
+                index += 1
+            if index >= body_end:
+                return items
+            if value_text[index] != "\\"":
+                raise ValueError("Unsupported TOML array item in: {}".format(value_text))
+            item, index = _parse_toml_string(value_text, index)
+            items.append(item)
+    return int(value_text)
 
 
-def _parse_toolchain_toml(path: str) -> Dict[str, Any]:
+def _parse_toolchain_toml(path: str) -> "Dict[str, Any]":
     parsed: Dict[str, Any] = {}
     section_stack: List[str] = []
     with open(path, "r", encoding = "utf-8") as f:
@@ -105,18 +141,35 @@ def _parse_toolchain_toml(path: str) -> Dict[str, Any]:
     return parsed
 
 
-def _toolchain_dslx_config(toolchain_data: Dict[str, Any]) -> Dict[str, Any]:
+# Persistent workers serve many requests from one process, so parsed TOMLs and
+# resolved runfiles paths are kept for the lifetime of the runner.
+_TOOLCHAIN_CACHE: "Dict[Any, Dict[str, Any]]" = {}
+_RESOLVED_PATH_CACHE: "Dict[Any, str]" = {}
+_RUNFILES_MANIFEST_CACHE: "Dict[Any, Optional[Dict[str, Optional[str]]]]" = {}
+
+
+def _load_toolchain_toml(path: str) -> "Dict[str, Any]":
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    cached = _TOOLCHAIN_CACHE.get(key)
+    if cached is None:
+        cached = _parse_toolchain_toml(path)
+        _TOOLCHAIN_CACHE[key] = cached
+    return cached
+
+
+def _toolchain_dslx_config(toolchain_data: "Dict[str, Any]") -> "Dict[str, Any]":
     toolchain_section = toolchain_data.get("toolchain", {})
     return toolchain_section.get("dslx", {})
 
 
-def _toolchain_tool_path(toolchain_data: Dict[str, Any]) -> str:
+def _toolchain_tool_path(toolchain_data: "Dict[str, Any]") -> str:
     toolchain_section = toolchain_data.get("toolchain", {})
     tool_path = toolchain_section.get("tool_path", "")
     return _resolve_runtime_path(tool_path)
 
 
-def _runfiles_roots() -> List[str]:
+def _runfiles_roots() -> "List[str]":
     roots: List[str] = []
     for env_var in ["RUNFILES_DIR", "TEST_SRCDIR"]:
         value = os.environ.get(env_var)
@@ -125,7 +178,7 @@ def _runfiles_roots() -> List[str]:
     return roots
 
 
-def _runfiles_candidates(path: str) -> List[str]:
+def _runfiles_candidates(path: str) -> "List[str]":
     candidates = [path]
     for marker in ["external/", "_main/"]:
         marker_index = path.find(marker)
@@ -139,16 +192,104 @@ def _runfiles_candidates(path: str) -> List[str]:
     return candidates
 
 
+def _runfiles_manifest_path(roots: "List[str]") -> str:
+    manifest = os.environ.get("RUNFILES_MANIFEST_FILE", "")
+    if manifest:
+        return manifest
+    for root in roots:
+        for candidate in [os.path.join(root, "MANIFEST"), root + "_manifest"]:
+            if os.path.isfile(candidate):
+                return candidate
+    return ""
+
+
+def _unescape_manifest_path(text: str) -> str:
+    return text.replace("\\\\s", " ").replace("\\\\n", "\\n").replace("\\\\b", "\\\\")
+
+
+def _parse_runfiles_manifest(path: str) -> "Dict[str, Optional[str]]":
+    # Maps each runfiles path to its real path. Directories only appear in the
+    # manifest through the files below them, so each file also records its
+    # ancestors; an ancestor whose files disagree on the real directory maps to
+    # None and is left to the directory probe.
+    index: Dict[str, Optional[str]] = {}
+    directories: Dict[str, Optional[str]] = {}
+    with open(path, "r", encoding = "utf-8", errors = "surrogateescape") as f:
+        for raw_line in f:
+            line = raw_line.rstrip("\\n")
+            if line.startswith(" "):
+                # Escaped entry: both halves may contain spaces, newlines, or
+                # backslashes.
+                runfiles_path, _, real_path = line[1:].partition(" ")
+                runfiles_path = _unescape_manifest_path(runfiles_path)
+                real_path = _unescape_manifest_path(real_path)
+            else:
+                runfiles_path, _, real_path = line.partition(" ")
+            if not runfiles_path or not real_path:
+                continue
+            index[runfiles_path] = real_path
+            parent = runfiles_path
+            real_parent = real_path
+            while "/" in parent:
+                parent, _, name = parent.rpartition("/")
+                if not real_parent.endswith("/" + name):
+                    real_parent = ""
+                else:
+                    real_parent = real_parent[:-len(name) - 1]
+                existing = directories.get(parent, real_parent)
+                if existing != real_parent or not real_parent:
+                    directories[parent] = None
+                else:
+                    directories[parent] = real_parent
+    for directory, real_directory in directories.items():
+        index.setdefault(directory, real_directory)
+    return index
+
+
+def _load_runfiles_manifest(roots: "List[str]") -> "Optional[Dict[str, Optional[str]]]":
+    manifest_path = _runfiles_manifest_path(roots)
+    if not manifest_path:
+        return None
+    if manifest_path not in _RUNFILES_MANIFEST_CACHE:
+        try:
+            _RUNFILES_MANIFEST_CACHE[manifest_path] = _parse_runfiles_manifest(manifest_path)
+        except OSError:
+            _RUNFILES_MANIFEST_CACHE[manifest_path] = None
+    return _RUNFILES_MANIFEST_CACHE[manifest_path]
+
+
 def _resolve_runtime_path(path: str) -> str:
     if not path or os.path.isabs(path):
         return path
 
-    for root in _runfiles_roots():
+    roots = _runfiles_roots()
+    key = (tuple(roots), os.environ.get("RUNFILES_MANIFEST_FILE", ""), path)
+    cached = _RESOLVED_PATH_CACHE.get(key)
+    if cached is not None:
+        return cached
+
+    # A runfiles manifest answers each lookup from one dict; the filesystem
+    # probe below only runs when there is no manifest or it has no entry.
+    manifest = _load_runfiles_manifest(roots)
+    if manifest is not None:
+        # Main-repository short paths are keyed under `_main/` in the manifest.
+        for candidate in _runfiles_candidates(path) + ["_main/" + path]:
+            real_path = manifest.get(candidate)
+            if real_path:
+                _RESOLVED_PATH_CACHE[key] = real_path
+                return real_path
+
+    resolved_path = path
+    for root in roots:
         for candidate in _runfiles_candidates(path):
             resolved = os.path.join(root, candidate)
             if os.path.exists(resolved):
-                return resolved
-    return path
+                resolved_path = resolved
+                break
+        if resolved_path != path:
+            break
+    _RESOLVED_PATH_CACHE[key] = resolved_path
+    return resolved_path
 
 
 def _resolve_executable_path(path: str) -> str:
@@ -161,7 +302,7 @@ def _runtime_library_env_var(sys_platform: str) -> str:
     return "LD_LIBRARY_PATH"
 
 
-def _build_extra_args_for_tool(tool: str, toolchain_data: Dict[str, Any]) -> List[str]:
+def _build_extra_args_for_tool(tool: str, toolchain_data: "Dict[str, Any]") -> "List[str]":
     cfg = _TOOL_CONFIG.get(tool)
     if not cfg:
         return []
@@ -193,13 +334,35 @@ def _build_extra_args_for_tool(tool: str, toolchain_data: Dict[str, Any]) -> Lis
     return extra
 
 
+def _exec_in_place(cmd: "List[str]", *, env: "Dict[str, str]", stdout_path: str) -> None:
+    # Replaces the runner with the tool so no Python parent stays resident for
+    # the length of the run; only used when nothing happens after the tool exits.
+    if stdout_path:
+        fd = os.open(stdout_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        sys.stdout.flush()
+        os.dup2(fd, 1)
+        os.close(fd)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.execvpe(cmd[0], cmd, env)
+
+
 def _run_subprocess(
-        cmd: List[str],
+        cmd: "List[str]",
         *,
-        extra_env: Optional[Dict[str, str]] = None,
+        extra_env: "Optional[Dict[str, str]]" = None,
         runtime_library_path: str,
         stdout_path: str,
+        output: "Optional[List[str]]" = None,
+        exec_in_place: bool = False,
+        usage_log: str = "",
+        usage_record: "Optional[Dict[str, Any]]" = None,
+        timeout: "Optional[float]" = None,
+        token_pool: "Optional[Tuple[str, str, int]]" = None,
         sys_platform: str = sys.platform) -> int:
+    # With `timeout`, a tool still running after that many seconds is killed
+    # and subprocess.TimeoutExpired is raised; time spent waiting for a
+    # `token_pool` token does not count against it.
     env = os.environ.copy()
     resolved_runtime_library_path = _resolve_runtime_path(runtime_library_path)
     if resolved_runtime_library_path:
@@ -214,21 +377,238 @@ def _run_subprocess(
         for key, value in extra_env.items():
             if value:
                 env[key] = value
+    token_fd = None
+    if token_pool is not None:
+        token_fd, wait_seconds = _acquire_token(token_pool, output)
+        if token_fd is not None:
+            usage_record = dict(usage_record or {}, token_wait_seconds = round(wait_seconds, 6))
+    if exec_in_place and output is None and not usage_log and timeout is None:
+        # The tool inherits the token's lock and holds it until it exits.
+        if token_fd is not None:
+            os.set_inheritable(token_fd, True)
+        _exec_in_place(cmd, env = env, stdout_path = stdout_path)
+
+    import subprocess
+
+    # Only a budgeted run passes `timeout`, so the call is unchanged otherwise.
+    timeout_kwargs: "Dict[str, Any]" = {} if timeout is None else {"timeout": timeout}
     stdout_handle = None
-    stdout_stream = None
-    if stdout_path:
-        stdout_handle = open(stdout_path, "wb")
-        stdout_stream = stdout_handle
+    stdout_arg: "Any" = None
+    stderr_arg: "Any" = None
     try:
-        proc = subprocess.run(cmd, check = False, env = env, stdout = stdout_stream)
-        return proc.returncode
+        if stdout_path:
+            stdout_handle = open(stdout_path, "wb")
+        if output is None:
+            stdout_arg = stdout_handle
+        else:
+            # Worker requests must not write to the runner's stdout, which
+            # carries the work protocol; capture the tool's diagnostics for the
+            # response.
+            stdout_arg = stdout_handle if stdout_handle is not None else subprocess.PIPE
+            stderr_arg = subprocess.PIPE if stdout_handle is not None else subprocess.STDOUT
+        if usage_log:
+            returncode, captured = _run_and_record_usage(
+                cmd,
+                env = env,
+                stdout = stdout_arg,
+                stderr = stderr_arg,
+                usage_log = usage_log,
+                usage_record = usage_record or {},
+                timeout = timeout,
+                sys_platform = sys_platform,
+            )
+        elif output is None:
+            return subprocess.run(cmd, check = False, env = env, stdout = stdout_arg, **timeout_kwargs).returncode
+        else:
+            proc = subprocess.run(cmd, check = False, env = env, stdout = stdout_arg, stderr = stderr_arg, **timeout_kwargs)
+            returncode = proc.returncode
+            captured = proc.stderr if stdout_handle is not None else proc.stdout
+        if output is not None and captured:
+            output.append(captured.decode("utf-8", errors = "replace"))
+        return returncode
     finally:
         if stdout_handle is not None:
             stdout_handle.close()
+        if token_fd is not None:
+            os.close(token_fd)
+
+
+# Tools and driver subcommands whose invocations draw from a host-wide token
+# pool when the action passes `--concurrency_dir` and `--concurrency_limit`. The driver's `ir-equiv` runs check_ir_equivalence_main, so the two
+# share a pool.
+_TOKEN_POOLS = {
+    "check_ir_equivalence_main": "check_ir_equivalence_main",
+    "ir-equiv": "check_ir_equivalence_main",
+    "ir2gates": "ir2gates",
+    "prove_quickcheck_main": "prove_quickcheck_main",
+}
+
+# Longest pause between attempts to take a token.
+_TOKEN_MAX_POLL_SECONDS = 1.0
+
+
+def _token_pool(args: "_RunnerArgs", name: str) -> "Optional[Tuple[str, str, int]]":
+    # Returns (directory, pool, limit) for a limited tool, otherwise None.
+    pool = _TOKEN_POOLS.get(name)
+    if not args.concurrency_dir or not args.concurrency_limit or pool is None:
+        return None
+    limit = int(args.concurrency_limit)
+    if limit <= 0:
+        return None
+    return args.concurrency_dir, pool, limit
+
+
+def _acquire_token(
+        token_pool: "Tuple[str, str, int]",
+        output: "Optional[List[str]]") -> "Tuple[Optional[int], float]":
+    # Takes one of the pool's `limit` tokens, each an flock on its own lock
+    # file, polling until one is free. The kernel drops a lock when its holder
+    # exits, so a killed action never leaks a token. Returns the locked fd and
+    # the seconds spent waiting. A pool directory that cannot be used must not
+    # fail the action, so the tool then runs without a token.
+    import fcntl
+    import time
+
+    directory, pool, limit = token_pool
+    start = time.monotonic()
+    fds: List[int] = []
+    try:
+        os.makedirs(directory, exist_ok = True)
+        for index in range(limit):
+            fds.append(os.open(os.path.join(directory, "{}.{}.lock".format(pool, index)), os.O_RDWR | os.O_CREAT, 0o666))
+    except OSError as e:
+        for fd in fds:
+            os.close(fd)
+        sys.stderr.write("xlsynth_runner: cannot use token pool {}: {}\\n".format(directory, e))
+        return None, 0.0
+    delay = 0.05
+    waited = False
+    while True:
+        for fd in fds:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            for other in fds:
+                if other != fd:
+                    os.close(other)
+            wait_seconds = time.monotonic() - start
+            if waited:
+                message = "xlsynth_runner: waited {:.1f}s for a token from the {} pool (limit {})\\n".format(wait_seconds, pool, limit)
+                if output is None:
+                    sys.stderr.write(message)
+                else:
+                    output.append(message)
+            return fd, wait_seconds
+        time.sleep(delay)
+        waited = True
+        delay = min(delay * 2, _TOKEN_MAX_POLL_SECONDS)
+
+
+def _resource_log_path(args: "_RunnerArgs") -> str:
+    # XLSYNTH_RESOURCE_LOG wins so tests can opt in with --test_env; build
+    # actions get the path from `--resource_log`.
+    env_path = os.environ.get("XLSYNTH_RESOURCE_LOG", "")
+    if env_path:
+        return env_path
+    return args.resource_log
+
+
+def _usage_record(args: "_RunnerArgs", *, tool: str, subcommand: str) -> "Dict[str, Any]":
+    return {
+        "label": args.label or os.environ.get("TEST_TARGET", ""),
+        "mode": args.mode,
+        "tool": tool,
+        "subcommand": subcommand,
+    }
+
+
+def _wait_status_exit_code(status: int) -> int:
+    # Decodes a wait status the way subprocess reports return codes: the
+    # negated signal number for a killed child. os.waitstatus_to_exitcode
+    # needs Python 3.9.
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _run_and_record_usage(
+        cmd: "List[str]",
+        *,
+        env: "Dict[str, str]",
+        stdout: "Any",
+        stderr: "Any",
+        usage_log: str,
+        usage_record: "Dict[str, Any]",
+        timeout: "Optional[float]",
+        sys_platform: str) -> "Any":
+    # Waits for the tool with wait4 rather than diffing
+    # getrusage(RUSAGE_CHILDREN), so concurrent worker requests each get only
+    # their own child's usage. At most one pipe is open, so reading it to EOF
+    # before waiting cannot deadlock.
+    import json
+    import subprocess
+    import time
+
+    start = time.monotonic()
+    proc = subprocess.Popen(cmd, env = env, stdout = stdout, stderr = stderr)
+    timer = None
+    killed: List[bool] = []
+    if timeout is not None:
+        import threading
+
+        def kill() -> None:
+            killed.append(True)
+            proc.kill()
+
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+    pipe = proc.stdout if proc.stdout is not None else proc.stderr
+    captured = b""
+    if pipe is not None:
+        captured = pipe.read()
+        pipe.close()
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall_seconds = time.monotonic() - start
+    proc.returncode = _wait_status_exit_code(status)
+    if timer is not None:
+        timer.cancel()
+    timed_out = bool(killed)
+
+    # ru_maxrss is reported in bytes on macOS and in KiB elsewhere.
+    max_rss_kb = usage.ru_maxrss // 1024 if sys_platform == "darwin" else usage.ru_maxrss
+    record = dict(usage_record)
+    record.update({
+        "exit_code": proc.returncode,
+        "wall_seconds": round(wall_seconds, 6),
+        "user_seconds": round(usage.ru_utime, 6),
+        "sys_seconds": round(usage.ru_stime, 6),
+        "max_rss_kb": max_rss_kb,
+    })
+    if timed_out:
+        record["timed_out"] = True
+    # One O_APPEND write per record keeps concurrent writers from interleaving
+    # lines in a shared log. A log that cannot be written must not fail the
+    # action the tool already finished.
+    line = (json.dumps(record, sort_keys = True) + "\\n").encode("utf-8")
+    try:
+        fd = os.open(usage_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        sys.stderr.write("xlsynth_runner: cannot write resource log {}: {}\\n".format(usage_log, e))
+    if timed_out and timeout is not None:
+        raise subprocess.TimeoutExpired(cmd, timeout, output = captured)
+    return proc.returncode, captured
 
 
-def _driver(args: argparse.Namespace) -> int:
-    toolchain_data = _parse_toolchain_toml(args.toolchain)
+def _driver(
+        args: "_RunnerArgs",
+        output: "Optional[List[str]]" = None,
+        exec_in_place: bool = False) -> int:
+    toolchain_data = _load_toolchain_toml(args.toolchain)
     extra_env = {}
     tool_path = _toolchain_tool_path(toolchain_data)
     if tool_path:
@@ -241,64 +621,1149 @@ def _driver(args: argparse.Namespace) -> int:
         args.subcommand,
         *list(args.passthrough),
     ]
+    if (args.fraig_timeout or args.fraig_max_gates) and args.subcommand != "ir2gates":
+        raise RuntimeError("--fraig_timeout and --fraig_max_gates are only supported for ir2gates")
+    if args.subcommand == "ir2gates" and _flag_value(cmd, "output_json"):
+        # Every ir2gates metrics JSON records its fraig status, budget or not.
+        return _ir2gates_recording_fraig(
+            cmd,
+            timeout = float(args.fraig_timeout or "0"),
+            max_gates = int(args.fraig_max_gates or "0"),
+            stdout_path = args.stdout_path,
+            extra_env = extra_env,
+            runtime_library_path = args.runtime_library_path,
+            output = output,
+            usage_log = _resource_log_path(args),
+            usage_record = _usage_record(args, tool = "xlsynth-driver", subcommand = args.subcommand),
+            token_pool = _token_pool(args, args.subcommand),
+        )
+    if args.stage_search_max:
+        if args.subcommand != "ir2pipeline":
+            raise RuntimeError("--stage_search_max is only supported for ir2pipeline")
+        return _search_min_pipeline_stages(
+            cmd,
+            max_stages = int(args.stage_search_max),
+            jobs = int(args.stage_search_jobs or "1"),
+            delay_info_path = args.stage_search_delay_info,
+            report_path = args.stage_search_report,
+            stdout_path = args.stdout_path,
+            extra_env = extra_env,
+            runtime_library_path = args.runtime_library_path,
+            output = output,
+            usage_log = _resource_log_path(args),
+            usage_record = _usage_record(args, tool = "xlsynth-driver", subcommand = args.subcommand),
+        )
     return _run_subprocess(
         cmd,
         extra_env = extra_env,
         runtime_library_path = args.runtime_library_path,
         stdout_path = args.stdout_path,
+        output = output,
+        exec_in_place = exec_in_place,
+        usage_log = _resource_log_path(args),
+        usage_record = _usage_record(args, tool = "xlsynth-driver", subcommand = args.subcommand),
+        token_pool = _token_pool(args, args.subcommand),
     )
 
 
-def _tool(args: argparse.Namespace) -> int:
-    toolchain_data = _parse_toolchain_toml(args.toolchain)
+def _replace_flag(cmd: "List[str]", name: str, value: str) -> "List[str]":
+    # Returns `cmd` with `--name=<anything>` replaced by `--name=value`, or
+    # with that flag appended when `cmd` does not have it.
+    prefix = "--{}=".format(name)
+    if any(arg.startswith(prefix) for arg in cmd):
+        return [prefix + value if arg.startswith(prefix) else arg for arg in cmd]
+    return cmd + [prefix + value]
+
+
+def _flag_value(cmd: "List[str]", name: str) -> str:
+    prefix = "--{}=".format(name)
+    return next((arg[len(prefix):] for arg in cmd if arg.startswith(prefix)), "")
+
+
+def _ir2gates_recording_fraig(
+        cmd: "List[str]",
+        *,
+        timeout: float,
+        max_gates: int,
+        stdout_path: str,
+        extra_env: "Dict[str, str]",
+        runtime_library_path: str,
+        output: "Optional[List[str]]",
+        usage_log: str,
+        usage_record: "Dict[str, Any]",
+        token_pool: "Optional[Tuple[str, str, int]]" = None) -> int:
+    # Runs `ir2gates` and records under "fraig" in its metrics JSON whether
+    # fraig was `disabled`, `completed`, `skipped`, or `timed_out`. Optional
+    # budgets bound the fraig pass from outside the driver. With `max_gates`,
+    # a run without fraig comes first and fraig is skipped when that graph is
+    # larger. With `timeout`, a fraig run still going after that many seconds
+    # is killed and the unfraiged result is kept.
+    import json
+    import shutil
+    import subprocess
+    import tempfile
+    import time
+
+    json_path = _flag_value(cmd, "output_json")
+    fraig_enabled = _flag_value(cmd, "fraig") != "false"
+    if not fraig_enabled and (timeout > 0 or max_gates > 0):
+        raise RuntimeError("a fraig budget needs --fraig=true")
+
+    def run(run_cmd: "List[str]", run_stdout_path: str, run_timeout: "Optional[float]") -> int:
+        return _run_subprocess(
+            run_cmd,
+            extra_env = extra_env,
+            runtime_library_path = runtime_library_path,
+            stdout_path = run_stdout_path,
+            output = output,
+            usage_log = usage_log,
+            usage_record = usage_record,
+            timeout = run_timeout,
+            token_pool = token_pool,
+        )
+
+    def record(status: str, **details: "Any") -> None:
+        if not json_path:
+            return
+        with open(json_path, "r", encoding = "utf-8") as f:
+            metrics = json.load(f)
+        metrics["fraig"] = dict(details, status = status)
+        with open(json_path, "w", encoding = "utf-8") as f:
+            json.dump(metrics, f, indent = 2, sort_keys = True)
+            f.write("\\n")
+
+    if not fraig_enabled:
+        returncode = run(cmd, stdout_path, None)
+        if returncode == 0:
+            record("disabled")
+        return returncode
+
+    unfraiged_cmd = _replace_flag(cmd, "fraig", "false")
+    have_unfraiged = False
+    if max_gates > 0:
+        returncode = run(unfraiged_cmd, stdout_path, None)
+        if returncode != 0:
+            return returncode
+        have_unfraiged = True
+        gates = None
+        if json_path:
+            gates = _first_metric(_gate_metrics(json_path), _GATE_COUNT_KEYS)
+        if gates is not None and gates > max_gates:
+            record("skipped", gates_before_fraig = gates, max_gates = max_gates)
+            return 0
+
+    if timeout <= 0:
+        start = time.monotonic()
+        returncode = run(cmd, stdout_path, None)
+        if returncode == 0:
+            record("completed", seconds = round(time.monotonic() - start, 3))
+        return returncode
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fraig_stdout = os.path.join(tmp, "gates.txt")
+        fraig_json = os.path.join(tmp, "metrics.json")
+        fraig_cmd = _replace_flag(cmd, "output_json", fraig_json) if json_path else cmd
+        start = time.monotonic()
+        try:
+            returncode = run(fraig_cmd, fraig_stdout if stdout_path else "", timeout)
+        except subprocess.TimeoutExpired:
+            if not have_unfraiged:
+                returncode = run(unfraiged_cmd, stdout_path, None)
+                if returncode != 0:
+                    return returncode
+            record("timed_out", timeout_seconds = timeout)
+            return 0
+        if returncode != 0:
+            return returncode
+        if stdout_path:
+            shutil.copyfile(fraig_stdout, stdout_path)
+        if json_path:
+            shutil.copyfile(fraig_json, json_path)
+    record("completed", seconds = round(time.monotonic() - start, 3))
+    return 0
+
+
+def _stage_search_probes(candidates: "List[int]", jobs: int) -> "List[int]":
+    # Splits the remaining candidates into `jobs + 1` runs and probes the
+    # boundaries, so each round of `jobs` concurrent probes shrinks the range
+    # by that factor; with one job this is a binary search.
+    if len(candidates) <= jobs:
+        return candidates
+    return sorted({candidates[(i + 1) * len(candidates) // (jobs + 1)] for i in range(jobs)})
+
+
+def _search_min_pipeline_stages(
+        cmd: "List[str]",
+        *,
+        max_stages: int,
+        jobs: int,
+        delay_info_path: str,
+        report_path: str,
+        stdout_path: str,
+        extra_env: "Dict[str, str]",
+        runtime_library_path: str,
+        output: "Optional[List[str]]",
+        usage_log: str,
+        usage_record: "Dict[str, Any]") -> int:
+    # Finds the fewest pipeline stages at which `cmd` (an ir2pipeline command
+    # with a clock period) schedules, assuming that a pipeline which meets
+    # timing at N stages also meets it at N + 1. The combinational critical
+    # path divided by the clock period is a lower bound, since no node is
+    # split across stages. Each round probes up to `jobs` stage counts
+    # concurrently; the winning Verilog goes to `stdout_path` and every probe
+    # is listed in the JSON report.
+    import concurrent.futures
+    import json
+    import shutil
+    import tempfile
+    import time
+
+    clock_period_ps = 0
+    for arg in cmd:
+        if arg.startswith("--clock_period_ps="):
+            clock_period_ps = int(arg[len("--clock_period_ps="):])
+    if clock_period_ps <= 0:
+        raise RuntimeError("the pipeline stage search needs --clock_period_ps")
+    critical_path_ps = None
+    if delay_info_path:
+        with open(delay_info_path, "r", encoding = "utf-8", errors = "replace") as f:
+            critical_path_ps = _critical_path_ps(f.read())
+    lower_bound = 1
+    if critical_path_ps is not None:
+        lower_bound = max(1, -(-critical_path_ps // clock_period_ps))
+
+    def report(text: str) -> None:
+        if output is None:
+            sys.stderr.write(text)
+        else:
+            output.append(text)
+
+    probes: List[Dict[str, Any]] = []
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def probe(stages: int) -> "Dict[str, Any]":
+            start = time.monotonic()
+            captured: List[str] = []
+            returncode = _run_subprocess(
+                cmd + ["--pipeline_stages={}".format(stages)],
+                extra_env = extra_env,
+                runtime_library_path = runtime_library_path,
+                stdout_path = os.path.join(tmp, "{}.sv".format(stages)),
+                output = captured,
+                usage_log = usage_log,
+                usage_record = dict(usage_record, subcommand = "ir2pipeline --pipeline_stages={}".format(stages)),
+            )
+            result: Dict[str, Any] = {
+                "pipeline_stages": stages,
+                "status": "scheduled" if returncode == 0 else "failed",
+                "wall_seconds": round(time.monotonic() - start, 3),
+            }
+            if returncode != 0:
+                result["error"] = _status_error({"exit_code": returncode, "log": "".join(captured)})
+            return result
+
+        low = lower_bound
+        search_round = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers = jobs) as executor:
+            while True:
+                high = best - 1 if best is not None else max_stages
+                candidates = list(range(low, high + 1))
+                if not candidates:
+                    break
+                search_round += 1
+                for result in executor.map(probe, _stage_search_probes(candidates, jobs)):
+                    result["round"] = search_round
+                    probes.append(result)
+                    if result["status"] == "scheduled":
+                        best = result["pipeline_stages"] if best is None else min(best, result["pipeline_stages"])
+                    else:
+                        low = max(low, result["pipeline_stages"] + 1)
+        if best is not None and stdout_path:
+            shutil.copyfile(os.path.join(tmp, "{}.sv".format(best)), stdout_path)
+
+    if report_path:
+        with open(report_path, "w", encoding = "utf-8") as f:
+            json.dump({
+                "clock_period_ps": clock_period_ps,
+                "critical_path_ps": critical_path_ps,
+                "lower_bound": lower_bound,
+                "max_pipeline_stages": max_stages,
+                "pipeline_stages": best,
+                "probes": probes,
+            }, f, indent = 2, sort_keys = True)
+            f.write("\\n")
+    if best is None:
+        report("no pipeline of {} to {} stages meets a {}ps clock:\\n".format(lower_bound, max_stages, clock_period_ps))
+        for result in probes:
+            report("  {} stages: {}\\n".format(result["pipeline_stages"], result.get("error", result["status"])))
+        return 1
+    return 0
+
+
+def _tool(
+        args: "_RunnerArgs",
+        output: "Optional[List[str]]" = None,
+        exec_in_place: bool = False) -> int:
+    toolchain_data = _load_toolchain_toml(args.toolchain)
     tool_path_root = _toolchain_tool_path(toolchain_data)
     if not tool_path_root:
         raise RuntimeError("Toolchain TOML is missing toolchain.tool_path")
     tool_path = _resolve_runtime_path(os.path.join(tool_path_root, args.tool))
     passthrough = list(args.passthrough)
+    if args.passthrough_file:
+        # Test scripts keep long DSLX source lists out of argv this way.
+        with open(args.passthrough_file, "r", encoding = "utf-8") as f:
+            passthrough.extend(f.read().splitlines())
+    if args.tool == "dslx_interpreter_main" and os.environ.get("TEST_TOTAL_SHARDS"):
+        shard_filter = _dslx_test_shard_filter(passthrough)
+        if shard_filter is None:
+            return 0
+        passthrough.extend(shard_filter)
     extra = _build_extra_args_for_tool(args.tool, toolchain_data)
     if extra:
         passthrough = extra + passthrough
 
     cmd = [tool_path, *passthrough]
+    if args.fmt_in_place:
+        if args.tool != "dslx_fmt":
+            raise RuntimeError("--fmt_in_place is only supported for dslx_fmt")
+        return _format_in_place(
+            [tool_path, *extra],
+            args.fmt_in_place,
+            list(args.passthrough),
+            jobs = int(args.fmt_jobs or "0") or _available_cpus(),
+            runtime_library_path = args.runtime_library_path,
+        )
+    if args.fmt_report:
+        if args.tool != "dslx_fmt":
+            raise RuntimeError("--fmt_report is only supported for dslx_fmt")
+        return _check_formatting(
+            [tool_path, *extra],
+            list(args.passthrough),
+            jobs = int(args.fmt_jobs or "0") or _available_cpus(),
+            report_path = args.fmt_report,
+            runtime_library_path = args.runtime_library_path,
+            output = output,
+            usage_log = _resource_log_path(args),
+            usage_record = _usage_record(args, tool = args.tool, subcommand = ""),
+        )
+    if args.tool == "prove_quickcheck_main":
+        # `top` reaches the tool as an explicit `--test_filter`. Without it, a
+        # sharded test proves only its share of the library's quickchecks; if
+        # the scan finds none, the first shard runs the tool unfiltered. A
+        # time budget or `--quickcheck_jobs` proves each function in a
+        # process of its own.
+        module = _first_positional(args.passthrough)
+        quickchecks = dict(_dslx_annotations(module, ("quickcheck",))) if module else {}
+        names = [arg[len("--test_filter="):] for arg in args.passthrough if arg.startswith("--test_filter=")]
+        if not names:
+            names = list(quickchecks)
+            if os.environ.get("TEST_TOTAL_SHARDS"):
+                names = _test_shard_share(names)
+                if not names and int(os.environ.get("TEST_SHARD_INDEX", "0")) != 0:
+                    return 0
+                if names:
+                    cmd.append(_full_match_test_filter(names))
+        jobs = int(args.quickcheck_jobs or "1")
+        budget = float(args.quickcheck_timeout or "0")
+        if names and (jobs != 1 or budget > 0):
+            module_args = [arg for arg in args.passthrough if not arg.startswith("--test_filter=")]
+            fallback_cmd = None
+            if budget > 0:
+                fallback_cmd = [
+                    _resolve_runtime_path(os.path.join(tool_path_root, "dslx_interpreter_main")),
+                    *_build_extra_args_for_tool("dslx_interpreter_main", toolchain_data),
+                    *module_args,
+                ]
+            return _prove_quickchecks_separately(
+                [tool_path, *extra, *module_args],
+                [(name, _quickcheck_sample_count(quickchecks.get(name, ""))) for name in names],
+                jobs = jobs if jobs > 0 else _available_cpus(),
+                budget = budget,
+                fallback_cmd = fallback_cmd,
+                runtime_library_path = args.runtime_library_path,
+                output = output,
+                usage_log = _resource_log_path(args),
+                usage_record = _usage_record(args, tool = args.tool, subcommand = ""),
+                token_pool = _token_pool(args, args.tool),
+            )
     return _run_subprocess(
         cmd,
         runtime_library_path = args.runtime_library_path,
         stdout_path = args.stdout_path,
+        output = output,
+        exec_in_place = exec_in_place,
+        usage_log = _resource_log_path(args),
+        usage_record = _usage_record(args, tool = args.tool, subcommand = ""),
+        token_pool = _token_pool(args, args.tool),
     )
 
 
-def main(argv: List[str]) -> int:
-    parser = argparse.ArgumentParser(prog="xlsynth_runner", allow_abbrev=False)
-    sub = parser.add_subparsers(dest="mode")
-
-    # No global arguments; subcommands define their own.
-
-    p_driver = sub.add_parser("driver")
-    p_driver.add_argument("--driver_path", required=True)
-    p_driver.add_argument("--runtime_library_path", default="")
-    p_driver.add_argument("--stdout_path", default="")
-    p_driver.add_argument("--toolchain", required=True)
-    p_driver.add_argument("subcommand")
-    p_driver.set_defaults(func=_driver)
-
-    p_tool = sub.add_parser("tool")
-    p_tool.add_argument("--runtime_library_path", default="")
-    p_tool.add_argument("--stdout_path", default="")
-    p_tool.add_argument("--toolchain", required=True)
-    p_tool.add_argument("tool")
-    p_tool.set_defaults(func=_tool)
-
-    # We intentionally use parse_known_args so that only flags defined on the selected
-    # subparser are consumed here. All remaining args are treated
-    # as passthrough and forwarded verbatim to the underlying tool/driver subcommand.
-    args, unknown = parser.parse_known_args(argv[1:])
-    if args.mode is None:
-        parser.print_usage()
+def _dslx_annotations(path: str, attributes: "Tuple[str, ...]") -> "List[Tuple[str, str]]":
+    # Returns, in source order, `(name, attribute arguments)` for the functions
+    # and procs declared right after `#[attr]` or `#[attr(...)]` for any of
+    # `attributes`.
+    import re
+
+    with open(path, "r", encoding = "utf-8", errors = "replace") as f:
+        text = "\\n".join(line.split("//", 1)[0] for line in f)
+    pattern = re.compile(r"#\\[(\\w+)(?:\\(([^\\]]*)\\))?\\]\\s*(?:pub\\s+)?(?:fn|proc)\\s+(\\w+)")
+    return [(m.group(3), m.group(2) or "") for m in pattern.finditer(text) if m.group(1) in attributes]
+
+
+def _dslx_annotated_names(path: str, attributes: "Tuple[str, ...]") -> "List[str]":
+    return [name for name, _ in _dslx_annotations(path, attributes)]
+
+
+# The interpreter's sample count for a `#[quickcheck]` without `test_count`.
+_DEFAULT_QUICKCHECK_TEST_COUNT = 1000
+
+
+def _quickcheck_sample_count(attribute_args: str) -> "Optional[int]":
+    # Returns how many random samples the interpreter runs for a quickcheck
+    # with these attribute arguments, or None for `exhaustive`.
+    for part in attribute_args.split(","):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if key == "exhaustive":
+            return None
+        if key == "test_count":
+            try:
+                return int(value.strip().replace("_", ""), 0)
+            except ValueError:
+                break
+    return _DEFAULT_QUICKCHECK_TEST_COUNT
+
+
+def _test_shard_share(names: "List[str]") -> "List[str]":
+    # Implements Bazel's test sharding protocol: acknowledges it through
+    # TEST_SHARD_STATUS_FILE and deals `names` round-robin across the shards.
+    status_file = os.environ.get("TEST_SHARD_STATUS_FILE")
+    if status_file:
+        with open(status_file, "a", encoding = "utf-8"):
+            pass
+    total = int(os.environ["TEST_TOTAL_SHARDS"])
+    index = int(os.environ.get("TEST_SHARD_INDEX", "0"))
+    return names[index::total]
+
+
+# The interpreter's `--test_filter` selects `#[test]`, `#[test_proc]`, and
+# `#[quickcheck]` functions alike, so shards and the quickcheck sampling
+# fallback both select functions by name with one full-match filter.
+_FILTERABLE_TEST_ATTRIBUTES = ("test", "test_proc", "quickcheck")
+
+
+def _full_match_test_filter(names: "List[str]") -> str:
+    return "--test_filter=^(?:{})$".format("|".join(names))
+
+
+def _first_positional(passthrough: "List[str]") -> str:
+    return next((arg for arg in passthrough if not arg.startswith("-")), "")
+
+
+def _dslx_test_shard_filter(passthrough: "List[str]") -> "Optional[List[str]]":
+    # Gives this dslx_test shard its share of the module's tests and
+    # quickchecks through the interpreter's `--test_filter`. Returns None when
+    # the shard has nothing to run; if the scan finds none, the first shard
+    # runs unfiltered.
+    module = _first_positional(passthrough)
+    names = _dslx_annotated_names(module, _FILTERABLE_TEST_ATTRIBUTES) if module else []
+    selected = _test_shard_share(names)
+    if selected:
+        return [_full_match_test_filter(selected)]
+    if not names and int(os.environ.get("TEST_SHARD_INDEX", "0")) == 0:
+        return []
+    return None
+
+
+def _available_cpus() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def _prove_quickchecks_separately(
+        cmd: "List[str]",
+        quickchecks: "List[Tuple[str, Optional[int]]]",
+        *,
+        jobs: int,
+        budget: float,
+        fallback_cmd: "Optional[List[str]]",
+        runtime_library_path: str,
+        output: "Optional[List[str]]",
+        usage_log: str,
+        usage_record: "Dict[str, Any]",
+        token_pool: "Optional[Tuple[str, str, int]]" = None) -> int:
+    # Proves each quickcheck in its own prove_quickcheck_main process, at most
+    # `jobs` at a time. A proof still running after `budget` seconds is killed
+    # and the quickcheck is sampled with `fallback_cmd` (the interpreter)
+    # instead, which at best leaves it unproven. Every result is reported as
+    # it finishes and, in a test, also written to quickcheck_results.json in
+    # the undeclared outputs directory. Fails if any quickcheck fails. Only
+    # proofs draw from `token_pool`; the sampling fallback runs freely.
+    import concurrent.futures
+    import json
+    import subprocess
+    import time
+
+    def run(
+            run_cmd: "List[str]",
+            name: str,
+            timeout: "Optional[float]",
+            run_token_pool: "Optional[Tuple[str, str, int]]") -> "Tuple[Optional[int], float, str]":
+        start = time.monotonic()
+        captured: List[str] = []
+        try:
+            returncode = _run_subprocess(
+                run_cmd + [_full_match_test_filter([name])],
+                runtime_library_path = runtime_library_path,
+                stdout_path = "",
+                output = captured,
+                usage_log = usage_log,
+                usage_record = dict(usage_record, tool = os.path.basename(run_cmd[0]), subcommand = name),
+                timeout = timeout,
+                token_pool = run_token_pool,
+            )
+        except subprocess.TimeoutExpired:
+            returncode = None
+        return returncode, time.monotonic() - start, "".join(captured)
+
+    def prove(quickcheck: "Tuple[str, Optional[int]]") -> "Dict[str, Any]":
+        name, samples = quickcheck
+        returncode, seconds, captured = run(cmd, name, budget if budget > 0 else None, token_pool)
+        result: Dict[str, Any] = {
+            "name": name,
+            "status": "proved" if returncode == 0 else "failed",
+            "proof_seconds": round(seconds, 3),
+            "timed_out": returncode is None,
+        }
+        if returncode is None and fallback_cmd is not None:
+            returncode, seconds, captured = run(fallback_cmd, name, None, None)
+            result.update({
+                "status": "unproven" if returncode == 0 else "failed",
+                "samples": samples,
+                "sample_seconds": round(seconds, 3),
+            })
+        result["log"] = captured
+        return result
+
+    def report(text: str) -> None:
+        if output is None:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        else:
+            output.append(text)
+
+    results: List[Dict[str, Any]] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers = jobs) as executor:
+        futures = [executor.submit(prove, quickcheck) for quickcheck in quickchecks]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["status"] == "failed":
+                report(result["log"])
+            if result["timed_out"]:
+                samples = result.get("samples")
+                detail = "proof budget of {:g}s exceeded; {} {} in {:.1f}s".format(
+                    budget,
+                    "exhaustive run" if samples is None else "{} samples".format(samples),
+                    "passed" if result["status"] == "unproven" else "failed",
+                    result.get("sample_seconds", 0.0),
+                )
+            else:
+                detail = "{:.1f}s".format(result["proof_seconds"])
+            report("[ {} ] {} ({})\\n".format(result["status"].upper(), result["name"], detail))
+    counts = {status: sum(1 for result in results if result["status"] == status) for status in ("proved", "unproven", "failed")}
+    report("{proved} proved, {unproven} unproven, {failed} failed\\n".format(**counts))
+
+    outputs_dir = os.environ.get("TEST_UNDECLARED_OUTPUTS_DIR")
+    if outputs_dir:
+        by_name = {result["name"]: result for result in results}
+        ordered = [by_name[name] for name, _ in quickchecks]
+        with open(os.path.join(outputs_dir, "quickcheck_results.json"), "w", encoding = "utf-8") as f:
+            json.dump(
+                [{key: value for key, value in result.items() if key != "log"} for result in ordered],
+                f,
+                indent = 2,
+                sort_keys = True,
+            )
+            f.write("\\n")
+    return 1 if counts["failed"] else 0
+
+
+def _check_formatting(
+        cmd: "List[str]",
+        srcs: "List[str]",
+        *,
+        jobs: int,
+        report_path: str,
+        runtime_library_path: str,
+        output: "Optional[List[str]]",
+        usage_log: str,
+        usage_record: "Dict[str, Any]") -> int:
+    # Formats every source with `cmd` from a pool of `jobs` threads and writes
+    # one unified diff per misformatted file to `report_path`, which stays
+    # empty when every file is already formatted. Fails only if the formatter
+    # itself fails on a file.
+    import concurrent.futures
+    import difflib
+    import tempfile
+
+    def report(text: str) -> None:
+        if output is None:
+            sys.stderr.write(text)
+        else:
+            output.append(text)
+
+    with tempfile.TemporaryDirectory() as tmp:
+
+        def check(index: int, src: str) -> "Tuple[int, str, str]":
+            formatted_path = os.path.join(tmp, "{}.x".format(index))
+            captured: List[str] = []
+            returncode = _run_subprocess(
+                cmd + [src],
+                runtime_library_path = runtime_library_path,
+                stdout_path = formatted_path,
+                output = captured,
+                usage_log = usage_log,
+                usage_record = usage_record,
+            )
+            if returncode != 0:
+                return returncode, "".join(captured), ""
+            with open(src, "r", encoding = "utf-8") as f:
+                original = f.read()
+            with open(formatted_path, "r", encoding = "utf-8") as f:
+                formatted = f.read()
+            if original == formatted:
+                return 0, "", ""
+            diff = "".join(difflib.unified_diff(
+                original.splitlines(True),
+                formatted.splitlines(True),
+                src,
+                src + " (formatted)",
+            ))
+            return 0, "", diff if diff.endswith("\\n") else diff + "\\n"
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers = jobs) as executor:
+            results = list(executor.map(check, range(len(srcs)), srcs))
+
+    failed = 0
+    misformatted: List[str] = []
+    with open(report_path, "w", encoding = "utf-8") as f:
+        for src, (returncode, log, diff) in zip(srcs, results):
+            if returncode != 0:
+                failed += 1
+                report("dslx_fmt failed on {}:\\n{}".format(src, log))
+            elif diff:
+                misformatted.append(src)
+                f.write(diff)
+        if misformatted:
+            f.write("\\n{} of {} files need formatting. Run `dslx_fmt -i <file>` on:\\n".format(len(misformatted), len(srcs)))
+            f.writelines("  {}\\n".format(src) for src in misformatted)
+    return 1 if failed else 0
+
+
+def _git_lines(workspace: str, git_args: "List[str]") -> "List[str]":
+    import subprocess
+
+    proc = subprocess.run(
+        ["git", "-C", workspace] + git_args,
+        check = False,
+        stdout = subprocess.PIPE,
+        stderr = subprocess.DEVNULL,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError("git {} failed in {}".format(" ".join(git_args), workspace))
+    return [line for line in proc.stdout.decode("utf-8").splitlines() if line]
+
+
+def _workspace_dslx_files(workspace: str, scope: str, paths: "List[str]") -> "List[str]":
+    # Returns workspace-relative `.x` files under `paths` (default: the whole
+    # workspace). Scope `all` lists tracked and untracked, non-ignored files
+    # when the workspace is a git checkout and walks it otherwise, skipping
+    # `bazel-*` convenience links and hidden directories. Scope `changed` or
+    # `changed:<rev>` lists only files that differ from HEAD or <rev>.
+    pathspec = ["--"] + [os.path.join(path, "*.x") if not path.endswith(".x") else path for path in paths or ["."]]
+    if scope == "all":
+        if os.path.isdir(os.path.join(workspace, ".git")) or os.path.isfile(os.path.join(workspace, ".git")):
+            files = _git_lines(workspace, ["ls-files", "--cached", "--others", "--exclude-standard"] + pathspec)
+        else:
+            files = []
+            for root in paths or ["."]:
+                for dirpath, dirnames, filenames in os.walk(os.path.join(workspace, root)):
+                    dirnames[:] = sorted(d for d in dirnames if not d.startswith((".", "bazel-")))
+                    rel = os.path.relpath(dirpath, workspace)
+                    files.extend(os.path.normpath(os.path.join(rel, name)) for name in sorted(filenames) if name.endswith(".x"))
+    elif scope == "changed" or scope.startswith("changed:"):
+        base = scope[len("changed:"):] or "HEAD"
+        # `--relative` keeps the paths workspace-relative, like `ls-files`, when
+        # the workspace is a subdirectory of the checkout.
+        files = _git_lines(workspace, ["diff", "--name-only", "--relative", "--diff-filter=ACMR", base] + pathspec)
+        files += _git_lines(workspace, ["ls-files", "--others", "--exclude-standard"] + pathspec)
+    else:
+        raise RuntimeError("--fmt_in_place must be all, changed or changed:<rev>; got {!r}".format(scope))
+    return sorted(set(f for f in files if f.endswith(".x") and os.path.isfile(os.path.join(workspace, f))))
+
+
+def _file_sha256(path: str) -> str:
+    import hashlib
+
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _format_in_place(
+        cmd: "List[str]",
+        scope: str,
+        paths: "List[str]",
+        *,
+        jobs: int,
+        runtime_library_path: str) -> int:
+    # Reformats the workspace's DSLX files in place from `bazel run`, `jobs`
+    # formatter processes at a time. Files whose content hash matches the hash
+    # recorded after the previous run with the same formatter binary are
+    # skipped without starting the formatter.
+    import concurrent.futures
+    import hashlib
+    import json
+
+    workspace = os.environ.get("BUILD_WORKSPACE_DIRECTORY")
+    if not workspace:
+        raise RuntimeError("--fmt_in_place must run under `bazel run`")
+    formatter_stat = os.stat(cmd[0])
+    formatter_id = "{}:{}:{}".format(os.path.realpath(cmd[0]), formatter_stat.st_size, formatter_stat.st_mtime_ns)
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "rules_xlsynth",
+        "dslx_fmt",
+    )
+    cache_path = os.path.join(cache_dir, hashlib.sha256(workspace.encode("utf-8")).hexdigest() + ".json")
+    known: Dict[str, str] = {}
+    try:
+        with open(cache_path, "r", encoding = "utf-8") as f:
+            cache = json.load(f)
+        if cache.get("formatter") == formatter_id:
+            known = cache.get("files", {})
+    except (OSError, ValueError):
+        pass
+
+    files = _workspace_dslx_files(workspace, scope, paths)
+    pending = [f for f in files if known.get(f) != _file_sha256(os.path.join(workspace, f))]
+
+    def format_file(rel: str) -> "Tuple[str, int, str, str, str]":
+        path = os.path.join(workspace, rel)
+        before = _file_sha256(path)
+        captured: List[str] = []
+        returncode = _run_subprocess(
+            cmd + ["-i", path],
+            runtime_library_path = runtime_library_path,
+            stdout_path = "",
+            output = captured,
+        )
+        return rel, returncode, "".join(captured), before, _file_sha256(path)
+
+    changed: List[str] = []
+    failed: List[str] = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers = jobs) as executor:
+        for rel, returncode, log, before, after in executor.map(format_file, pending):
+            if returncode != 0:
+                failed.append(rel)
+                known.pop(rel, None)
+                sys.stderr.write("dslx_fmt failed on {}:\\n{}".format(rel, log))
+                continue
+            known[rel] = after
+            if after != before:
+                changed.append(rel)
+                sys.stdout.write("formatted {}\\n".format(rel))
+
+    if scope == "all" and not paths:
+        known = {rel: known[rel] for rel in files if rel in known}
+    os.makedirs(cache_dir, exist_ok = True)
+    tmp_cache_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    with open(tmp_cache_path, "w", encoding = "utf-8") as f:
+        json.dump({"formatter": formatter_id, "files": known}, f, indent = 0, sort_keys = True)
+    os.replace(tmp_cache_path, cache_path)
+    sys.stdout.write("{} DSLX files: {} reformatted, {} already formatted, {} skipped by cache, {} failed\\n".format(
+        len(files),
+        len(changed),
+        len(pending) - len(changed) - len(failed),
+        len(files) - len(pending),
+        len(failed),
+    ))
+    return 1 if failed else 0
+
+
+def _split_use_items(text: str) -> "List[str]":
+    # Splits the inside of a `use` brace group at its top-level commas.
+    items = []
+    depth = 0
+    start = 0
+    for index, char in enumerate(text):
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth < 0:
+                raise ValueError("Unbalanced braces in use tree: {}".format(text))
+        elif char == "," and depth == 0:
+            items.append(text[start:index])
+            start = index + 1
+    if depth != 0:
+        raise ValueError("Unbalanced braces in use tree: {}".format(text))
+    items.append(text[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def _use_tree_paths(tree: str, prefix: "List[str]") -> "List[List[str]]":
+    # Expands `a::b::{c, d::{e, f as g}}` into [a, b, c], [a, b, d, e], and
+    # [a, b, d, f]. Raises ValueError on a tree it cannot read.
+    brace = tree.find("{")
+    if brace < 0:
+        parts = [part.strip() for part in tree.split(" as ", 1)[0].split("::")]
+        if not all(parts):
+            raise ValueError("Unsupported use tree: {}".format(tree))
+        return [prefix + parts]
+    if not tree.endswith("}"):
+        raise ValueError("Unsupported use tree: {}".format(tree))
+    head = [part.strip() for part in tree[:brace].split("::")]
+    if head[-1]:
+        raise ValueError("Unsupported use tree: {}".format(tree))
+    head = head[:-1]
+    if not all(head):
+        raise ValueError("Unsupported use tree: {}".format(tree))
+    paths: List[List[str]] = []
+    for item in _split_use_items(tree[brace + 1:-1]):
+        paths.extend(_use_tree_paths(item, prefix + head))
+    return paths
+
+
+def _dslx_imports(path: str) -> "List[str]":
+    # Returns the dotted module paths named by `import a.b.c;` and by every
+    # prefix of each path in `use a::b::{c, d};`, since a `use` path may end
+    # in a module or in a member of one. Statements may span lines. A `use`
+    # tree that cannot be read raises ValueError, so the caller reports
+    # nothing unused rather than dropping a module the tool reads.
+    import re
+
+    with open(path, "r", encoding = "utf-8", errors = "replace") as f:
+        text = "".join(line.split("//", 1)[0] + "\\n" for line in f)
+    modules: List[str] = []
+    for keyword, body in re.findall(r"(?m)^\\s*(?:pub\\s+)?(import|use)\\s+([^;]*);", text):
+        body = " ".join(body.split())
+        if keyword == "import":
+            module = body.split(" as ", 1)[0].strip()
+            if module:
+                modules.append(module)
+            continue
+        for parts in _use_tree_paths(body, []):
+            for end in range(1, len(parts) + 1):
+                modules.append(".".join(parts[:end]))
+    return modules
+
+
+def _dslx_used_sources(main: str, srcs: "List[str]") -> "List[str]":
+    # Walks imports from `main` over the declared sources. A module path
+    # matches every source whose path ends with it, whatever search root
+    # (workspace, bin directory, dslx_path entry) it sits under.
+    by_suffix: Dict[str, List[str]] = {}
+    for src in srcs:
+        if not src.endswith(".x"):
+            continue
+        parts = src[:-len(".x")].split("/")
+        for start in range(len(parts)):
+            by_suffix.setdefault(".".join(parts[start:]), []).append(src)
+    used = {main}
+    pending = [main]
+    while pending:
+        for module in _dslx_imports(pending.pop()):
+            for src in by_suffix.get(module, []):
+                if src not in used:
+                    used.add(src)
+                    pending.append(src)
+    return [src for src in srcs if src in used]
+
+
+def _write_unused_inputs_list(args: "_RunnerArgs") -> None:
+    # Declared DSLX sources that the main module never reaches through its
+    # imports are reported to Bazel, which then ignores them when deciding
+    # whether this action must rerun. Any scan failure reports nothing unused.
+    unused: List[str] = []
+    if args.dslx_main:
+        try:
+            used = set(_dslx_used_sources(args.dslx_main, args.dslx_src))
+        except (OSError, ValueError):
+            used = set(args.dslx_src)
+        unused = [src for src in args.dslx_src if src not in used]
+    with open(args.unused_inputs_list, "w", encoding = "utf-8") as f:
+        for src in unused:
+            f.write(src + "\\n")
+
+
+def _run_recording_status(
+        args: "_RunnerArgs",
+        output: "Optional[List[str]]" = None) -> int:
+    # Sweeps and searches treat a point that fails to schedule as a result,
+    # not a build error: the tool's exit code and diagnostics go to the status
+    # file and the action succeeds with whatever outputs the tool left.
+    import json
+
+    log: List[str] = []
+    exit_code = int(_MODE_FUNCS[args.mode](args, log, False))
+    with open(args.status_path, "w", encoding = "utf-8") as f:
+        json.dump({"exit_code": exit_code, "log": "".join(log)}, f, sort_keys = True)
+        f.write("\\n")
+    if output is not None:
+        output.extend(log)
+    return 0
+
+
+def _status_error(status: "Dict[str, Any]") -> str:
+    lines = [line.strip() for line in status.get("log", "").splitlines() if line.strip()]
+    return lines[-1] if lines else "exit code {}".format(status.get("exit_code"))
+
+
+def _critical_path_ps(text: str) -> "Optional[int]":
+    # `delay_info_main` lists the critical path as `<arrival>ps (+ <delay>ps):`
+    # lines under a `# Critical path` header; the largest arrival time is the
+    # combinational delay of the whole function.
+    import re
+
+    arrivals: List[int] = []
+    in_critical_path = False
+    for line in text.splitlines():
+        if line.startswith("#"):
+            in_critical_path = "critical path" in line.lower()
+            continue
+        if in_critical_path:
+            match = re.match(r"\\s*(\\d+)ps\\b", line)
+            if match:
+                arrivals.append(int(match.group(1)))
+    return max(arrivals) if arrivals else None
+
+
+# `ir2gates --output_json` key names for the headline metrics, newest first.
+_GATE_COUNT_KEYS = ("live_nodes", "gate_count")
+_GATE_DEPTH_KEYS = ("deepest_path", "depth")
+
+
+def _gate_metrics(path: str) -> "Dict[str, Any]":
+    # The numeric top-level fields of an `ir2gates` metrics JSON.
+    import json
+
+    with open(path, "r", encoding = "utf-8") as f:
+        data = json.load(f)
+    return {
+        key: value
+        for key, value in data.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+
+
+def _first_metric(metrics: "Dict[str, Any]", keys: "Tuple[str, ...]") -> "Any":
+    return next((metrics[key] for key in keys if key in metrics), None)
+
+
+class _UsageError(Exception):
+    pass
+
+
+class _RunnerArgs(object):
+
+    def __init__(self, mode: str) -> None:
+        self.mode = mode
+        self.driver_path = ""
+        self.runtime_library_path = ""
+        self.stdout_path = ""
+        self.toolchain = ""
+        self.subcommand = ""
+        self.tool = ""
+        self.label = ""
+        self.resource_log = ""
+        self.concurrency_dir = ""
+        self.concurrency_limit = ""
+        self.unused_inputs_list = ""
+        self.dslx_main = ""
+        self.quickcheck_jobs = ""
+        self.quickcheck_timeout = ""
+        self.fmt_in_place = ""
+        self.fmt_jobs = ""
+        self.fmt_report = ""
+        self.passthrough_file = ""
+        self.status_path = ""
+        self.fraig_max_gates = ""
+        self.fraig_timeout = ""
+        self.stage_search_delay_info = ""
+        self.stage_search_jobs = ""
+        self.stage_search_max = ""
+        self.stage_search_report = ""
+        self.dslx_src = []  # type: List[str]
+        self.passthrough = []  # type: List[str]
+
+
+# Runner flags for each mode. Every flag takes one value, spelled either
+# `--flag value` or `--flag=value`; flags in `_LIST_FLAGS` may repeat.
+_COMMON_FLAGS = ("--concurrency_dir", "--concurrency_limit", "--dslx_main", "--dslx_src", "--label", "--resource_log", "--runtime_library_path", "--status_path", "--stdout_path", "--toolchain", "--unused_inputs_list")
+_MODE_FLAGS = {
+    "driver": ("--driver_path", "--fraig_max_gates", "--fraig_timeout", "--stage_search_delay_info", "--stage_search_jobs", "--stage_search_max", "--stage_search_report") + _COMMON_FLAGS,
+    "tool": ("--fmt_in_place", "--fmt_jobs", "--fmt_report", "--passthrough_file", "--quickcheck_jobs", "--quickcheck_timeout") + _COMMON_FLAGS,
+}
+_LIST_FLAGS = ("--dslx_src",)
+_MODE_REQUIRED_FLAGS = {
+    "driver": ("--driver_path", "--toolchain"),
+    "tool": ("--toolchain",),
+}
+_MODE_POSITIONAL = {
+    "driver": "subcommand",
+    "tool": "tool",
+}
+_MODE_FUNCS = {
+    "driver": _driver,
+    "tool": _tool,
+}
+_USAGE = "usage: xlsynth_runner {driver,tool} ...\\n"
+
+
+def _parse_runner_args(argv: "List[str]") -> "_RunnerArgs":
+    # Only flags defined for the selected mode are consumed here; everything
+    # else after the first positional is passthrough, forwarded verbatim to
+    # the underlying tool/driver subcommand.
+    if not argv or argv[0] not in _MODE_FLAGS:
+        raise _UsageError("expected a mode, one of: driver, tool")
+    mode = argv[0]
+    flags = _MODE_FLAGS[mode]
+    positional = _MODE_POSITIONAL[mode]
+    args = _RunnerArgs(mode)
+    seen_flags = set()
+    seen_positional = False
+    index = 1
+    while index < len(argv):
+        arg = argv[index]
+        name, separator, value = arg.partition("=")
+        if name in flags:
+            if not separator:
+                index += 1
+                if index >= len(argv):
+                    raise _UsageError("argument {}: expected one argument".format(name))
+                value = argv[index]
+            if name in _LIST_FLAGS:
+                getattr(args, name[2:]).append(value)
+            else:
+                setattr(args, name[2:], value)
+            seen_flags.add(name)
+        elif not seen_positional and not arg.startswith("-"):
+            setattr(args, positional, arg)
+            seen_positional = True
+        else:
+            args.passthrough.append(arg)
+        index += 1
+    missing = [flag for flag in _MODE_REQUIRED_FLAGS[mode] if flag not in seen_flags]
+    if not seen_positional:
+        missing.append(positional)
+    if missing:
+        raise _UsageError("the following arguments are required: {}".format(", ".join(missing)))
+    return args
+
+
+def _expand_flagfile(argv: "List[str]") -> "List[str]":
+    # Worker-capable actions pass their whole command line as a single
+    # `@flagfile` argument, which a worker receives already expanded. Outside a
+    # worker the runner reads it itself. No other `@` argument is touched, so a
+    # tool argument that starts with `@` reaches the tool unchanged.
+    if len(argv) != 2 or len(argv[1]) < 2 or not argv[1].startswith("@"):
+        return argv
+    with open(argv[1][1:], "r", encoding = "utf-8") as f:
+        return argv[:1] + f.read().splitlines()
+
+
+def _dispatch(
+        argv: "List[str]",
+        output: "Optional[List[str]]" = None,
+        exec_in_place: bool = False) -> int:
+    try:
+        args = _parse_runner_args(argv[1:])
+    except _UsageError as e:
+        message = _USAGE + "xlsynth_runner: error: {}\\n".format(e)
+        if output is None:
+            sys.stderr.write(message)
+        else:
+            output.append(message)
         return 2
-    # Treat any unrecognized arguments as passthrough to the underlying tool/driver subcommand.
-    setattr(args, "passthrough", unknown)
-    return int(args.func(args))
+    if args.unused_inputs_list:
+        _write_unused_inputs_list(args)
+    if args.status_path:
+        return _run_recording_status(args, output)
+    return int(_MODE_FUNCS[args.mode](args, output, exec_in_place))
+
+
+def _read_work_requests(stream: "Any") -> "Any":
+    import json
+
+    decoder = json.JSONDecoder()
+    buffer = ""
+    for line in stream:
+        buffer = (buffer + line).lstrip()
+        while buffer:
+            try:
+                request, end = decoder.raw_decode(buffer)
+            except ValueError:
+                break
+            buffer = buffer[end:].lstrip()
+            yield request
+
+
+def _work_response(request: "Dict[str, Any]") -> "Dict[str, Any]":
+    output: List[str] = []
+    try:
+        exit_code = _dispatch(["xlsynth_runner"] + list(request.get("arguments", [])), output = output)
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else 1
+    except Exception as e:
+        output.append("xlsynth_runner: {}: {}\\n".format(type(e).__name__, e))
+        exit_code = 1
+    return {
+        "exitCode": exit_code,
+        "output": "".join(output),
+        "requestId": request.get("requestId", 0),
+    }
+
+
+def _run_persistent_worker(stdin: "Any", stdout: "Any") -> int:
+    # Serves Bazel JSON work requests until stdin is closed. Requests with a
+    # non-zero requestId come from a multiplex worker and run concurrently;
+    # singleplex requests are handled in order.
+    import json
+    import threading
+
+    write_lock = threading.Lock()
+    threads: List[threading.Thread] = []
+
+    def respond(request: "Dict[str, Any]") -> None:
+        response = json.dumps(_work_response(request))
+        with write_lock:
+            stdout.write(response + "\\n")
+            stdout.flush()
+
+    for request in _read_work_requests(stdin):
+        if request.get("requestId", 0):
+            thread = threading.Thread(target = respond, args = (request,), daemon = True)
+            thread.start()
+            threads = [t for t in threads if t.is_alive()]
+            threads.append(thread)
+        else:
+            respond(request)
+    for thread in threads:
+        thread.join()
+    return 0
+
+
+def main(argv: "List[str]") -> int:
+    if "--persistent_worker" in argv[1:]:
+        # Anything printed by request handling must stay off the protocol stream.
+        protocol_stdout = sys.stdout
+        sys.stdout = sys.stderr
+        return _run_persistent_worker(sys.stdin, protocol_stdout)
+    return _dispatch(_expand_flagfile(argv), exec_in_place = True)
 
 
 if __name__ == "__main__":
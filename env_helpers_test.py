@@ -1,7 +1,11 @@
 # SPDX-License-Identifier: Apache-2.0
 
+import io
+import json
 import os
 from pathlib import Path
+import subprocess
+import sys
 import tempfile
 import unittest
 from unittest import mock
@@ -28,6 +32,12 @@ class EnvHelpersTest(unittest.TestCase):
                 passthrough = [],
                 runtime_library_path = "",
                 stdout_path = "",
+                stage_search_max = "",
+                fraig_max_gates = "",
+                fraig_timeout = "",
+                resource_log = "",
+                concurrency_dir = "",
+                concurrency_limit = "",
             )
 
             captured = {}
@@ -41,7 +51,7 @@ class EnvHelpersTest(unittest.TestCase):
                 return Result()
 
             with mock.patch.dict(os.environ, {"RUNFILES_DIR": str(runfiles_root)}, clear = False):
-                with mock.patch.object(env_helpers.subprocess, "run", side_effect = fake_run):
+                with mock.patch("subprocess.run", side_effect = fake_run):
                     self.assertEqual(env_helpers._driver(argv), 0)
 
             self.assertEqual(captured["cmd"][0], str(driver_path))
@@ -66,6 +76,12 @@ class EnvHelpersTest(unittest.TestCase):
                 passthrough = [],
                 runtime_library_path = "",
                 stdout_path = "",
+                stage_search_max = "",
+                fraig_max_gates = "",
+                fraig_timeout = "",
+                resource_log = "",
+                concurrency_dir = "",
+                concurrency_limit = "",
             )
 
             captured = {}
@@ -79,11 +95,45 @@ class EnvHelpersTest(unittest.TestCase):
                 return Result()
 
             with mock.patch.dict(os.environ, {"RUNFILES_DIR": str(runfiles_root)}, clear = False):
-                with mock.patch.object(env_helpers.subprocess, "run", side_effect = fake_run):
+                with mock.patch("subprocess.run", side_effect = fake_run):
                     self.assertEqual(env_helpers._driver(argv), 0)
 
             self.assertEqual(captured["env"]["XLSYNTH_TOOLS"], str(tools_path))
 
+    def test_resolve_runtime_path_uses_runfiles_manifest(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "MANIFEST"
+            manifest.write_text(
+                "+xls+rules_xlsynth_selftest_xls_runtime/tools/opt_main /exec/tools/opt_main\n"
+                "+xls+rules_xlsynth_selftest_xls_runtime/tools/codegen_main /exec/tools/codegen_main\n"
+                "+xls+rules_xlsynth_selftest_xls_runtime/stdlib/std.x /src/stdlib/std.x\n"
+                "+xls+rules_xlsynth_selftest_xls_runtime/stdlib/apfloat.x /other/apfloat.x\n"
+                " _main/with\\sspace.x /src/with\\sspace.x\n",
+                encoding = "utf-8",
+            )
+            environ = {"RUNFILES_DIR": tmp, "RUNFILES_MANIFEST_FILE": str(manifest)}
+
+            with mock.patch.dict(os.environ, environ, clear = False):
+                with mock.patch.object(env_helpers.os.path, "exists", side_effect = AssertionError("probed")):
+                    self.assertEqual(
+                        env_helpers._resolve_runtime_path(
+                            "external/+xls+rules_xlsynth_selftest_xls_runtime/tools/opt_main"),
+                        "/exec/tools/opt_main",
+                    )
+                    self.assertEqual(
+                        env_helpers._resolve_runtime_path(
+                            "external/+xls+rules_xlsynth_selftest_xls_runtime/tools"),
+                        "/exec/tools",
+                    )
+                    self.assertEqual(env_helpers._resolve_runtime_path("with space.x"), "/src/with space.x")
+                # The stdlib files come from different real directories, so the
+                # directory itself is resolved by probing the runfiles tree.
+                self.assertEqual(
+                    env_helpers._resolve_runtime_path(
+                        "external/+xls+rules_xlsynth_selftest_xls_runtime/stdlib"),
+                    "external/+xls+rules_xlsynth_selftest_xls_runtime/stdlib",
+                )
+
     def test_run_subprocess_uses_darwin_runtime_library_env_var(self) -> None:
         captured = {}
 
@@ -95,7 +145,7 @@ class EnvHelpersTest(unittest.TestCase):
 
             return Result()
 
-        with mock.patch.object(env_helpers.subprocess, "run", side_effect = fake_run):
+        with mock.patch("subprocess.run", side_effect = fake_run):
             self.assertEqual(
                 env_helpers._run_subprocess(
                     ["dummy-tool"],
@@ -123,6 +173,879 @@ class EnvHelpersTest(unittest.TestCase):
             [],
         )
 
+    def test_main_expands_trailing_flagfile(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            flagfile = Path(tmp) / "args.params"
+            flagfile.write_text("tool\n--toolchain\nt.toml\n--runtime_library_path\n\ndslx_fmt\n", encoding = "utf-8")
+
+            captured = {}
+
+            def fake_dispatch(argv, output = None, exec_in_place = False):
+                captured["argv"] = list(argv)
+                return 0
+
+            with mock.patch.object(env_helpers, "_dispatch", side_effect = fake_dispatch):
+                self.assertEqual(env_helpers.main(["xlsynth_runner", "@" + str(flagfile)]), 0)
+
+        self.assertEqual(
+            captured["argv"],
+            ["xlsynth_runner", "tool", "--toolchain", "t.toml", "--runtime_library_path", "", "dslx_fmt"],
+        )
+
+    def test_tool_receives_sources_from_passthrough_file(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text(
+                "[toolchain]\n"
+                "tool_path = \"/tmp/xls-tools\"\n"
+                "\n"
+                "[toolchain.dslx]\n"
+                "dslx_stdlib_path = \"/tmp/stdlib\"\n",
+                encoding = "utf-8",
+            )
+            params_path = tmp_path / "srcs.params"
+            params_path.write_text("pkg/top_test.x\npkg/top.x\npkg/leaf.x\n", encoding = "utf-8")
+
+            captured = {}
+
+            def fake_execvpe(file, args, env):
+                captured["args"] = list(args)
+                raise SystemExit(0)
+
+            with mock.patch.object(os, "execvpe", side_effect = fake_execvpe):
+                with self.assertRaises(SystemExit):
+                    env_helpers.main([
+                        "xlsynth_runner",
+                        "tool",
+                        "--toolchain",
+                        str(toolchain_path),
+                        "--passthrough_file",
+                        str(params_path),
+                        "dslx_interpreter_main",
+                    ])
+
+        self.assertEqual(
+            captured["args"],
+            [
+                "/tmp/xls-tools/dslx_interpreter_main",
+                "--dslx_stdlib_path=/tmp/stdlib",
+                "--compare=jit",
+                "--alsologtostderr",
+                "pkg/top_test.x",
+                "pkg/top.x",
+                "pkg/leaf.x",
+            ],
+        )
+
+    def test_only_a_lone_flagfile_is_expanded(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            flagfile = Path(tmp) / "args.params"
+            flagfile.write_text("tool\n", encoding = "utf-8")
+            argv = ["xlsynth_runner", "tool", "--toolchain", "t.toml", "typecheck_main", "@" + str(flagfile)]
+
+            self.assertEqual(env_helpers._expand_flagfile(argv), argv)
+            self.assertEqual(env_helpers._expand_flagfile(["xlsynth_runner", "@" + str(flagfile)]), ["xlsynth_runner", "tool"])
+
+    def test_worker_request_arguments_are_not_expanded(self) -> None:
+        captured = {}
+
+        def fake_dispatch(argv, output = None, exec_in_place = False):
+            captured["argv"] = list(argv)
+            return 0
+
+        with mock.patch.object(env_helpers, "_dispatch", side_effect = fake_dispatch):
+            response = env_helpers._work_response({"arguments": ["tool", "--toolchain", "t.toml", "dslx_fmt", "@missing"]})
+
+        self.assertEqual(response["exitCode"], 0)
+        self.assertEqual(captured["argv"], ["xlsynth_runner", "tool", "--toolchain", "t.toml", "dslx_fmt", "@missing"])
+
+    def test_dslx_test_shards_split_tests_and_quickchecks(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            module = tmp_path / "top_test.x"
+            module.write_text(
+                "fn helper() -> u32 { u32:1 }\n"
+                "#[test]\nfn first() {}\n"
+                "// #[test]\n// fn commented() {}\n"
+                "#[test_proc]\nproc second_proc {}\n"
+                "#[quickcheck]\nfn property(x: u8) -> bool { true }\n"
+                "#[test] fn third() {}\n",
+                encoding = "utf-8",
+            )
+            status_file = tmp_path / "shard_status"
+            filters = []
+            for index in range(4):
+                environ = {
+                    "TEST_SHARD_INDEX": str(index),
+                    "TEST_SHARD_STATUS_FILE": str(status_file),
+                    "TEST_TOTAL_SHARDS": "4",
+                }
+                with mock.patch.dict(os.environ, environ, clear = False):
+                    filters.append(env_helpers._dslx_test_shard_filter([str(module), "dep.x"]))
+
+            self.assertTrue(status_file.exists())
+
+        self.assertEqual(
+            filters,
+            [
+                ["--test_filter=^(?:first)$"],
+                ["--test_filter=^(?:second_proc)$"],
+                ["--test_filter=^(?:property)$"],
+                ["--test_filter=^(?:third)$"],
+            ],
+        )
+        self.assertEqual(sum(1 for shard in filters if "property" in shard[0]), 1)
+
+    def test_tool_proves_quickchecks_in_parallel(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text(
+                "[toolchain]\n"
+                "tool_path = \"/tmp/xls-tools\"\n"
+                "\n"
+                "[toolchain.dslx]\n"
+                "dslx_stdlib_path = \"/tmp/stdlib\"\n",
+                encoding = "utf-8",
+            )
+            module = tmp_path / "lib.x"
+            module.write_text(
+                "#[quickcheck]\nfn holds(x: u8) -> bool { true }\n"
+                "#[quickcheck(exhaustive)]\nfn breaks(x: u8) -> bool { false }\n",
+                encoding = "utf-8",
+            )
+            filters = []
+
+            def fake_run(cmd, check = False, env = None, stdout = None, stderr = None):
+                filters.append(cmd[-1])
+
+                class Result:
+                    returncode = 1 if cmd[-1] == "--test_filter=^(?:breaks)$" else 0
+                    stdout = b"counterexample: x = 0\n" if returncode else b""
+
+                return Result()
+
+            output = []
+            with mock.patch("subprocess.run", side_effect = fake_run):
+                exit_code = env_helpers._dispatch(
+                    [
+                        "xlsynth_runner",
+                        "tool",
+                        "--toolchain",
+                        str(toolchain_path),
+                        "--quickcheck_jobs=0",
+                        "prove_quickcheck_main",
+                        str(module),
+                    ],
+                    output,
+                )
+
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(sorted(filters), ["--test_filter=^(?:breaks)$", "--test_filter=^(?:holds)$"])
+        report = "".join(output)
+        self.assertIn("counterexample: x = 0", report)
+        self.assertRegex(report, r"\[ PROVED \] holds \(\d+\.\ds\)")
+        self.assertRegex(report, r"\[ FAILED \] breaks \(\d+\.\ds\)")
+        self.assertIn("1 proved, 0 unproven, 1 failed", report)
+
+    def test_quickcheck_over_budget_falls_back_to_sampling(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text(
+                "[toolchain]\n"
+                "tool_path = \"/tmp/xls-tools\"\n"
+                "\n"
+                "[toolchain.dslx]\n"
+                "dslx_stdlib_path = \"/tmp/stdlib\"\n",
+                encoding = "utf-8",
+            )
+            module = tmp_path / "lib.x"
+            module.write_text(
+                "#[quickcheck]\nfn fast(x: u8) -> bool { true }\n"
+                "#[quickcheck(test_count=500)]\nfn slow(x: u32) -> bool { true }\n",
+                encoding = "utf-8",
+            )
+            outputs_dir = tmp_path / "outputs"
+            outputs_dir.mkdir()
+            commands = []
+
+            def fake_run(cmd, check = False, env = None, stdout = None, stderr = None, timeout = None):
+                commands.append((os.path.basename(cmd[0]), cmd[-1], timeout))
+                if cmd[0].endswith("prove_quickcheck_main") and cmd[-1] == "--test_filter=^(?:slow)$":
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+
+                class Result:
+                    returncode = 0
+                    stdout = b""
+
+                return Result()
+
+            output = []
+            with mock.patch.dict(os.environ, {"TEST_UNDECLARED_OUTPUTS_DIR": str(outputs_dir)}, clear = False):
+                with mock.patch("subprocess.run", side_effect = fake_run):
+                    exit_code = env_helpers._dispatch(
+                        [
+                            "xlsynth_runner",
+                            "tool",
+                            "--toolchain",
+                            str(toolchain_path),
+                            "--quickcheck_timeout=30",
+                            "prove_quickcheck_main",
+                            str(module),
+                        ],
+                        output,
+                    )
+            results = json.loads((outputs_dir / "quickcheck_results.json").read_text())
+
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(
+            sorted(commands),
+            [
+                ("dslx_interpreter_main", "--test_filter=^(?:slow)$", None),
+                ("prove_quickcheck_main", "--test_filter=^(?:fast)$", 30.0),
+                ("prove_quickcheck_main", "--test_filter=^(?:slow)$", 30.0),
+            ],
+        )
+        self.assertIn("[ UNPROVEN ] slow (proof budget of 30s exceeded; 500 samples passed in", "".join(output))
+        self.assertEqual([result["name"] for result in results], ["fast", "slow"])
+        self.assertEqual(results[0]["status"], "proved")
+        self.assertFalse(results[0]["timed_out"])
+        self.assertEqual(results[1]["status"], "unproven")
+        self.assertTrue(results[1]["timed_out"])
+        self.assertEqual(results[1]["samples"], 500)
+
+    def test_quickcheck_fallback_filters_only_the_quickcheck_in_mixed_module(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text(
+                "[toolchain]\n"
+                "tool_path = \"/tmp/xls-tools\"\n"
+                "\n"
+                "[toolchain.dslx]\n"
+                "dslx_stdlib_path = \"/tmp/stdlib\"\n",
+                encoding = "utf-8",
+            )
+            module = tmp_path / "mixed.x"
+            module.write_text(
+                "#[test]\nfn unit() {}\n"
+                "#[quickcheck(test_count=10)]\nfn prop(x: u8) -> bool { true }\n",
+                encoding = "utf-8",
+            )
+            commands = []
+
+            def fake_run(cmd, check = False, env = None, stdout = None, stderr = None, timeout = None):
+                commands.append((os.path.basename(cmd[0]), cmd[-1]))
+                if cmd[0].endswith("prove_quickcheck_main"):
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+
+                class Result:
+                    returncode = 0
+                    stdout = b""
+
+                return Result()
+
+            output = []
+            with mock.patch.dict(os.environ, {"TEST_UNDECLARED_OUTPUTS_DIR": ""}, clear = False):
+                with mock.patch("subprocess.run", side_effect = fake_run):
+                    exit_code = env_helpers._dispatch(
+                        [
+                            "xlsynth_runner",
+                            "tool",
+                            "--toolchain",
+                            str(toolchain_path),
+                            "--quickcheck_timeout=5",
+                            "prove_quickcheck_main",
+                            str(module),
+                        ],
+                        output,
+                    )
+
+        # The fallback selects the quickcheck with the same full-match filter
+        # that dslx_test shards use, so the interpreter skips `unit`.
+        self.assertEqual(exit_code, 0)
+        self.assertEqual(
+            commands,
+            [
+                ("prove_quickcheck_main", "--test_filter=^(?:prop)$"),
+                ("dslx_interpreter_main", "--test_filter=^(?:prop)$"),
+            ],
+        )
+        self.assertIn("[ UNPROVEN ] prop (proof budget of 5s exceeded; 10 samples passed in", "".join(output))
+
+    def test_ir2gates_fraig_budget_records_outcome(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            driver = tmp_path / "xlsynth-driver"
+            driver.write_text(
+                "#!/bin/sh\n"
+                "for arg in \"$@\"; do\n"
+                "  case \"$arg\" in\n"
+                "    --fraig=*) fraig=\"${arg#--fraig=}\" ;;\n"
+                "    --output_json=*) json=\"${arg#--output_json=}\" ;;\n"
+                "  esac\n"
+                "done\n"
+                "if [ \"$fraig\" = true ]; then\n"
+                "  if [ -n \"$SLOW_FRAIG\" ]; then sleep 5; fi\n"
+                "  echo '{\"live_nodes\": 80, \"deepest_path\": 6}' > \"$json\"; echo fraiged\n"
+                "else\n"
+                "  echo '{\"live_nodes\": 100, \"deepest_path\": 7}' > \"$json\"; echo unfraiged\n"
+                "fi\n",
+                encoding = "utf-8",
+            )
+            driver.chmod(0o755)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text("[toolchain]\n", encoding = "utf-8")
+            gates_path = tmp_path / "gates.txt"
+            json_path = tmp_path / "gates.json"
+
+            def run(*runner_flags: str, fraig: str = "true") -> "dict":
+                exit_code = env_helpers._dispatch([
+                    "xlsynth_runner",
+                    "driver",
+                    "--driver_path",
+                    str(driver),
+                    "--toolchain",
+                    str(toolchain_path),
+                    "--stdout_path",
+                    str(gates_path),
+                    *runner_flags,
+                    "ir2gates",
+                    "--fraig={}".format(fraig),
+                    "--output_json={}".format(json_path),
+                    "main.opt.ir",
+                ], [])
+                self.assertEqual(exit_code, 0)
+                return json.loads(json_path.read_text())
+
+            metrics = run("--fraig_max_gates", "90")
+            self.assertEqual(metrics["fraig"], {"status": "skipped", "gates_before_fraig": 100, "max_gates": 90})
+            self.assertEqual(metrics["live_nodes"], 100)
+            self.assertEqual(gates_path.read_text(), "unfraiged\n")
+
+            metrics = run("--fraig_max_gates", "1000", "--fraig_timeout", "30")
+            self.assertEqual(metrics["fraig"]["status"], "completed")
+            self.assertEqual(metrics["live_nodes"], 80)
+            self.assertEqual(gates_path.read_text(), "fraiged\n")
+
+            with mock.patch.dict(os.environ, {"SLOW_FRAIG": "1"}, clear = False):
+                metrics = run("--fraig_timeout", "0.2")
+            self.assertEqual(metrics["fraig"], {"status": "timed_out", "timeout_seconds": 0.2})
+            self.assertEqual(metrics["live_nodes"], 100)
+            self.assertEqual(gates_path.read_text(), "unfraiged\n")
+
+            # Without a budget the status is still recorded.
+            metrics = run()
+            self.assertEqual(metrics["fraig"]["status"], "completed")
+            self.assertEqual(metrics["live_nodes"], 80)
+
+            metrics = run(fraig = "false")
+            self.assertEqual(metrics["fraig"], {"status": "disabled"})
+            self.assertEqual(metrics["live_nodes"], 100)
+
+    def test_stage_search_finds_fewest_stages_that_schedule(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            driver = tmp_path / "xlsynth-driver"
+            driver.write_text(
+                "#!/bin/sh\n"
+                "for arg in \"$@\"; do\n"
+                "  case \"$arg\" in --pipeline_stages=*) stages=\"${arg#--pipeline_stages=}\" ;; esac\n"
+                "done\n"
+                "if [ \"$stages\" -lt 3 ]; then echo \"cannot schedule in $stages stages\" >&2; exit 1; fi\n"
+                "echo \"// $stages stages\"\n",
+                encoding = "utf-8",
+            )
+            driver.chmod(0o755)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text("[toolchain]\n", encoding = "utf-8")
+            delay_info_path = tmp_path / "delay_info.txt"
+            delay_info_path.write_text("# Critical path:\n     95ps (+ 60ps): add.3\n", encoding = "utf-8")
+            sv_path = tmp_path / "out.sv"
+            report_path = tmp_path / "search.json"
+
+            exit_code = env_helpers._dispatch([
+                "xlsynth_runner",
+                "driver",
+                "--driver_path",
+                str(driver),
+                "--toolchain",
+                str(toolchain_path),
+                "--stdout_path",
+                str(sv_path),
+                "--stage_search_max",
+                "8",
+                "--stage_search_jobs",
+                "2",
+                "--stage_search_delay_info",
+                str(delay_info_path),
+                "--stage_search_report",
+                str(report_path),
+                "ir2pipeline",
+                "main.opt.ir",
+                "--clock_period_ps=50",
+            ], [])
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(sv_path.read_text(), "// 3 stages\n")
+            search = json.loads(report_path.read_text())
+
+        self.assertEqual(search["lower_bound"], 2)
+        self.assertEqual(search["pipeline_stages"], 3)
+        probed = {probe["pipeline_stages"]: probe["status"] for probe in search["probes"]}
+        self.assertNotIn(1, probed)
+        self.assertEqual(probed[2], "failed")
+        self.assertEqual(probed[3], "scheduled")
+        self.assertEqual(
+            [probe["error"] for probe in search["probes"] if probe["pipeline_stages"] == 2],
+            ["cannot schedule in 2 stages"],
+        )
+
+    def test_parse_runner_args_splits_runner_flags_from_passthrough(self) -> None:
+        args = env_helpers._parse_runner_args([
+            "driver",
+            "--driver_path=/tmp/xlsynth-driver",
+            "--toolchain",
+            "t.toml",
+            "ir2gates",
+            "--fraig=true",
+            "--top",
+            "main",
+            "in.ir",
+        ])
+
+        self.assertEqual(args.mode, "driver")
+        self.assertEqual(args.driver_path, "/tmp/xlsynth-driver")
+        self.assertEqual(args.toolchain, "t.toml")
+        self.assertEqual(args.subcommand, "ir2gates")
+        self.assertEqual(args.stdout_path, "")
+        self.assertEqual(args.passthrough, ["--fraig=true", "--top", "main", "in.ir"])
+
+    def test_dispatch_reports_missing_required_runner_args(self) -> None:
+        output = []
+
+        self.assertEqual(env_helpers._dispatch(["xlsynth_runner", "tool", "typecheck_main"], output), 2)
+        self.assertIn("the following arguments are required: --toolchain", "".join(output))
+
+    def test_parse_scalar_handles_emitted_toml_forms(self) -> None:
+        self.assertIs(env_helpers._parse_scalar("true"), True)
+        self.assertEqual(env_helpers._parse_scalar("42"), 42)
+        self.assertEqual(env_helpers._parse_scalar("\"a\\\"b\\\\c\""), "a\"b\\c")
+        self.assertEqual(env_helpers._parse_scalar("[\"x\", \"y,z\"]"), ["x", "y,z"])
+        self.assertEqual(env_helpers._parse_scalar("[]"), [])
+        with self.assertRaises(ValueError):
+            env_helpers._parse_scalar("\"unterminated")
+
+    def test_unused_inputs_list_names_unimported_dslx_sources(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            sources = {
+                "pkg/top.x": "import pkg.mid;\n// import pkg.commented;\nuse lib::util::{helper};\nfn main() {}\n",
+                "pkg/mid.x": "import std;\npub import pkg.leaf as l;\n",
+                "pkg/leaf.x": "",
+                "pkg/commented.x": "",
+                "bazel-out/k8-fastbuild/bin/lib/util.x": "",
+                "pkg/unrelated.x": "import pkg.leaf;\n",
+            }
+            for name, content in sources.items():
+                path = tmp_path / name
+                path.parent.mkdir(parents = True, exist_ok = True)
+                path.write_text(content, encoding = "utf-8")
+            unused_path = tmp_path / "unused.txt"
+            args = env_helpers._RunnerArgs("tool")
+            args.unused_inputs_list = str(unused_path)
+            args.dslx_main = str(tmp_path / "pkg/top.x")
+            args.dslx_src = [str(tmp_path / name) for name in sources]
+
+            env_helpers._write_unused_inputs_list(args)
+
+            self.assertEqual(
+                unused_path.read_text().splitlines(),
+                [str(tmp_path / "pkg/commented.x"), str(tmp_path / "pkg/unrelated.x")],
+            )
+
+    def test_used_sources_follow_braced_use_items(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            sources = {
+                "top.x": "use pkg::{helper};\nfn main() {}\n",
+                "multi.x": "pub use pkg::{\n    helper as h,\n    nested::{deep, other},\n};\n",
+                "pkg/helper.x": "",
+                "pkg/nested/deep.x": "",
+                "pkg/unused.x": "",
+            }
+            for name, content in sources.items():
+                path = tmp_path / name
+                path.parent.mkdir(parents = True, exist_ok = True)
+                path.write_text(content, encoding = "utf-8")
+            srcs = [str(tmp_path / name) for name in sources]
+
+            single = env_helpers._dslx_used_sources(str(tmp_path / "top.x"), srcs)
+            multi = env_helpers._dslx_used_sources(str(tmp_path / "multi.x"), srcs)
+
+        self.assertEqual(single, [str(tmp_path / "top.x"), str(tmp_path / "pkg/helper.x")])
+        self.assertEqual(
+            multi,
+            [str(tmp_path / "multi.x"), str(tmp_path / "pkg/helper.x"), str(tmp_path / "pkg/nested/deep.x")],
+        )
+
+    def test_unreadable_use_tree_reports_nothing_unused(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            (tmp_path / "top.x").write_text("use pkg::{helper;\n", encoding = "utf-8")
+            (tmp_path / "other.x").write_text("", encoding = "utf-8")
+            unused_path = tmp_path / "unused.txt"
+            args = env_helpers._RunnerArgs("tool")
+            args.unused_inputs_list = str(unused_path)
+            args.dslx_main = str(tmp_path / "top.x")
+            args.dslx_src = [str(tmp_path / "top.x"), str(tmp_path / "other.x")]
+
+            env_helpers._write_unused_inputs_list(args)
+
+            self.assertEqual(unused_path.read_text(), "")
+
+    def test_run_subprocess_execs_in_place_with_redirected_stdout(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            stdout_path = Path(tmp) / "out.txt"
+            captured = {}
+
+            def fake_dup2(fd, fd2):
+                captured["dup2_target"] = fd2
+
+            def fake_execvpe(file, args, env):
+                captured["exec"] = (file, list(args))
+                captured["env"] = dict(env)
+                raise SystemExit(0)
+
+            with mock.patch.object(env_helpers.os, "dup2", side_effect = fake_dup2):
+                with mock.patch.object(env_helpers.os, "execvpe", side_effect = fake_execvpe):
+                    with mock.patch("subprocess.run") as run:
+                        with self.assertRaises(SystemExit):
+                            env_helpers._run_subprocess(
+                                ["tools/opt_main", "in.ir"],
+                                runtime_library_path = "/tmp/runtime",
+                                stdout_path = str(stdout_path),
+                                exec_in_place = True,
+                                sys_platform = "linux",
+                            )
+                        run.assert_not_called()
+
+            self.assertTrue(stdout_path.exists())
+
+        self.assertEqual(captured["dup2_target"], 1)
+        self.assertEqual(captured["exec"], ("tools/opt_main", ["tools/opt_main", "in.ir"]))
+        self.assertEqual(captured["env"]["LD_LIBRARY_PATH"], "/tmp/runtime")
+
+    def test_persistent_worker_captures_tool_output_per_request(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text(
+                "[toolchain]\n"
+                "tool_path = \"/tmp/xls-tools\"\n",
+                encoding = "utf-8",
+            )
+            formatted_path = tmp_path / "formatted.x"
+            requests = [
+                {
+                    "arguments": [
+                        "tool",
+                        "--toolchain",
+                        str(toolchain_path),
+                        "--stdout_path",
+                        str(formatted_path),
+                        "dslx_fmt",
+                        "input.x",
+                    ],
+                    "requestId": request_id,
+                }
+                for request_id in [1, 2]
+            ]
+            stdin = io.StringIO("".join(json.dumps(request) + "\n" for request in requests))
+            stdout = io.StringIO()
+
+            def fake_run(cmd, check = False, env = None, stdout = None, stderr = None):
+                class Result:
+                    returncode = 3
+                    stderr = b"formatting diagnostics\n"
+
+                return Result()
+
+            with mock.patch("subprocess.run", side_effect = fake_run):
+                self.assertEqual(env_helpers._run_persistent_worker(stdin, stdout), 0)
+
+        responses = sorted(
+            (json.loads(line) for line in stdout.getvalue().splitlines()),
+            key = lambda response: response["requestId"],
+        )
+        self.assertEqual(
+            responses,
+            [
+                {"exitCode": 3, "output": "formatting diagnostics\n", "requestId": 1},
+                {"exitCode": 3, "output": "formatting diagnostics\n", "requestId": 2},
+            ],
+        )
+
+    def test_check_formatting_writes_one_consolidated_report(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            formatter = tmp_path / "dslx_fmt"
+            formatter.write_text(
+                "#!/bin/sh\n"
+                "case \"$1\" in *broken.x) echo 'parse error' >&2; exit 1;; esac\n"
+                "sed 's/  */ /g' \"$1\"\n",
+                encoding = "utf-8",
+            )
+            formatter.chmod(0o755)
+            clean = tmp_path / "clean.x"
+            clean.write_text("fn f() {}\n", encoding = "utf-8")
+            messy = tmp_path / "messy.x"
+            messy.write_text("fn g()  {}\n", encoding = "utf-8")
+            report_path = tmp_path / "report.txt"
+
+            output = []
+            exit_code = env_helpers._check_formatting(
+                [str(formatter)],
+                [str(clean), str(messy)],
+                jobs = 2,
+                report_path = str(report_path),
+                runtime_library_path = "",
+                output = output,
+                usage_log = "",
+                usage_record = {},
+            )
+            report = report_path.read_text()
+
+            broken = tmp_path / "broken.x"
+            broken.write_text("fn\n", encoding = "utf-8")
+            broken_exit_code = env_helpers._check_formatting(
+                [str(formatter)],
+                [str(broken)],
+                jobs = 1,
+                report_path = str(report_path),
+                runtime_library_path = "",
+                output = output,
+                usage_log = "",
+                usage_record = {},
+            )
+
+        self.assertEqual(exit_code, 0)
+        self.assertNotIn(str(clean), report)
+        self.assertIn("-fn g()  {}\n+fn g() {}\n", report)
+        self.assertIn("1 of 2 files need formatting", report)
+        self.assertEqual(broken_exit_code, 1)
+        self.assertIn("parse error", "".join(output))
+
+    def test_changed_scope_in_workspace_nested_in_git_repo(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = Path(tmp)
+            workspace = repo / "hw"
+            (workspace / "pkg").mkdir(parents = True)
+            (workspace / "pkg" / "edited.x").write_text("fn f() {}\n", encoding = "utf-8")
+            (workspace / "pkg" / "same.x").write_text("fn g() {}\n", encoding = "utf-8")
+
+            def git(*git_args: str) -> None:
+                subprocess.run(
+                    ["git", "-C", str(repo), "-c", "user.name=t", "-c", "user.email=t@t", *git_args],
+                    check = True,
+                    stdout = subprocess.DEVNULL,
+                )
+
+            git("init", "-q")
+            git("add", ".")
+            git("commit", "-q", "-m", "init")
+            (workspace / "pkg" / "edited.x").write_text("fn  f() {}\n", encoding = "utf-8")
+            (workspace / "pkg" / "new.x").write_text("fn h() {}\n", encoding = "utf-8")
+
+            files = env_helpers._workspace_dslx_files(str(workspace), "changed", [])
+
+        self.assertEqual(files, ["pkg/edited.x", "pkg/new.x"])
+
+    def test_format_in_place_skips_files_cached_as_formatted(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            formatter = tmp_path / "dslx_fmt"
+            formatter.write_text(
+                "#!/bin/sh\n"
+                "echo \"$2\" >> \"$(dirname \"$0\")/calls\"\n"
+                "sed -i 's/  */ /g' \"$2\"\n",
+                encoding = "utf-8",
+            )
+            formatter.chmod(0o755)
+            workspace = tmp_path / "ws"
+            (workspace / "pkg").mkdir(parents = True)
+            (workspace / "bazel-out").mkdir()
+            (workspace / "bazel-out" / "gen.x").write_text("fn  g() {}\n", encoding = "utf-8")
+            (workspace / "pkg" / "clean.x").write_text("fn f() {}\n", encoding = "utf-8")
+            (workspace / "pkg" / "messy.x").write_text("fn  h()  {}\n", encoding = "utf-8")
+            environ = {"BUILD_WORKSPACE_DIRECTORY": str(workspace), "XDG_CACHE_HOME": str(tmp_path / "cache")}
+
+            with mock.patch.dict(os.environ, environ, clear = False):
+                with mock.patch.object(sys, "stdout", new = io.StringIO()) as stdout:
+                    self.assertEqual(
+                        env_helpers._format_in_place([str(formatter)], "all", [], jobs = 2, runtime_library_path = ""),
+                        0,
+                    )
+                    first_calls = (tmp_path / "calls").read_text().splitlines()
+                    self.assertEqual(
+                        env_helpers._format_in_place([str(formatter)], "all", [], jobs = 2, runtime_library_path = ""),
+                        0,
+                    )
+            second_calls = (tmp_path / "calls").read_text().splitlines()[len(first_calls):]
+            messy = (workspace / "pkg" / "messy.x").read_text()
+            generated = (workspace / "bazel-out" / "gen.x").read_text()
+
+        self.assertEqual(sorted(os.path.basename(call) for call in first_calls), ["clean.x", "messy.x"])
+        self.assertEqual(second_calls, [])
+        self.assertEqual(messy, "fn h() {}\n")
+        self.assertEqual(generated, "fn  g() {}\n")
+        self.assertIn("formatted pkg/messy.x", stdout.getvalue())
+        self.assertIn("2 DSLX files: 0 reformatted, 0 already formatted, 2 skipped by cache, 0 failed", stdout.getvalue())
+
+    def test_usage_logged_run_reports_exit_codes_and_signals(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            usage_log = Path(tmp) / "usage.jsonl"
+
+            def run(script: str) -> int:
+                return env_helpers._run_subprocess(
+                    ["sh", "-c", script],
+                    runtime_library_path = "",
+                    stdout_path = "",
+                    output = [],
+                    usage_log = str(usage_log),
+                    usage_record = {"tool": "sh"},
+                )
+
+            self.assertEqual(run("exit 3"), 3)
+            self.assertEqual(run("kill -TERM $$"), -15)
+            records = [json.loads(line) for line in usage_log.read_text().splitlines()]
+
+        self.assertEqual([record["exit_code"] for record in records], [3, -15])
+
+    def test_usage_logged_run_times_out(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            usage_log = Path(tmp) / "usage.jsonl"
+
+            with self.assertRaises(subprocess.TimeoutExpired):
+                env_helpers._run_subprocess(
+                    ["sleep", "30"],
+                    runtime_library_path = "",
+                    stdout_path = "",
+                    output = [],
+                    usage_log = str(usage_log),
+                    usage_record = {"tool": "sleep"},
+                    timeout = 0.2,
+                )
+
+            record = json.loads(usage_log.read_text())
+        self.assertTrue(record["timed_out"])
+        self.assertLess(record["wall_seconds"], 30)
+
+    def test_token_pool_reads_runner_flags(self) -> None:
+        args = env_helpers._parse_runner_args(
+            ["tool", "--toolchain", "toolchain.toml", "--concurrency_dir", "/tmp/tokens", "--concurrency_limit", "2", "check_ir_equivalence_main"],
+        )
+        self.assertEqual(env_helpers._token_pool(args, "ir-equiv"), ("/tmp/tokens", "check_ir_equivalence_main", 2))
+        self.assertIsNone(env_helpers._token_pool(args, "opt_main"))
+        args.concurrency_limit = ""
+        self.assertIsNone(env_helpers._token_pool(args, "ir2gates"))
+
+    def test_run_waits_for_token_and_records_wait(self) -> None:
+        import fcntl
+        import threading
+
+        with tempfile.TemporaryDirectory() as tmp:
+            token_dir = Path(tmp) / "tokens"
+            token_dir.mkdir()
+            usage_log = Path(tmp) / "usage.jsonl"
+            holder = os.open(str(token_dir / "ir2gates.0.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+            fcntl.flock(holder, fcntl.LOCK_EX)
+            release = threading.Timer(0.3, os.close, args = [holder])
+            release.start()
+            output = []
+
+            exit_code = env_helpers._run_subprocess(
+                ["true"],
+                runtime_library_path = "",
+                stdout_path = "",
+                output = output,
+                usage_log = str(usage_log),
+                usage_record = {"tool": "xlsynth-driver"},
+                token_pool = (str(token_dir), "ir2gates", 1),
+            )
+            release.join()
+            record = json.loads(usage_log.read_text())
+
+        self.assertEqual(exit_code, 0)
+        self.assertGreaterEqual(record["token_wait_seconds"], 0.2)
+        self.assertTrue(any("for a token from the ir2gates pool (limit 1)" in text for text in output))
+
+    def test_tool_appends_resource_usage_record(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            tools_path = tmp_path / "tools"
+            tools_path.mkdir()
+            tool = tools_path / "opt_main"
+            tool.write_text("#!/bin/sh\necho optimized\necho diag >&2\nexit 3\n", encoding = "utf-8")
+            tool.chmod(0o755)
+            log_path = tmp_path / "usage.jsonl"
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text(
+                "[toolchain]\n"
+                "tool_path = \"{}\"\n".format(tools_path),
+                encoding = "utf-8",
+            )
+            stdout_path = tmp_path / "out.ir"
+            output = []
+
+            with mock.patch.dict(os.environ, {"XLSYNTH_RESOURCE_LOG": ""}, clear = False):
+                exit_code = env_helpers._dispatch(
+                    [
+                        "xlsynth_runner",
+                        "tool",
+                        "--toolchain",
+                        str(toolchain_path),
+                        "--stdout_path",
+                        str(stdout_path),
+                        "--resource_log",
+                        str(log_path),
+                        "--label",
+                        "//pkg:opt",
+                        "opt_main",
+                    ],
+                    output,
+                )
+
+            self.assertEqual(exit_code, 3)
+            self.assertEqual(stdout_path.read_text(), "optimized\n")
+            self.assertEqual(output, ["diag\n"])
+            record = json.loads(log_path.read_text())
+
+        self.assertEqual(record["label"], "//pkg:opt")
+        self.assertEqual(record["tool"], "opt_main")
+        self.assertEqual(record["exit_code"], 3)
+        for key in ["wall_seconds", "user_seconds", "sys_seconds", "max_rss_kb"]:
+            self.assertGreaterEqual(record[key], 0)
+
+    def test_persistent_worker_reports_runner_errors(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            toolchain_path = Path(tmp) / "toolchain.toml"
+            toolchain_path.write_text("[toolchain]\n", encoding = "utf-8")
+            request = {
+                "arguments": ["tool", "--toolchain", str(toolchain_path), "typecheck_main"],
+            }
+            stdout = io.StringIO()
+            self.assertEqual(
+                env_helpers._run_persistent_worker(io.StringIO(json.dumps(request)), stdout),
+                0,
+            )
+
+        response = json.loads(stdout.getvalue())
+        self.assertEqual(response["exitCode"], 1)
+        self.assertEqual(response["requestId"], 0)
+        self.assertIn("missing toolchain.tool_path", response["output"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -34,26 +34,32 @@ def write_executable_shell_script(ctx, filename, cmd, env_exports = None):
     )
     return executable_file
 
-def _get_srcs_from(dslx_info_providers):
-    # Get DAG entries from DslxInfo. Returns a list where index 0 is the root module.
-    dag_entries = []
-    for item in dslx_info_providers:
-        dag_entries.extend(item[DslxInfo].dag.to_list())
-
-    srcs = []
-    for entry in dag_entries:
-        srcs += [src for src in list(entry.srcs)]
-
-    srcs = list(reversed(srcs))
-    return srcs
-
-def get_srcs_from_deps(ctx):
-    """Helper for the case where there's a deps attr that is a sequence of DSLX info providers."""
-    return _get_srcs_from(ctx.attr.deps)
-
-def get_srcs_from_lib(ctx):
-    """Helper for the case where there's a lib attr that is a DSLX info provider."""
-    return _get_srcs_from([ctx.attr.lib])
+def _get_transitive_srcs_from(dslx_info_providers):
+    return depset(
+        order = "postorder",
+        transitive = [item[DslxInfo].transitive_srcs for item in dslx_info_providers],
+    )
+
+def get_transitive_srcs_from_deps(ctx):
+    """Returns the DSLX sources of a deps attr as a depset, for action inputs."""
+    return _get_transitive_srcs_from(ctx.attr.deps)
+
+def get_transitive_srcs_from_lib(ctx):
+    """Returns the DSLX sources of a lib attr as a depset, for action inputs."""
+    return _get_transitive_srcs_from([ctx.attr.lib])
+
+def get_main_src_from_deps(ctx):
+    """Returns the root module of a deps attr: the entry source of its last library."""
+    if not ctx.attr.deps:
+        fail("Expected at least one DSLX library in deps")
+    return ctx.attr.deps[-1][DslxInfo].main_src
+
+def get_single_main_src(lib):
+    """Returns the only source of a DSLX library target, failing if it has several."""
+    lib_info = lib[DslxInfo]
+    if len(lib_info.srcs) != 1:
+        fail("Expected exactly one source file for the library {}; got: {}".format(lib.label, [s.path for s in lib_info.srcs]))
+    return lib_info.main_src
 
 def mangle_dslx_name(basename, top):
     no_ext = basename.split(".")[0]
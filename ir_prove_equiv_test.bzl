@@ -2,8 +2,16 @@
 
 load(":helpers.bzl", "write_executable_shell_script")
 load(":ir_provider.bzl", "IrInfo")
-load(":env_helpers.bzl", "python_runner_source")
-load(":xls_toolchain.bzl", "declare_xls_toolchain_toml", "get_driver_artifact_inputs", "require_driver_toolchain")
+load(
+    ":xls_toolchain.bzl",
+    "declare_xls_toolchain_toml",
+    "get_driver_artifact_inputs",
+    "require_driver_toolchain",
+    "resource_class_attr",
+    "runner_setting_arguments",
+    "test_execution_info",
+    "xlsynth_runner_attr",
+)
 
 
 def _ir_prove_equiv_test_impl(ctx):
@@ -16,13 +24,14 @@ def _ir_prove_equiv_test_impl(ctx):
     lhs_file = list(lhs_files)[0]
     rhs_file = list(rhs_files)[0]
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = require_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "ir_equiv")
     cmd_parts = [
         "/usr/bin/env",
         "python3",
+        "-I",
+        "-S",
         runner.short_path,
         "driver",
         "--driver_path",
@@ -32,6 +41,7 @@ def _ir_prove_equiv_test_impl(ctx):
     ]
     if toolchain.runtime_library_path:
         cmd_parts.extend(["--runtime_library_path", toolchain.runtime_library_path])
+    cmd_parts.extend(runner_setting_arguments(ctx, toolchain, "ir-equiv"))
     cmd_parts.extend([
         "ir-equiv",
         "--top={}".format(ctx.attr.top),
@@ -44,13 +54,17 @@ def _ir_prove_equiv_test_impl(ctx):
         filename = ctx.label.name + ".sh",
         cmd = cmd,
     )
-    return DefaultInfo(
+    providers = [DefaultInfo(
         files = depset(direct = [run_script]),
         runfiles = ctx.runfiles(
             files = [lhs_file, rhs_file, runner, toolchain_file] + get_driver_artifact_inputs(toolchain, ["check_ir_equivalence_main"]),
         ),
         executable = run_script,
-    )
+    )]
+    execution_info = test_execution_info(ctx, toolchain, "IREQUIV")
+    if execution_info != None:
+        providers.append(execution_info)
+    return providers
 
 
 ir_prove_equiv_test = rule(
@@ -71,6 +85,8 @@ ir_prove_equiv_test = rule(
             mandatory = True,
             doc = "The top entity to check in the IR files.",
         ),
+        "resource_class": resource_class_attr(),
+        "_runner": xlsynth_runner_attr(cfg = "target"),
     },
     executable = True,
     test = True,
@@ -5,5 +5,6 @@ IrInfo = provider(
     fields = {
         "ir_file": "The unoptimized IR file.",
         "opt_ir_file": "The optimized IR file.",
+        "top": "The IR top function name, or None when the producer does not know it.",
     },
 )
@@ -1,6 +1,5 @@
 # SPDX-License-Identifier: Apache-2.0
 
-load(":env_helpers.bzl", "python_runner_source")
 load(":ir_provider.bzl", "IrInfo")
 load(
     ":xls_toolchain.bzl",
@@ -8,38 +7,35 @@ load(
     "declare_xls_toolchain_toml",
     "get_driver_artifact_inputs",
     "get_selected_driver_toolchain",
+    "run_xls_driver_action",
+    "xlsynth_runner_attr",
 )
 
 def _ir_to_delay_info_impl(ctx):
     opt_ir_file = ctx.attr.ir[IrInfo].ir_file if ctx.attr.use_unopt_ir else ctx.attr.ir[IrInfo].opt_ir_file
     output_file = ctx.outputs.delay_info
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "ir_to_delay_info", toolchain = toolchain)
 
-    ctx.actions.run(
-        inputs = [opt_ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["delay_info_main"]),
-        executable = runner,
-        outputs = [output_file],
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "ir2delayinfo",
         arguments = [
-            "driver",
-            "--driver_path",
-            toolchain.driver_path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "--toolchain",
-            toolchain_file.path,
-            "--stdout_path",
-            output_file.path,
-            "ir2delayinfo",
             "--delay_model",
             ctx.attr.delay_model,
             opt_ir_file.path,
             ctx.attr.top,
         ],
-        use_default_shell_env = False,
+        inputs = [opt_ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["delay_info_main"]),
+        outputs = [output_file],
+        mnemonic = "IR2DELAYINFO",
+        stdout = output_file,
+        progress_message = "Computing delay info for IR",
     )
 
     return DefaultInfo(
@@ -70,6 +66,7 @@ ir_to_delay_info = rule(
             doc = "Optional XLS bundle override.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(),
     },
     outputs = {
         "delay_info": "%{name}.txt",
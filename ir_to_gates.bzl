@@ -1,6 +1,5 @@
 # SPDX-License-Identifier: Apache-2.0
 
-load(":env_helpers.bzl", "python_runner_source")
 load(":ir_provider.bzl", "IrInfo")
 load(
     ":xls_toolchain.bzl",
@@ -8,6 +7,9 @@ load(
     "declare_xls_toolchain_toml",
     "get_driver_artifact_inputs",
     "get_selected_driver_toolchain",
+    "resource_class_attr",
+    "run_xls_driver_action",
+    "xlsynth_runner_attr",
 )
 
 def _ir_to_gates_impl(ctx):
@@ -16,33 +18,35 @@ def _ir_to_gates_impl(ctx):
     gates_file = ctx.outputs.gates_file
     metrics_file = ctx.outputs.metrics_json
 
-    runner = ctx.actions.declare_file(ctx.label.name + "_runner.py")
-    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    runner = ctx.executable._runner
     toolchain = get_selected_driver_toolchain(ctx)
     toolchain_file = declare_xls_toolchain_toml(ctx, name = "ir_to_gates", toolchain = toolchain)
 
-    ctx.actions.run(
-        inputs = [ir_file_to_use, toolchain_file] + get_driver_artifact_inputs(toolchain),
-        executable = runner,
-        outputs = [gates_file, metrics_file],
+    # The runner enforces fraig budgets around the driver, which has no
+    # budget of its own, and records the fraig status in the metrics JSON.
+    runner_flags = []
+    if ctx.attr.fraig and ctx.attr.fraig_timeout_seconds > 0:
+        runner_flags.extend(["--fraig_timeout", str(ctx.attr.fraig_timeout_seconds)])
+    if ctx.attr.fraig and ctx.attr.fraig_max_gates > 0:
+        runner_flags.extend(["--fraig_max_gates", str(ctx.attr.fraig_max_gates)])
+
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "ir2gates",
         arguments = [
-            "driver",
-            "--driver_path",
-            toolchain.driver_path,
-            "--runtime_library_path",
-            toolchain.runtime_library_path,
-            "--toolchain",
-            toolchain_file.path,
-            "--stdout_path",
-            gates_file.path,
-            "ir2gates",
             "--fraig={}".format("true" if ctx.attr.fraig else "false"),
             "--output_json={}".format(metrics_file.path),
             ir_file_to_use.path,
         ],
-        use_default_shell_env = False,
-        progress_message = "Generating gate-level analysis for IR",
+        inputs = [ir_file_to_use, toolchain_file] + get_driver_artifact_inputs(toolchain),
+        outputs = [gates_file, metrics_file],
         mnemonic = "IR2GATES",
+        stdout = gates_file,
+        progress_message = "Generating gate-level analysis for IR",
+        runner_flags = runner_flags,
     )
 
     return DefaultInfo(
@@ -62,10 +66,20 @@ ir_to_gates = rule(
             doc = "If true, perform \"fraig\" optimization; can be slow when gate graph is large.",
             default = True,
         ),
+        "fraig_timeout_seconds": attr.int(
+            doc = "If >0, abandon fraig after this many seconds and report the unfraiged gate graph instead.",
+            default = 0,
+        ),
+        "fraig_max_gates": attr.int(
+            doc = "If >0, skip fraig when the unfraiged gate graph has more than this many gates.",
+            default = 0,
+        ),
+        "resource_class": resource_class_attr(),
         "xls_bundle": attr.label(
             doc = "Optional XLS bundle override.",
             providers = [XlsArtifactBundleInfo],
         ),
+        "_runner": xlsynth_runner_attr(),
     },
     outputs = {
         "gates_file": "%{name}.txt",
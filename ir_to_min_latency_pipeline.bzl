@@ -0,0 +1,115 @@
+# SPDX-License-Identifier: Apache-2.0
+
+load(":dslx_to_pipeline.bzl", "PipelineCodegenAttrs", "pipeline_codegen_arguments")
+load(":ir_provider.bzl", "IrInfo")
+load(
+    ":xls_toolchain.bzl",
+    "declare_xls_toolchain_toml",
+    "get_driver_artifact_inputs",
+    "get_selected_driver_toolchain",
+    "resource_class_cpus",
+    "run_xls_driver_action",
+)
+
+def _ir_to_min_latency_pipeline_impl(ctx):
+    if ctx.attr.clock_period_ps <= 0:
+        fail("Please specify 'clock_period_ps' (>0)")
+    if ctx.attr.max_pipeline_stages <= 0:
+        fail("Please specify 'max_pipeline_stages' (>0)")
+    if ctx.attr.jobs < 0:
+        fail("Please specify 'jobs' (>=0)")
+    ir_file = ctx.attr.ir_src[IrInfo].opt_ir_file
+    runner = ctx.executable._runner
+    toolchain = get_selected_driver_toolchain(ctx)
+    toolchain_file = declare_xls_toolchain_toml(
+        ctx,
+        name = "ir_to_min_latency_pipeline",
+        toolchain = toolchain,
+        add_invariant_assertions = ctx.attr.add_invariant_assertions,
+    )
+
+    # The critical path bounds the search from below: a pipeline needs at
+    # least ceil(critical path / clock period) stages.
+    delay_info_file = ctx.actions.declare_file("{}.delay_info.txt".format(ctx.label.name))
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "ir2delayinfo",
+        arguments = ["--delay_model", ctx.attr.delay_model, ir_file.path, ctx.attr.top],
+        inputs = [ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["delay_info_main"]),
+        outputs = [delay_info_file],
+        mnemonic = "IR2DELAYINFO",
+        stdout = delay_info_file,
+        progress_message = "Computing delay info for %{label}",
+    )
+
+    # One action runs every probe, because which stage counts to try next
+    # depends on the previous round. All probes schedule the same optimized
+    # IR, so the frontend and optimizer never rerun. The probes never
+    # outnumber the CPUs the action's resource class reserves.
+    reserved_cpus = resource_class_cpus(ctx, toolchain, "IR2PIPELINESEARCH")
+    jobs = min(ctx.attr.jobs, reserved_cpus) if ctx.attr.jobs > 0 else reserved_cpus
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "ir2pipeline",
+        arguments = [ir_file.path, "--top=" + ctx.attr.top] + pipeline_codegen_arguments(ctx, pipeline_stages = 0),
+        inputs = [ir_file, toolchain_file, delay_info_file] + get_driver_artifact_inputs(toolchain, ["opt_main", "codegen_main"]),
+        outputs = [ctx.outputs.sv_file, ctx.outputs.search_report],
+        mnemonic = "IR2PIPELINESEARCH",
+        stdout = ctx.outputs.sv_file,
+        progress_message = "Searching for the shallowest pipeline of %{label}",
+        runner_flags = [
+            "--stage_search_max",
+            str(ctx.attr.max_pipeline_stages),
+            "--stage_search_jobs",
+            str(jobs),
+            "--stage_search_delay_info",
+            delay_info_file.path,
+            "--stage_search_report",
+            ctx.outputs.search_report.path,
+        ],
+    )
+
+    return [
+        DefaultInfo(files = depset([ctx.outputs.sv_file, ctx.outputs.search_report])),
+        OutputGroupInfo(delay_info = depset([delay_info_file])),
+    ]
+
+ir_to_min_latency_pipeline = rule(
+    doc = "Generate the pipeline with the fewest stages that meets a clock period from the optimized IR of an IR target",
+    implementation = _ir_to_min_latency_pipeline_impl,
+    attrs = dict(
+        {key: value for key, value in PipelineCodegenAttrs.items() if key != "pipeline_stages"},
+        clock_period_ps = attr.int(
+            doc = "Target clock period in picoseconds.",
+            mandatory = True,
+        ),
+        ir_src = attr.label(
+            doc = "The IR target (for example a `dslx_to_ir`) whose optimized IR is scheduled.",
+            providers = [IrInfo],
+            mandatory = True,
+        ),
+        top = attr.string(
+            doc = "The IR function to schedule.",
+            mandatory = True,
+        ),
+        max_pipeline_stages = attr.int(
+            doc = "The deepest pipeline to try before giving up.",
+            default = 32,
+        ),
+        jobs = attr.int(
+            doc = "How many stage counts to probe concurrently in each search round, at most the CPUs of the action's resource class (4 for the default `parallel`). 0 uses that many.",
+            default = 4,
+        ),
+    ),
+    outputs = {
+        "sv_file": "%{name}.sv",
+        "search_report": "%{name}.search.json",
+    },
+    toolchains = ["//:toolchain_type"],
+)
@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: Apache-2.0
+
+load(":dslx_to_pipeline.bzl", "PipelineCodegenAttrs", "pipeline_codegen_arguments")
+load(":ir_provider.bzl", "IrInfo")
+load(
+    ":xls_toolchain.bzl",
+    "declare_xls_toolchain_toml",
+    "get_driver_artifact_inputs",
+    "get_selected_driver_toolchain",
+    "run_xls_driver_action",
+)
+
+def _ir_to_pipeline_impl(ctx):
+    ir_file = ctx.attr.ir_src[IrInfo].opt_ir_file
+    passthrough = pipeline_codegen_arguments(ctx)
+    if ctx.attr.top:
+        passthrough.append("--top=" + ctx.attr.top)
+
+    runner = ctx.executable._runner
+    toolchain = get_selected_driver_toolchain(ctx)
+    toolchain_file = declare_xls_toolchain_toml(
+        ctx,
+        name = "ir_to_pipeline",
+        toolchain = toolchain,
+        add_invariant_assertions = ctx.attr.add_invariant_assertions,
+    )
+
+    # Only scheduling and codegen run here; the DSLX frontend and the IR
+    # optimizer already ran once in the `ir_src` target.
+    run_xls_driver_action(
+        ctx,
+        runner = runner,
+        toolchain = toolchain,
+        toolchain_file = toolchain_file,
+        subcommand = "ir2pipeline",
+        arguments = [ir_file.path] + passthrough,
+        inputs = [ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["opt_main", "codegen_main"]),
+        outputs = [ctx.outputs.sv_file],
+        mnemonic = "IR2PIPELINE",
+        stdout = ctx.outputs.sv_file,
+        progress_message = "Generating pipeline for IR",
+    )
+
+    return DefaultInfo(
+        files = depset(direct = [ctx.outputs.sv_file]),
+    )
+
+ir_to_pipeline = rule(
+    doc = "Schedule and generate a pipeline from the optimized IR of an existing IR target",
+    implementation = _ir_to_pipeline_impl,
+    attrs = dict(
+        PipelineCodegenAttrs,
+        ir_src = attr.label(
+            doc = "The IR target (for example a `dslx_to_ir`) whose optimized IR is scheduled.",
+            providers = [IrInfo],
+            mandatory = True,
+        ),
+        top = attr.string(
+            doc = "The IR function to schedule. Defaults to the top of the IR package, which `dslx_to_ir` sets.",
+            default = "",
+        ),
+    ),
+    outputs = {
+        "sv_file": "%{name}.sv",
+    },
+    toolchains = ["//:toolchain_type"],
+)
@@ -21,7 +21,9 @@ def _generate_bzl(py_source: str) -> str:
     ]
     docstring = textwrap.indent(textwrap.dedent(f'"""{_DOCSTRING}\n"""'),
                                 "    ").rstrip()
-    escaped_python = py_source.replace('"""', '\"\"\"')
+    # The source is embedded in a Starlark triple-quoted string, so backslashes
+    # must be doubled for the string to evaluate back to the exact source.
+    escaped_python = py_source.replace("\\", "\\\\").replace('"""', '\\"""')
     python_lines = escaped_python.splitlines()
     if python_lines:
         return_lines = [f'    return """{python_lines[0]}']
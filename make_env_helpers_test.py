@@ -38,6 +38,20 @@ class MakeEnvHelpersTest(unittest.TestCase):
                 "env_helpers.bzl is out of date; run `python make_env_helpers.py`",
             )
 
+    def test_embedded_runner_source_round_trips(self) -> None:
+        repo_root = pathlib.Path(__file__).resolve().parent
+        env_helpers_bzl = repo_root / "env_helpers.bzl"
+        env_helpers_py = repo_root / "env_helpers.py"
+
+        # The generated helper is a single Starlark def whose string escapes
+        # match Python's, so evaluating it here recovers the embedded source.
+        namespace = {}
+        exec(env_helpers_bzl.read_text(), namespace)
+        embedded = namespace["python_runner_source"]()
+
+        self.assertEqual(embedded.rstrip(), env_helpers_py.read_text().rstrip())
+        compile(embedded, "xlsynth_runner.py", "exec")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,184 @@
+# SPDX-License-Identifier: Apache-2.0
+
+load(":dslx_to_pipeline.bzl", "PipelineCodegenAttrs", "pipeline_codegen_arguments")
+load(":ir_provider.bzl", "IrInfo")
+load(
+    ":xls_toolchain.bzl",
+    "declare_xls_toolchain_toml",
+    "get_driver_artifact_inputs",
+    "get_selected_driver_toolchain",
+    "run_xls_driver_action",
+    "run_xls_report_action",
+    "xls_report_attr",
+)
+
+def _sweep_points(ctx):
+    stages_values = ctx.attr.pipeline_stages or [0]
+    clock_values = ctx.attr.clock_period_ps or [0]
+    if stages_values == [0] and clock_values == [0]:
+        fail("Please specify 'pipeline_stages' and/or 'clock_period_ps' values to sweep")
+    for value in stages_values + clock_values:
+        if value < 0:
+            fail("Sweep values must be positive, got {}".format(value))
+    points = []
+    for delay_model in ctx.attr.delay_models:
+        for stages in stages_values:
+            for clock_period_ps in clock_values:
+                points.append(struct(
+                    delay_model = delay_model,
+                    pipeline_stages = stages,
+                    clock_period_ps = clock_period_ps,
+                ))
+    return points
+
+def _point_name(point):
+    parts = [point.delay_model]
+    if point.pipeline_stages:
+        parts.append("s{}".format(point.pipeline_stages))
+    if point.clock_period_ps:
+        parts.append("c{}ps".format(point.clock_period_ps))
+    return "_".join(parts)
+
+def _pipeline_sweep_impl(ctx):
+    if not ctx.attr.delay_models:
+        fail("Please specify at least one entry in 'delay_models'")
+    ir_file = ctx.attr.ir_src[IrInfo].opt_ir_file
+    runner = ctx.executable._runner
+    toolchain = get_selected_driver_toolchain(ctx)
+    toolchain_file = declare_xls_toolchain_toml(
+        ctx,
+        name = "pipeline_sweep",
+        toolchain = toolchain,
+        add_invariant_assertions = ctx.attr.add_invariant_assertions,
+    )
+
+    # Every point schedules the same optimized IR, so the frontend and the
+    # optimizer never rerun; each point is its own action and Bazel runs them
+    # in parallel. A point that cannot be scheduled records its error in a
+    # status file instead of failing the build.
+    codegen_inputs = [ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["opt_main", "codegen_main"])
+    verilog_files = []
+    status_files = []
+    manifest_points = []
+    for point in _sweep_points(ctx):
+        point_name = _point_name(point)
+        sv_file = ctx.actions.declare_file("{}/{}.sv".format(ctx.label.name, point_name))
+        status_file = ctx.actions.declare_file("{}/{}.status.json".format(ctx.label.name, point_name))
+        passthrough = pipeline_codegen_arguments(
+            ctx,
+            delay_model = point.delay_model,
+            pipeline_stages = point.pipeline_stages,
+            clock_period_ps = point.clock_period_ps,
+        )
+        run_xls_driver_action(
+            ctx,
+            runner = runner,
+            toolchain = toolchain,
+            toolchain_file = toolchain_file,
+            subcommand = "ir2pipeline",
+            arguments = [ir_file.path, "--top=" + ctx.attr.top] + passthrough,
+            inputs = codegen_inputs,
+            outputs = [sv_file, status_file],
+            mnemonic = "IR2PIPELINE",
+            stdout = sv_file,
+            progress_message = "Generating pipeline sweep point {} for %{{label}}".format(point_name),
+            runner_flags = ["--status_path", status_file.path],
+        )
+        verilog_files.append(sv_file)
+        status_files.append(status_file)
+        manifest_points.append({
+            "delay_model": point.delay_model,
+            "pipeline_stages": point.pipeline_stages,
+            "clock_period_ps": point.clock_period_ps,
+            "verilog": sv_file.path,
+            "status": status_file.path,
+        })
+
+    # The critical path depends only on the IR and the delay model, so it is
+    # computed once per model rather than once per point.
+    delay_info_files = {}
+    for delay_model in ctx.attr.delay_models:
+        delay_info_file = ctx.actions.declare_file("{}/{}.delay_info.txt".format(ctx.label.name, delay_model))
+        run_xls_driver_action(
+            ctx,
+            runner = runner,
+            toolchain = toolchain,
+            toolchain_file = toolchain_file,
+            subcommand = "ir2delayinfo",
+            arguments = ["--delay_model", delay_model, ir_file.path, ctx.attr.top],
+            inputs = [ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["delay_info_main"]),
+            outputs = [delay_info_file],
+            mnemonic = "IR2DELAYINFO",
+            stdout = delay_info_file,
+            progress_message = "Computing {} delay info for %{{label}}".format(delay_model),
+        )
+        delay_info_files[delay_model] = delay_info_file
+
+    manifest = ctx.actions.declare_file("{}.manifest.json".format(ctx.label.name))
+    ctx.actions.write(
+        output = manifest,
+        content = json.encode({
+            "points": manifest_points,
+            "delay_info": {model: f.path for model, f in delay_info_files.items()},
+        }),
+    )
+    run_xls_report_action(
+        ctx,
+        report = ctx.executable._report,
+        kind = "pipeline_sweep",
+        manifest = manifest,
+        inputs = [manifest] + verilog_files + status_files + delay_info_files.values(),
+        outputs = [ctx.outputs.csv, ctx.outputs.json],
+        mnemonic = "PIPELINESWEEP",
+        output_csv = ctx.outputs.csv,
+        output_json = ctx.outputs.json,
+        progress_message = "Summarizing pipeline sweep %{label}",
+    )
+
+    return [
+        DefaultInfo(files = depset([ctx.outputs.csv, ctx.outputs.json])),
+        OutputGroupInfo(
+            verilog = depset(verilog_files),
+            delay_info = depset(delay_info_files.values()),
+        ),
+    ]
+
+# The per-point settings replace the single-valued scheduling attributes.
+_SWEEP_CODEGEN_ATTRS = {
+    key: value
+    for key, value in PipelineCodegenAttrs.items()
+    if key not in ["delay_model", "pipeline_stages", "clock_period_ps"]
+}
+
+pipeline_sweep = rule(
+    doc = "Schedule one optimized IR at every combination of delay model, stage count, and clock period, and summarize the results",
+    implementation = _pipeline_sweep_impl,
+    attrs = dict(
+        _SWEEP_CODEGEN_ATTRS,
+        ir_src = attr.label(
+            doc = "The IR target (for example a `dslx_to_ir`) whose optimized IR is scheduled.",
+            providers = [IrInfo],
+            mandatory = True,
+        ),
+        top = attr.string(
+            doc = "The IR function to schedule.",
+            mandatory = True,
+        ),
+        delay_models = attr.string_list(
+            doc = "The delay models to sweep (e.g., ['asap7', 'unit']).",
+            mandatory = True,
+        ),
+        pipeline_stages = attr.int_list(
+            doc = "Stage counts to sweep. Combined with every `clock_period_ps` value when both are given.",
+        ),
+        clock_period_ps = attr.int_list(
+            doc = "Target clock periods in picoseconds to sweep.",
+        ),
+        _report = xls_report_attr(),
+    ),
+    outputs = {
+        "csv": "%{name}.csv",
+        "json": "%{name}.json",
+    },
+    toolchains = ["//:toolchain_type"],
+)
@@ -0,0 +1,127 @@
+# SPDX-License-Identifier: Apache-2.0
+
+load(":helpers.bzl", "write_executable_shell_script")
+load(":xls_toolchain.bzl", "xls_report_attr")
+
+QorBaselineInfo = provider(
+    doc = "What a `qor_regression_test` compares, so `qor_baseline_update` can rewrite its baseline.",
+    fields = {
+        "check": "Dict describing the check for the `qor_check`/`qor_baseline` reports of `xls_report`.",
+        "files": "Depset of the analysis outputs and baseline the check reads.",
+    },
+)
+
+def _single_file_with_extension(target, extension, attr_name):
+    matches = [f for f in target[DefaultInfo].files.to_list() if f.extension == extension]
+    if len(matches) != 1:
+        fail("'{}' must produce exactly one .{} file, got {}".format(attr_name, extension, len(matches)))
+    return matches[0]
+
+def _report_script(ctx, manifest, kind):
+    # Runs `xls_report` on `manifest` from the runfiles tree.
+    cmd_parts = [
+        ctx.executable._report.short_path,
+        "--manifest",
+        manifest.short_path,
+        kind,
+    ]
+    return write_executable_shell_script(
+        ctx = ctx,
+        filename = ctx.label.name + ".sh",
+        cmd = " ".join(["\"{}\"".format(part) for part in cmd_parts]),
+    )
+
+def _qor_regression_test_impl(ctx):
+    if not ctx.attr.gates and not ctx.attr.delay_info:
+        fail("Please specify 'gates' and/or 'delay_info'")
+    baseline = ctx.file.baseline
+    check = {
+        "name": str(ctx.label),
+        "baseline": baseline.short_path,
+        "relative_tolerance": ctx.attr.relative_tolerance,
+        "absolute_tolerance": ctx.attr.absolute_tolerance,
+    }
+
+    # Only a baseline in the main repository can be rewritten in the source
+    # tree, where its short path is also its workspace-relative path.
+    if baseline.is_source and not baseline.owner.workspace_name:
+        check["baseline_source"] = baseline.short_path
+    files = [baseline]
+    if ctx.attr.gates:
+        gates_json = _single_file_with_extension(ctx.attr.gates, "json", "gates")
+        check["gates_json"] = gates_json.short_path
+        files.append(gates_json)
+    if ctx.attr.delay_info:
+        delay_info = _single_file_with_extension(ctx.attr.delay_info, "txt", "delay_info")
+        check["delay_info"] = delay_info.short_path
+        files.append(delay_info)
+
+    manifest = ctx.actions.declare_file(ctx.label.name + ".qor_check.json")
+    ctx.actions.write(output = manifest, content = json.encode({"checks": [check]}))
+    script = _report_script(ctx, manifest, "qor_check")
+    return [
+        DefaultInfo(
+            runfiles = ctx.runfiles(files = files + [manifest]).merge(ctx.attr._report[DefaultInfo].default_runfiles),
+            files = depset([script]),
+            executable = script,
+        ),
+        QorBaselineInfo(check = check, files = depset(files)),
+    ]
+
+qor_regression_test = rule(
+    doc = "Fails when the gate count, depth, or critical path of an IR regresses beyond a tolerance from a checked-in baseline",
+    implementation = _qor_regression_test_impl,
+    attrs = {
+        "gates": attr.label(
+            doc = "An `ir_to_gates` target; every numeric field of its metrics JSON can be checked.",
+        ),
+        "delay_info": attr.label(
+            doc = "An `ir_to_delay_info` target; provides the `critical_path_ps` metric.",
+        ),
+        "baseline": attr.label(
+            doc = "JSON file of the form {\"metrics\": {name: value}}. Only the metrics it lists are checked.",
+            allow_single_file = [".json"],
+            mandatory = True,
+        ),
+        "relative_tolerance": attr.string_dict(
+            doc = "Allowed increase per metric as a fraction of the baseline, e.g. {\"live_nodes\": \"0.02\"}. The `*` key applies to unlisted metrics.",
+        ),
+        "absolute_tolerance": attr.string_dict(
+            doc = "Allowed increase per metric in the metric's own unit, e.g. {\"critical_path_ps\": \"10\"}. The `*` key applies to unlisted metrics. The larger of the two tolerances applies.",
+        ),
+        "_report": xls_report_attr(cfg = "target"),
+    },
+    test = True,
+)
+
+def _qor_baseline_update_impl(ctx):
+    checks = []
+    files = []
+    for test in ctx.attr.tests:
+        check = test[QorBaselineInfo].check
+        if "baseline_source" not in check:
+            fail("{} has a baseline outside the main repository's source tree, which cannot be rewritten".format(test.label))
+        checks.append(check)
+        files.append(test[QorBaselineInfo].files)
+    manifest = ctx.actions.declare_file(ctx.label.name + ".qor_baseline.json")
+    ctx.actions.write(output = manifest, content = json.encode({"checks": checks}))
+    script = _report_script(ctx, manifest, "qor_baseline")
+    return DefaultInfo(
+        runfiles = ctx.runfiles(files = [manifest], transitive_files = depset(transitive = files)).merge(ctx.attr._report[DefaultInfo].default_runfiles),
+        files = depset([script]),
+        executable = script,
+    )
+
+qor_baseline_update = rule(
+    doc = "A `bazel run` target that rewrites the baselines of `qor_regression_test` targets with their current metrics",
+    implementation = _qor_baseline_update_impl,
+    attrs = {
+        "tests": attr.label_list(
+            doc = "The `qor_regression_test` targets whose baselines to rewrite.",
+            providers = [QorBaselineInfo],
+            mandatory = True,
+        ),
+        "_report": xls_report_attr(cfg = "target"),
+    },
+    executable = True,
+)
@@ -0,0 +1,236 @@
+# SPDX-License-Identifier: Apache-2.0
+
+load("@bazel_skylib//rules:common_settings.bzl", "BuildSettingInfo")
+load(":ir_provider.bzl", "IrInfo")
+load(
+    ":xls_toolchain.bzl",
+    "declare_xls_toolchain_toml",
+    "get_driver_artifact_inputs",
+    "get_selected_driver_toolchain",
+    "run_xls_driver_action",
+    "run_xls_report_action",
+    "xls_report_attr",
+    "xlsynth_runner_attr",
+)
+
+QorInfo = provider(
+    doc = "Gate and delay analysis results collected by `qor_aspect`.",
+    fields = {
+        "records": "Depset of structs (`label`, `top`, `source`, `gates_json`, `delay_model`, `delay_info`), one per analyzed IR; `gates_json` and `delay_info` may be None.",
+    },
+)
+
+# Attributes the aspect follows to reach IR targets: library and test lists,
+# filegroups and test suites, and the IR inputs of the analysis rules.
+_QOR_ATTR_ASPECTS = ["deps", "srcs", "data", "tests", "ir", "ir_src"]
+
+_QOR_ANALYSES = ["gates", "delay"]
+
+def _requested_analyses(ctx):
+    analyses = [analysis.strip() for analysis in ctx.attr._qor_analyses_flag[BuildSettingInfo].value.split(",") if analysis.strip()]
+    for analysis in analyses:
+        if analysis not in _QOR_ANALYSES:
+            fail("@rules_xlsynth//config:qor_analyses must list only {}, got {}".format(", ".join(_QOR_ANALYSES), repr(analysis)))
+    return analyses
+
+def _analyze_ir(target, ctx, analyses):
+    # Runs the requested analyses on the optimized IR of an IR target with the
+    # registered toolchain.
+    ir_info = target[IrInfo]
+    ir_file = ir_info.opt_ir_file
+    top = getattr(ir_info, "top", None)
+    runner = ctx.executable._runner
+    toolchain = get_selected_driver_toolchain(ctx)
+    toolchain_file = declare_xls_toolchain_toml(ctx, name = "qor", toolchain = toolchain)
+
+    gates_json = None
+    if "gates" in analyses:
+        gates_file = ctx.actions.declare_file("{}.qor_gates.txt".format(target.label.name))
+        gates_json = ctx.actions.declare_file("{}.qor_gates.json".format(target.label.name))
+        run_xls_driver_action(
+            ctx,
+            runner = runner,
+            toolchain = toolchain,
+            toolchain_file = toolchain_file,
+            subcommand = "ir2gates",
+            arguments = [
+                "--fraig=true",
+                "--output_json={}".format(gates_json.path),
+                ir_file.path,
+            ],
+            inputs = [ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain),
+            outputs = [gates_file, gates_json],
+            mnemonic = "IR2GATES",
+            stdout = gates_file,
+            progress_message = "Generating gate-level analysis for %{label}",
+        )
+
+    # ir2delayinfo needs the top function, which only IR producers that know
+    # it publish.
+    delay_model = ctx.attr._qor_delay_model_flag[BuildSettingInfo].value
+    delay_info = None
+    if "delay" in analyses and top:
+        delay_info = ctx.actions.declare_file("{}.qor_delay_info.txt".format(target.label.name))
+        run_xls_driver_action(
+            ctx,
+            runner = runner,
+            toolchain = toolchain,
+            toolchain_file = toolchain_file,
+            subcommand = "ir2delayinfo",
+            arguments = ["--delay_model", delay_model, ir_file.path, top],
+            inputs = [ir_file, toolchain_file] + get_driver_artifact_inputs(toolchain, ["delay_info_main"]),
+            outputs = [delay_info],
+            mnemonic = "IR2DELAYINFO",
+            stdout = delay_info,
+            progress_message = "Computing delay info for %{label}",
+        )
+    if gates_json == None and delay_info == None:
+        return None
+    return struct(
+        label = str(target.label),
+        top = top or "",
+        source = "",
+        gates_json = gates_json,
+        delay_model = delay_model if delay_info != None else "",
+        delay_info = delay_info,
+    )
+
+def _existing_analysis(target, ctx):
+    # `ir_to_gates` and `ir_to_delay_info` targets contribute their own
+    # outputs, filed under the IR target they analyze.
+    if ctx.rule.kind not in ["ir_to_gates", "ir_to_delay_info"]:
+        return None
+    ir_target = ctx.rule.attr.ir_src if ctx.rule.kind == "ir_to_gates" else ctx.rule.attr.ir
+    if ir_target == None or IrInfo not in ir_target:
+        return None
+    files = target[DefaultInfo].files.to_list()
+    if ctx.rule.kind == "ir_to_gates":
+        return struct(
+            label = str(ir_target.label),
+            top = getattr(ir_target[IrInfo], "top", None) or "",
+            source = str(target.label),
+            gates_json = [f for f in files if f.extension == "json"][0],
+            delay_model = "",
+            delay_info = None,
+        )
+    return struct(
+        label = str(ir_target.label),
+        top = ctx.rule.attr.top,
+        source = str(target.label),
+        gates_json = None,
+        delay_model = ctx.rule.attr.delay_model,
+        delay_info = files[0],
+    )
+
+def _qor_aspect_impl(target, ctx):
+    direct = []
+    if IrInfo in target:
+        analyses = _requested_analyses(ctx)
+        if analyses:
+            record = _analyze_ir(target, ctx, analyses)
+            if record != None:
+                direct.append(record)
+    else:
+        record = _existing_analysis(target, ctx)
+        if record != None:
+            direct.append(record)
+
+    transitive = []
+    for attr_name in _QOR_ATTR_ASPECTS:
+        value = getattr(ctx.rule.attr, attr_name, None)
+        if value == None:
+            continue
+        for dep in (value if type(value) == "list" else [value]):
+            if type(dep) == "Target" and QorInfo in dep:
+                transitive.append(dep[QorInfo].records)
+    records = depset(direct, transitive = transitive)
+    outputs = [f for record in direct for f in [record.gates_json, record.delay_info] if f != None]
+    return [
+        QorInfo(records = records),
+        OutputGroupInfo(qor = depset(outputs)),
+    ]
+
+qor_aspect = aspect(
+    doc = "Runs gate and delay analysis on the IR targets it reaches and collects the results, including those of `ir_to_gates` and `ir_to_delay_info` targets.",
+    implementation = _qor_aspect_impl,
+    attr_aspects = _QOR_ATTR_ASPECTS,
+    attrs = {
+        "_qor_analyses_flag": attr.label(default = "//config:qor_analyses"),
+        "_qor_delay_model_flag": attr.label(default = "//config:qor_delay_model"),
+        "_runner": xlsynth_runner_attr(),
+    },
+    provides = [QorInfo],
+    toolchains = [config_common.toolchain_type("//:toolchain_type", mandatory = False)],
+)
+
+def _qor_report_impl(ctx):
+    records = depset(transitive = [target[QorInfo].records for target in ctx.attr.targets]).to_list()
+
+    # The aspect also analyzes the IR of `ir_to_gates` and `ir_to_delay_info`
+    # targets. Its results for an IR and top that such a target already covers
+    # are left out, so those actions are never requested and never run.
+    covered = {}
+    for record in records:
+        if record.source:
+            if record.gates_json != None:
+                covered[(record.label, record.top, "gates")] = True
+            if record.delay_info != None:
+                covered[(record.label, record.top, "delay")] = True
+    inputs = []
+    manifest_records = []
+    for record in records:
+        gates_json = record.gates_json
+        delay_info = record.delay_info
+        if not record.source:
+            if (record.label, record.top, "gates") in covered:
+                gates_json = None
+            if (record.label, record.top, "delay") in covered:
+                delay_info = None
+            if gates_json == None and delay_info == None:
+                continue
+        entry = {
+            "label": record.label,
+            "top": record.top,
+            "source": record.source,
+            "delay_model": record.delay_model if delay_info != None else "",
+        }
+        if gates_json != None:
+            entry["gates_json"] = gates_json.path
+            inputs.append(gates_json)
+        if delay_info != None:
+            entry["delay_info"] = delay_info.path
+            inputs.append(delay_info)
+        manifest_records.append(entry)
+
+    manifest = ctx.actions.declare_file("{}.manifest.json".format(ctx.label.name))
+    ctx.actions.write(output = manifest, content = json.encode({"records": manifest_records}))
+    run_xls_report_action(
+        ctx,
+        report = ctx.executable._report,
+        kind = "qor",
+        manifest = manifest,
+        inputs = [manifest] + inputs,
+        outputs = [ctx.outputs.csv, ctx.outputs.json],
+        mnemonic = "QORREPORT",
+        output_csv = ctx.outputs.csv,
+        output_json = ctx.outputs.json,
+        progress_message = "Summarizing QoR for %{label}",
+    )
+    return DefaultInfo(files = depset([ctx.outputs.csv, ctx.outputs.json]))
+
+qor_report = rule(
+    doc = "Collects gate count, depth, and critical-path delay for every IR target reachable from `targets` into one table",
+    implementation = _qor_report_impl,
+    attrs = {
+        "targets": attr.label_list(
+            doc = "Targets to walk, for example `dslx_to_ir`, `ir_to_gates`, or `ir_to_delay_info` targets, or test suites and filegroups of them.",
+            aspects = [qor_aspect],
+            mandatory = True,
+        ),
+        "_report": xls_report_attr(),
+    },
+    outputs = {
+        "csv": "%{name}.csv",
+        "json": "%{name}.json",
+    },
+)
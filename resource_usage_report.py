@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+
+"""Aggregates the runner's resource usage log by tool and by target.
+
+Each line of the log is one JSON record written by the runner when
+`--@rules_xlsynth//config:resource_log` or `XLSYNTH_RESOURCE_LOG` is set.
+
+Usage:
+    python resource_usage_report.py /tmp/xls_usage.jsonl [--sort cpu|wall|rss|count]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple
+
+
+class UsageTotals(NamedTuple):
+    count: int
+    failures: int
+    wall_seconds: float
+    cpu_seconds: float
+    max_rss_kb: int
+
+
+_EMPTY_TOTALS = UsageTotals(0, 0, 0.0, 0.0, 0)
+
+_SORT_KEYS = {
+    "count": lambda totals: totals.count,
+    "cpu": lambda totals: totals.cpu_seconds,
+    "rss": lambda totals: totals.max_rss_kb,
+    "wall": lambda totals: totals.wall_seconds,
+}
+
+
+def read_records(paths: Iterable[Path]) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    for path in paths:
+        with path.open("r", encoding = "utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    records.append(json.loads(line))
+    return records
+
+
+def tool_key(record: Dict[str, Any]) -> str:
+    subcommand = record.get("subcommand", "")
+    tool = record.get("tool", "")
+    return "{} {}".format(tool, subcommand) if subcommand else tool
+
+
+def target_key(record: Dict[str, Any]) -> str:
+    return record.get("label", "") or "<unknown>"
+
+
+def aggregate(records: Iterable[Dict[str, Any]], key_fn) -> Dict[str, UsageTotals]:
+    totals: Dict[str, UsageTotals] = {}
+    for record in records:
+        key = key_fn(record)
+        current = totals.get(key, _EMPTY_TOTALS)
+        totals[key] = UsageTotals(
+            count = current.count + 1,
+            failures = current.failures + (1 if record.get("exit_code", 0) != 0 else 0),
+            wall_seconds = current.wall_seconds + record.get("wall_seconds", 0.0),
+            cpu_seconds = current.cpu_seconds + record.get("user_seconds", 0.0) + record.get("sys_seconds", 0.0),
+            max_rss_kb = max(current.max_rss_kb, record.get("max_rss_kb", 0)),
+        )
+    return totals
+
+
+def format_table(title: str, totals: Dict[str, UsageTotals], sort: str) -> str:
+    rows = sorted(totals.items(), key = lambda item: _SORT_KEYS[sort](item[1]), reverse = True)
+    width = max([len(title)] + [len(key) for key in totals])
+    lines = ["{:<{}}  {:>6}  {:>6}  {:>10}  {:>10}  {:>12}".format(
+        title, width, "runs", "failed", "wall_s", "cpu_s", "max_rss_mb")]
+    for key, entry in rows:
+        lines.append("{:<{}}  {:>6}  {:>6}  {:>10.2f}  {:>10.2f}  {:>12.1f}".format(
+            key,
+            width,
+            entry.count,
+            entry.failures,
+            entry.wall_seconds,
+            entry.cpu_seconds,
+            entry.max_rss_kb / 1024.0,
+        ))
+    return "\n".join(lines)
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description = "Summarize xlsynth runner resource usage logs")
+    parser.add_argument("logs", nargs = "+", type = Path)
+    parser.add_argument("--sort", choices = sorted(_SORT_KEYS), default = "cpu")
+    args = parser.parse_args(argv[1:])
+
+    records = read_records(args.logs)
+    print(format_table("tool", aggregate(records, tool_key), args.sort))
+    print()
+    print(format_table("target", aggregate(records, target_key), args.sort))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,42 @@
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+from pathlib import Path
+import tempfile
+import unittest
+
+import resource_usage_report
+
+
+class ResourceUsageReportTest(unittest.TestCase):
+
+    def test_aggregates_by_tool_and_target(self) -> None:
+        records = [
+            {"label": "//a:gates", "tool": "xlsynth-driver", "subcommand": "ir2gates", "exit_code": 0,
+             "wall_seconds": 4.0, "user_seconds": 3.0, "sys_seconds": 0.5, "max_rss_kb": 2048},
+            {"label": "//b:gates", "tool": "xlsynth-driver", "subcommand": "ir2gates", "exit_code": 1,
+             "wall_seconds": 6.0, "user_seconds": 5.0, "sys_seconds": 0.5, "max_rss_kb": 4096},
+            {"label": "//a:gates", "tool": "opt_main", "subcommand": "", "exit_code": 0,
+             "wall_seconds": 1.0, "user_seconds": 1.0, "sys_seconds": 0.0, "max_rss_kb": 1024},
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            log = Path(tmp) / "usage.jsonl"
+            log.write_text("".join(json.dumps(record) + "\n" for record in records), encoding = "utf-8")
+            loaded = resource_usage_report.read_records([log])
+
+        by_tool = resource_usage_report.aggregate(loaded, resource_usage_report.tool_key)
+        self.assertEqual(sorted(by_tool), ["opt_main", "xlsynth-driver ir2gates"])
+        self.assertEqual(by_tool["xlsynth-driver ir2gates"].count, 2)
+        self.assertEqual(by_tool["xlsynth-driver ir2gates"].failures, 1)
+        self.assertAlmostEqual(by_tool["xlsynth-driver ir2gates"].cpu_seconds, 9.0)
+        self.assertEqual(by_tool["xlsynth-driver ir2gates"].max_rss_kb, 4096)
+
+        by_target = resource_usage_report.aggregate(loaded, resource_usage_report.target_key)
+        self.assertAlmostEqual(by_target["//a:gates"].wall_seconds, 5.0)
+
+        table = resource_usage_report.format_table("tool", by_tool, "cpu")
+        self.assertLess(table.index("xlsynth-driver ir2gates"), table.index("opt_main"))
+
+
+if __name__ == "__main__":
+    unittest.main()
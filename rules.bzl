@@ -1,6 +1,7 @@
 load(
     ":dslx_fmt.bzl",
     _dslx_fmt_test = "dslx_fmt_test",
+    _dslx_fmt_workspace = "dslx_fmt_workspace",
 )
 load(
     ":dslx_prove_quickcheck_test.bzl",
@@ -42,11 +43,27 @@ load(
     _ir_to_delay_info = "ir_to_delay_info",
 )
 load(":ir_to_gates.bzl", _ir_to_gates = "ir_to_gates")
+load(":ir_to_min_latency_pipeline.bzl", _ir_to_min_latency_pipeline = "ir_to_min_latency_pipeline")
+load(":ir_to_pipeline.bzl", _ir_to_pipeline = "ir_to_pipeline")
+load(":pipeline_sweep.bzl", _pipeline_sweep = "pipeline_sweep")
+load(
+    ":qor_regression_test.bzl",
+    _QorBaselineInfo = "QorBaselineInfo",
+    _qor_baseline_update = "qor_baseline_update",
+    _qor_regression_test = "qor_regression_test",
+)
+load(
+    ":qor_report.bzl",
+    _QorInfo = "QorInfo",
+    _qor_aspect = "qor_aspect",
+    _qor_report = "qor_report",
+)
 
 DslxInfo = _DslxInfo
 dslx_library = _dslx_library
 dslx_test = _dslx_test
 dslx_fmt_test = _dslx_fmt_test
+dslx_fmt_workspace = _dslx_fmt_workspace
 dslx_to_sv_types = _dslx_to_sv_types
 dslx_to_pipeline = _dslx_to_pipeline
 dslx_to_pipeline_eco = _dslx_to_pipeline_eco
@@ -56,4 +73,13 @@ mangle_dslx_name = _mangle_dslx_name
 dslx_prove_quickcheck_test = _dslx_prove_quickcheck_test
 ir_prove_equiv_test = _ir_prove_equiv_test
 ir_to_gates = _ir_to_gates
+ir_to_pipeline = _ir_to_pipeline
+ir_to_min_latency_pipeline = _ir_to_min_latency_pipeline
+pipeline_sweep = _pipeline_sweep
+QorInfo = _QorInfo
+qor_aspect = _qor_aspect
+qor_report = _qor_report
+QorBaselineInfo = _QorBaselineInfo
+qor_regression_test = _qor_regression_test
+qor_baseline_update = _qor_baseline_update
 dslx_stitch_pipeline = _dslx_stitch_pipeline
@@ -38,6 +38,9 @@ def _build_setting_override_flags(more_action_env: Optional[Dict[str, str]]) ->
         'XLSYNTH_ASSERT_FORMAT': '@rules_xlsynth//config:assert_format',
         'XLSYNTH_USE_SYSTEM_VERILOG': '@rules_xlsynth//config:use_system_verilog',
         'XLSYNTH_ADD_INVARIANT_ASSERTIONS': '@rules_xlsynth//config:add_invariant_assertions',
+        'XLSYNTH_DIRECT_TOOL_INVOCATION': '@rules_xlsynth//config:direct_tool_invocation',
+        'XLSYNTH_CONCURRENCY_DIR': '@rules_xlsynth//config:concurrency_dir',
+        'XLSYNTH_CONCURRENCY_LIMITS': '@rules_xlsynth//config:concurrency_limits',
     }
     flags: List[str] = []
     for key, value in more_action_env.items():
@@ -95,9 +98,10 @@ def bazel_test_opt(
         workspace_dir: Optional[Path] = None,
         capture_output: bool = False,
         dslx_path: Optional[Tuple[str, ...]] = None,
-        more_action_env: Optional[Dict[str, str]] = None):
+        more_action_env: Optional[Dict[str, str]] = None,
+        more_flags: Tuple[str, ...] = ()):
     assert isinstance(targets, tuple), targets
-    flags = []
+    flags = list(more_flags)
     # Force Bazel to rebuild rather than reusing the local shared disk cache so that
     # stale outputs (e.g. generated Verilog) cannot mask real regressions.
     #   * --disk_cache=  : overrides any ~/.bazelrc --disk_cache setting with an empty value
@@ -244,6 +248,44 @@ def run_sample_with_formats(config: PresubmitConfig):
     )
 
 
+@register
+def run_sample_direct_tool_invocation(config: PresubmitConfig):
+    """Runs the sample package with actions calling the tools without the Python runner."""
+    bazel_test_opt(
+        ('//sample/...',),
+        config,
+        more_action_env = {
+            'XLSYNTH_DIRECT_TOOL_INVOCATION': 'true',
+        },
+    )
+
+
+@register
+def run_sample_concurrency_limits(config: PresubmitConfig):
+    """Runs the solver- and fraig-heavy sample targets under host-wide token pools."""
+    token_dir = tempfile.mkdtemp(prefix = 'xlsynth_tokens_')
+    try:
+        bazel_test_opt(
+            (
+                '//sample:add_chain_gates_analysis_test',
+                '//sample:sample_ir_prove_equiv_test',
+                '//sample:sample_prove_all_quickchecks_test',
+            ),
+            config,
+            more_action_env = {
+                'XLSYNTH_CONCURRENCY_DIR': token_dir,
+                'XLSYNTH_CONCURRENCY_LIMITS': 'check_ir_equivalence_main=1,ir2gates=1,prove_quickcheck_main=1',
+            },
+            more_flags = ('--sandbox_writable_path=' + token_dir,),
+        )
+        lock_files = sorted(os.listdir(token_dir))
+        expected = ['check_ir_equivalence_main.0.lock', 'ir2gates.0.lock', 'prove_quickcheck_main.0.lock']
+        if lock_files != expected:
+            raise ValueError('Expected token lock files {}, got {}'.format(expected, lock_files))
+    finally:
+        shutil.rmtree(token_dir, ignore_errors = True)
+
+
 @register
 def run_readme_sample_snippets(config: PresubmitConfig):
     """Ensures that the Starlark BUILD snippets in the README can be loaded by Bazel.
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+
+"""Measures how long the xlsynth runner takes to get from startup to exec.
+
+The runner is launched the same way the rules launch it (isolated interpreter,
+toolchain TOML, tool mode) against a stand-in tool that exits immediately.
+Timing the same stand-in tool without the runner gives the process-spawn
+baseline; the difference is the runner's startup-to-exec latency.
+
+Usage:
+    python runner_startup_benchmark.py [--iterations N] [--python python3]
+"""
+
+import argparse
+import os
+from pathlib import Path
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+
+def _time_runs(cmd: List[str], iterations: int) -> List[float]:
+    samples: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        subprocess.run(cmd, check = True, stdout = subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _write_fixture(root: Path) -> List[str]:
+    tools_dir = root / "tools"
+    tools_dir.mkdir()
+    true_path = shutil.which("true")
+    if true_path is None:
+        raise RuntimeError("`true` is required on PATH for the benchmark stand-in tool")
+    os.symlink(true_path, tools_dir / "dslx_fmt")
+    toolchain_path = root / "toolchain.toml"
+    toolchain_path.write_text(
+        "[toolchain]\n"
+        "tool_path = \"{}\"\n"
+        "\n"
+        "[toolchain.dslx]\n"
+        "dslx_stdlib_path = \"{}\"\n"
+        "dslx_path = [\"a\", \"b\"]\n".format(tools_dir, root),
+        encoding = "utf-8",
+    )
+    runner_path = Path(__file__).resolve().parent / "env_helpers.py"
+    return [
+        str(runner_path),
+        "tool",
+        "--toolchain",
+        str(toolchain_path),
+        "--runtime_library_path",
+        str(root),
+        "dslx_fmt",
+        "--error_on_changes",
+        "input.x",
+    ]
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description = "Benchmark xlsynth runner startup-to-exec latency")
+    parser.add_argument("--iterations", type = int, default = 50)
+    parser.add_argument("--python", default = "python3", help = "Interpreter used to launch the runner")
+    args = parser.parse_args(argv[1:])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runner_cmd = _write_fixture(Path(tmp))
+        baseline = _time_runs([str(Path(tmp) / "tools" / "dslx_fmt")], args.iterations)
+        isolated = _time_runs([args.python, "-I", "-S"] + runner_cmd, args.iterations)
+        default = _time_runs([args.python] + runner_cmd, args.iterations)
+
+    baseline_median = statistics.median(baseline)
+    print("iterations: {}".format(args.iterations))
+    print("tool spawn baseline: median {:.2f} ms".format(baseline_median))
+    for label, samples in [("runner (-I -S)", isolated), ("runner (default)", default)]:
+        print("{}: median {:.2f} ms, p90 {:.2f} ms, startup-to-exec {:.2f} ms".format(
+            label,
+            statistics.median(samples),
+            _percentile(samples, 0.9),
+            statistics.median(samples) - baseline_median,
+        ))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
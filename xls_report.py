@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: Apache-2.0
+
+"""Summarizes and checks the outputs of other XLS actions.
+
+Each report reads a JSON manifest naming the files to look at:
+
+- `pipeline_sweep` and `qor` write a CSV/JSON table for `pipeline_sweep` and
+  `qor_report` targets.
+- `qor_check` compares metrics against a checked-in baseline for
+  `qor_regression_test`.
+- `qor_baseline` rewrites those baselines in the source tree for
+  `qor_baseline_update`.
+
+The metric parsers are shared with the runner, which uses them for pipeline
+stage search and ir2gates budgets.
+
+Usage:
+    xls_report.py --manifest manifest.json [--output_csv X] [--output_json Y] KIND
+"""
+
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from env_helpers import (
+    _GATE_COUNT_KEYS,
+    _GATE_DEPTH_KEYS,
+    _critical_path_ps,
+    _first_metric,
+    _gate_metrics,
+    _status_error,
+)
+
+
+def read_status(path: str) -> Dict[str, Any]:
+    # A point without a status file came from an action that had to succeed.
+    if not path:
+        return {"exit_code": 0, "log": ""}
+    with open(path, "r", encoding = "utf-8") as f:
+        return json.load(f)
+
+
+def verilog_pipeline_metrics(text: str) -> Tuple[int, int]:
+    # Returns (stage count, register bits) for a module from `codegen_main`.
+    # Stage N's registers sit under a `// ===== Pipe stage N:` header, stage 0
+    # being the inputs, and every pipeline register is declared as a `reg` or
+    # `logic` with an optional packed range and unpacked dimensions.
+    stage_indices = [int(index) for index in re.findall(r"//\s*=+\s*Pipe stage (\d+)", text)]
+    flop_bits = 0
+    declaration = re.compile(r"^\s*(?:reg|logic)\b\s*(?:\[\s*(\d+)\s*:\s*(\d+)\s*\])?\s*\w+\s*((?:\[[^\]]*\]\s*)*);", re.M)
+    for high, low, unpacked in declaration.findall(text):
+        bits = abs(int(high) - int(low)) + 1 if high else 1
+        for bounds in re.findall(r"\[\s*(\d+)\s*:\s*(\d+)\s*\]", unpacked):
+            bits *= abs(int(bounds[0]) - int(bounds[1])) + 1
+        flop_bits += bits
+    return (max(stage_indices) if stage_indices else 0), flop_bits
+
+
+PIPELINE_SWEEP_COLUMNS = (
+    "delay_model",
+    "pipeline_stages",
+    "clock_period_ps",
+    "status",
+    "stages",
+    "flop_bits",
+    "critical_path_ps",
+    "stage_delay_ps",
+    "verilog",
+)
+
+
+def pipeline_sweep_rows(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    critical_paths: Dict[str, Optional[int]] = {}
+    for delay_model, path in manifest.get("delay_info", {}).items():
+        with open(path, "r", encoding = "utf-8", errors = "replace") as f:
+            critical_paths[delay_model] = _critical_path_ps(f.read())
+    rows: List[Dict[str, Any]] = []
+    for point in manifest["points"]:
+        status = read_status(point.get("status", ""))
+        critical_path = critical_paths.get(point["delay_model"])
+        row = {
+            "delay_model": point["delay_model"],
+            "pipeline_stages": point.get("pipeline_stages") or None,
+            "clock_period_ps": point.get("clock_period_ps") or None,
+            "status": "ok" if status.get("exit_code") == 0 else "failed",
+            "stages": None,
+            "flop_bits": None,
+            "critical_path_ps": critical_path,
+            "stage_delay_ps": None,
+            "verilog": point["verilog"],
+        }
+        if row["status"] == "ok":
+            with open(point["verilog"], "r", encoding = "utf-8", errors = "replace") as f:
+                stages, flop_bits = verilog_pipeline_metrics(f.read())
+            row["stages"] = stages
+            row["flop_bits"] = flop_bits
+            if critical_path is not None and stages > 0:
+                # Estimate only: assumes the scheduler splits the
+                # combinational path evenly across the stages.
+                row["stage_delay_ps"] = -(-critical_path // stages)
+        else:
+            row["error"] = _status_error(status)
+        rows.append(row)
+    return rows
+
+
+QOR_COLUMNS = (
+    "label",
+    "top",
+    "gate_count",
+    "depth",
+    "delay_model",
+    "critical_path_ps",
+)
+
+
+def qor_rows(manifest: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # One row per (IR target, top). Results from explicit `ir_to_gates` and
+    # `ir_to_delay_info` targets replace what the aspect computed itself.
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    records = sorted(manifest["records"], key = lambda record: (record["source"] != "", record["source"]))
+    for record in records:
+        key = (record["label"], record["top"])
+        row = rows.setdefault(key, {
+            "label": record["label"],
+            "top": record["top"],
+            "gate_count": None,
+            "depth": None,
+            "delay_model": None,
+            "critical_path_ps": None,
+            "gate_metrics": {},
+            "sources": [],
+        })
+        if record["source"]:
+            row["sources"].append(record["source"])
+        if record.get("gates_json"):
+            metrics = _gate_metrics(record["gates_json"])
+            row["gate_metrics"] = metrics
+            row["gate_count"] = _first_metric(metrics, _GATE_COUNT_KEYS)
+            row["depth"] = _first_metric(metrics, _GATE_DEPTH_KEYS)
+        if record.get("delay_info"):
+            with open(record["delay_info"], "r", encoding = "utf-8", errors = "replace") as f:
+                row["critical_path_ps"] = _critical_path_ps(f.read())
+            row["delay_model"] = record["delay_model"] or None
+    return [rows[key] for key in sorted(rows)]
+
+
+def write_report(
+        rows: List[Dict[str, Any]],
+        columns: Tuple[str, ...],
+        json_key: str,
+        output_csv: str,
+        output_json: str) -> None:
+    if output_json:
+        with open(output_json, "w", encoding = "utf-8") as f:
+            json.dump({json_key: rows}, f, indent = 2, sort_keys = True)
+            f.write("\n")
+    if output_csv:
+        with open(output_csv, "w", encoding = "utf-8", newline = "") as f:
+            writer = csv.writer(f, lineterminator = "\n")
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(["" if row.get(column) is None else row[column] for column in columns])
+
+
+TABLE_REPORTS = {
+    "pipeline_sweep": (pipeline_sweep_rows, PIPELINE_SWEEP_COLUMNS, "points"),
+    "qor": (qor_rows, QOR_COLUMNS, "targets"),
+}
+
+
+def qor_current_metrics(check: Dict[str, Any]) -> Dict[str, Any]:
+    metrics: Dict[str, Any] = {}
+    if check.get("gates_json"):
+        metrics.update(_gate_metrics(check["gates_json"]))
+    if check.get("delay_info"):
+        with open(check["delay_info"], "r", encoding = "utf-8", errors = "replace") as f:
+            critical_path = _critical_path_ps(f.read())
+        if critical_path is not None:
+            metrics["critical_path_ps"] = critical_path
+    return metrics
+
+
+def qor_tolerance(tolerances: Dict[str, str], metric: str) -> float:
+    # Per-metric tolerance, falling back to the `*` entry and then to zero.
+    return float(tolerances.get(metric, tolerances.get("*", "0")))
+
+
+def format_table(rows: List[List[str]]) -> str:
+    widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+    return "".join(
+        "  ".join(cell.ljust(width) if column == 0 else cell.rjust(width) for column, (cell, width) in enumerate(zip(row, widths))).rstrip() + "\n"
+        for row in rows
+    )
+
+
+def check_qor(manifest: Dict[str, Any], report: Callable[[str], Any]) -> int:
+    # Compares each check's metrics against the metrics in its baseline JSON.
+    # Lower is better for every metric, so only an increase beyond
+    # max(absolute, relative * |baseline|) fails; a metric the analysis no
+    # longer reports fails too.
+    failed = []
+    for check in manifest["checks"]:
+        current = qor_current_metrics(check)
+        with open(check["baseline"], "r", encoding = "utf-8") as f:
+            baseline = json.load(f).get("metrics", {})
+        rows = [["metric", "baseline", "current", "delta", "allowed", "status"]]
+        for metric in sorted(baseline):
+            expected = baseline[metric]
+            allowed = max(
+                qor_tolerance(check.get("absolute_tolerance", {}), metric),
+                qor_tolerance(check.get("relative_tolerance", {}), metric) * abs(expected),
+            )
+            if metric not in current:
+                rows.append([metric, "{:g}".format(expected), "-", "-", "{:g}".format(allowed), "MISSING"])
+                failed.append(check["name"])
+                continue
+            delta = current[metric] - expected
+            percent = " ({:+.1f}%)".format(100.0 * delta / expected) if expected else ""
+            if delta > allowed:
+                status = "REGRESSED"
+                failed.append(check["name"])
+            elif -delta > allowed:
+                status = "improved"
+            else:
+                status = "ok"
+            rows.append([
+                metric,
+                "{:g}".format(expected),
+                "{:g}".format(current[metric]),
+                "{:+g}{}".format(delta, percent),
+                "{:g}".format(allowed),
+                status,
+            ])
+        report("{}:\n{}".format(check["name"], format_table(rows)))
+    if failed:
+        report("QoR regressed in {}; if intended, update the baseline with a `qor_baseline_update` target.\n".format(
+            ", ".join(sorted(set(failed)))))
+        return 1
+    return 0
+
+
+def update_qor_baselines(manifest: Dict[str, Any], report: Callable[[str], Any]) -> int:
+    # Rewrites each baseline in the source tree with the current metrics. An
+    # existing baseline keeps its choice of metrics; a new one gets them all.
+    workspace = os.environ.get("BUILD_WORKSPACE_DIRECTORY", "")
+    if not workspace:
+        raise RuntimeError("updating QoR baselines must run under `bazel run`")
+    for check in manifest["checks"]:
+        current = qor_current_metrics(check)
+        path = os.path.join(workspace, check["baseline_source"])
+        try:
+            with open(path, "r", encoding = "utf-8") as f:
+                tracked = list(json.load(f).get("metrics", {}))
+        except (OSError, ValueError):
+            tracked = []
+        metrics = {metric: current[metric] for metric in (tracked or current) if metric in current}
+        with open(path, "w", encoding = "utf-8") as f:
+            json.dump({"metrics": metrics}, f, indent = 2, sort_keys = True)
+            f.write("\n")
+        dropped = [metric for metric in tracked if metric not in current]
+        report("updated {} ({} metrics{})\n".format(
+            check["baseline_source"],
+            len(metrics),
+            "; no longer reported: " + ", ".join(dropped) if dropped else "",
+        ))
+    return 0
+
+
+# Reports that check or update files instead of writing a table.
+BASELINE_REPORTS = {
+    "qor_check": check_qor,
+    "qor_baseline": update_qor_baselines,
+}
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description = "Summarize or check the outputs of XLS actions")
+    parser.add_argument("kind", choices = sorted(list(TABLE_REPORTS) + list(BASELINE_REPORTS)))
+    parser.add_argument("--manifest", required = True)
+    parser.add_argument("--output_csv", default = "")
+    parser.add_argument("--output_json", default = "")
+    args = parser.parse_args(argv[1:])
+
+    with open(args.manifest, "r", encoding = "utf-8") as f:
+        manifest = json.load(f)
+    if args.kind in BASELINE_REPORTS:
+        return BASELINE_REPORTS[args.kind](manifest, sys.stdout.write)
+    rows_fn, columns, json_key = TABLE_REPORTS[args.kind]
+    write_report(rows_fn(manifest), columns, json_key, args.output_csv, args.output_json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
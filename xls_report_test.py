@@ -0,0 +1,212 @@
+# SPDX-License-Identifier: Apache-2.0
+
+import contextlib
+import io
+import json
+import os
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
+
+import env_helpers
+import xls_report
+
+
+class XlsReportTest(unittest.TestCase):
+
+    def test_pipeline_sweep_report_records_failed_points(self) -> None:
+        verilog = (
+            "module main(\n"
+            "  input wire clk,\n"
+            "  input wire [31:0] x,\n"
+            "  output wire [31:0] out\n"
+            ");\n"
+            "  // ===== Pipe stage 0:\n"
+            "  reg [31:0] p0_x;\n"
+            "  // ===== Pipe stage 1:\n"
+            "  wire [31:0] p1_add_3_comb;\n"
+            "  reg [31:0] p1_add_3;\n"
+            "  reg p1_valid;\n"
+            "  // ===== Pipe stage 2:\n"
+            "  reg [7:0] p2_table[0:3];\n"
+            "endmodule\n"
+        )
+        delay_info = (
+            "# Critical path:\n"
+            "     95ps (+ 60ps): add.3: bits[32] = add(x, x, id=3)\n"
+            "     35ps (+ 35ps): x: bits[32] = param(name=x, id=1)\n"
+            "\n"
+            "# Delay of all nodes:\n"
+            "add.3               :   60ps\n"
+        )
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            driver = tmp_path / "xlsynth-driver"
+            driver.write_text(
+                "#!/bin/sh\n"
+                "echo 'Error: cannot schedule in 1 stage at 10ps' >&2\n"
+                "exit 1\n",
+                encoding = "utf-8",
+            )
+            driver.chmod(0o755)
+            toolchain_path = tmp_path / "toolchain.toml"
+            toolchain_path.write_text("[toolchain]\n", encoding = "utf-8")
+            ok_sv = tmp_path / "asap7_s2.sv"
+            ok_sv.write_text(verilog, encoding = "utf-8")
+            failed_sv = tmp_path / "asap7_c10ps.sv"
+            failed_status = tmp_path / "asap7_c10ps.status.json"
+            delay_info_path = tmp_path / "asap7.delay_info.txt"
+            delay_info_path.write_text(delay_info, encoding = "utf-8")
+
+            exit_code = env_helpers._dispatch([
+                "xlsynth_runner",
+                "driver",
+                "--driver_path",
+                str(driver),
+                "--toolchain",
+                str(toolchain_path),
+                "--stdout_path",
+                str(failed_sv),
+                "--status_path",
+                str(failed_status),
+                "ir2pipeline",
+                "--clock_period_ps=10",
+            ], [])
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(json.loads(failed_status.read_text())["exit_code"], 1)
+
+            manifest = tmp_path / "manifest.json"
+            manifest.write_text(json.dumps({
+                "points": [
+                    {"delay_model": "asap7", "pipeline_stages": 2, "clock_period_ps": 0, "verilog": str(ok_sv)},
+                    {"delay_model": "asap7", "pipeline_stages": 0, "clock_period_ps": 10, "verilog": str(failed_sv),
+                     "status": str(failed_status)},
+                ],
+                "delay_info": {"asap7": str(delay_info_path)},
+            }), encoding = "utf-8")
+            csv_path = tmp_path / "sweep.csv"
+            json_path = tmp_path / "sweep.json"
+            exit_code = xls_report.main([
+                "xls_report",
+                "--manifest",
+                str(manifest),
+                "--output_csv",
+                str(csv_path),
+                "--output_json",
+                str(json_path),
+                "pipeline_sweep",
+            ])
+            self.assertEqual(exit_code, 0)
+            csv_lines = csv_path.read_text().splitlines()
+            rows = json.loads(json_path.read_text())["points"]
+
+        self.assertEqual(
+            csv_lines[0],
+            "delay_model,pipeline_stages,clock_period_ps,status,stages,flop_bits,critical_path_ps,stage_delay_ps,verilog",
+        )
+        self.assertEqual(len(csv_lines), 3)
+        self.assertEqual(rows[0]["status"], "ok")
+        self.assertEqual(rows[0]["stages"], 2)
+        self.assertEqual(rows[0]["flop_bits"], 32 + 32 + 1 + 8 * 4)
+        self.assertEqual(rows[0]["critical_path_ps"], 95)
+        self.assertEqual(rows[0]["stage_delay_ps"], 48)
+        self.assertIsNone(rows[0]["clock_period_ps"])
+        self.assertEqual(rows[1]["status"], "failed")
+        self.assertIsNone(rows[1]["flop_bits"])
+        self.assertEqual(rows[1]["error"], "Error: cannot schedule in 1 stage at 10ps")
+
+    def test_qor_report_merges_records_per_top(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            aspect_gates = tmp_path / "a.qor_gates.json"
+            aspect_gates.write_text(json.dumps({"live_nodes": 120, "deepest_path": 9, "fraig_did_converge": True}))
+            explicit_gates = tmp_path / "a_gates.json"
+            explicit_gates.write_text(json.dumps({"live_nodes": 100, "deepest_path": 8}))
+            delay_info = tmp_path / "a.qor_delay_info.txt"
+            delay_info.write_text("# Critical path:\n    210ps (+ 40ps): umul.4\n")
+            other_gates = tmp_path / "b.qor_gates.json"
+            other_gates.write_text(json.dumps({"live_nodes": 7, "deepest_path": 2}))
+            manifest = tmp_path / "manifest.json"
+            manifest.write_text(json.dumps({"records": [
+                {"label": "//pkg:b_ir", "top": "__b__main", "source": "", "delay_model": "",
+                 "gates_json": str(other_gates)},
+                {"label": "//pkg:a_ir", "top": "__a__main", "source": "//pkg:a_gates", "delay_model": "",
+                 "gates_json": str(explicit_gates)},
+                {"label": "//pkg:a_ir", "top": "__a__main", "source": "", "delay_model": "asap7",
+                 "gates_json": str(aspect_gates), "delay_info": str(delay_info)},
+            ]}))
+            csv_path = tmp_path / "qor.csv"
+            json_path = tmp_path / "qor.json"
+
+            exit_code = xls_report.main([
+                "xls_report",
+                "--manifest",
+                str(manifest),
+                "--output_csv",
+                str(csv_path),
+                "--output_json",
+                str(json_path),
+                "qor",
+            ])
+            self.assertEqual(exit_code, 0)
+            csv_lines = csv_path.read_text().splitlines()
+            rows = json.loads(json_path.read_text())["targets"]
+
+        self.assertEqual(csv_lines, [
+            "label,top,gate_count,depth,delay_model,critical_path_ps",
+            "//pkg:a_ir,__a__main,100,8,asap7,210",
+            "//pkg:b_ir,__b__main,7,2,,",
+        ])
+        self.assertEqual(rows[0]["sources"], ["//pkg:a_gates"])
+        self.assertEqual(rows[0]["gate_metrics"], {"live_nodes": 100, "deepest_path": 8})
+
+    def test_qor_check_fails_on_regression_beyond_tolerance(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp_path = Path(tmp)
+            gates = tmp_path / "gates.json"
+            gates.write_text(json.dumps({"live_nodes": 104, "deepest_path": 9}))
+            delay_info = tmp_path / "delay_info.txt"
+            delay_info.write_text("# Critical path:\n    180ps (+ 40ps): umul.4\n")
+            baseline = tmp_path / "baseline.json"
+            baseline.write_text(json.dumps({"metrics": {"live_nodes": 100, "deepest_path": 8, "critical_path_ps": 200}}))
+            check = {
+                "name": "//pkg:qor_test",
+                "baseline": str(baseline),
+                "baseline_source": "baseline.json",
+                "gates_json": str(gates),
+                "delay_info": str(delay_info),
+                "relative_tolerance": {"live_nodes": "0.05"},
+                "absolute_tolerance": {"*": "0"},
+            }
+            manifest = tmp_path / "manifest.json"
+
+            def run(kind: str, tolerances: "dict") -> "tuple":
+                manifest.write_text(json.dumps({"checks": [dict(check, absolute_tolerance = tolerances)]}))
+                stdout = io.StringIO()
+                with contextlib.redirect_stdout(stdout):
+                    exit_code = xls_report.main(["xls_report", "--manifest", str(manifest), kind])
+                return exit_code, stdout.getvalue()
+
+            exit_code, report = run("qor_check", {"*": "0"})
+            self.assertEqual(exit_code, 1)
+            self.assertRegex(report, r"live_nodes\s+100\s+104\s+\+4 \(\+4\.0%\)\s+5\s+ok")
+            self.assertRegex(report, r"deepest_path\s+8\s+9\s+\+1 \(\+12\.5%\)\s+0\s+REGRESSED")
+            self.assertRegex(report, r"critical_path_ps\s+200\s+180\s+-20 \(-10\.0%\)\s+0\s+improved")
+            self.assertIn("QoR regressed in //pkg:qor_test", report)
+
+            exit_code, _ = run("qor_check", {"deepest_path": "1"})
+            self.assertEqual(exit_code, 0)
+
+            with mock.patch.dict(os.environ, {"BUILD_WORKSPACE_DIRECTORY": tmp}, clear = False):
+                exit_code, report = run("qor_baseline", {})
+            self.assertEqual(exit_code, 0)
+            self.assertEqual(report, "updated baseline.json (3 metrics)\n")
+            self.assertEqual(
+                json.loads(baseline.read_text()),
+                {"metrics": {"critical_path_ps": 180, "deepest_path": 9, "live_nodes": 104}},
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@
 load("@bazel_skylib//rules:common_settings.bzl", "BuildSettingInfo")
 load("@bazel_tools//tools/cpp:toolchain_utils.bzl", "find_cpp_toolchain", "use_cpp_toolchain")
 load("@rules_cc//cc:defs.bzl", "CcInfo", "cc_common")
+load(":env_helpers.bzl", "python_runner_source")
 
 _XLS_TOOLCHAIN_TYPE = "//:toolchain_type"
 _TRI_STATE_VALUES = ["", "true", "false"]
@@ -125,7 +126,7 @@ def _toolchain_with_semantics(artifact_selection, ctx):
         ctx.attr._add_invariant_assertions_flag[BuildSettingInfo].value,
         "@rules_xlsynth//config:add_invariant_assertions",
     )
-    return platform_common.ToolchainInfo(
+    fields = dict(
         artifact_inputs = artifact_selection.artifact_inputs,
         driver = artifact_selection.driver,
         driver_path = artifact_selection.driver_path,
@@ -146,7 +147,24 @@ def _toolchain_with_semantics(artifact_selection, ctx):
         assert_format = ctx.attr._assert_format_flag[BuildSettingInfo].value,
         use_system_verilog = use_system_verilog,
         add_invariant_assertions = add_invariant_assertions,
+        direct_tool_invocation = _validate_tri_state(
+            ctx.attr._direct_tool_invocation_flag[BuildSettingInfo].value,
+            "@rules_xlsynth//config:direct_tool_invocation",
+        ),
+        resource_log = ctx.attr._resource_log_flag[BuildSettingInfo].value,
+        resource_classes = _parse_resource_classes(ctx.attr._resource_classes_flag[BuildSettingInfo].value),
+        concurrency_dir = ctx.attr._concurrency_dir_flag[BuildSettingInfo].value,
+        concurrency_limits = _parse_concurrency_limits(ctx.attr._concurrency_limits_flag[BuildSettingInfo].value),
+    )
+
+    # Rules that do not override any codegen setting share this one TOML
+    # instead of writing an identical file per target.
+    toolchain_toml = ctx.actions.declare_file(ctx.label.name + "_xlsynth_toolchain.toml")
+    ctx.actions.write(
+        output = toolchain_toml,
+        content = _toolchain_toml_content(struct(**fields)),
     )
+    return platform_common.ToolchainInfo(toolchain_toml = toolchain_toml, **fields)
 
 def _xls_toolchain_impl(ctx):
     artifact_selection = _bundle_struct_from_provider(ctx.attr.bundle[XlsArtifactBundleInfo])
@@ -163,6 +181,11 @@ xls_toolchain = rule(
         "_assert_format_flag": attr.label(default = "//config:assert_format"),
         "_use_system_verilog_flag": attr.label(default = "//config:use_system_verilog"),
         "_add_invariant_assertions_flag": attr.label(default = "//config:add_invariant_assertions"),
+        "_direct_tool_invocation_flag": attr.label(default = "//config:direct_tool_invocation"),
+        "_resource_log_flag": attr.label(default = "//config:resource_log"),
+        "_resource_classes_flag": attr.label(default = "//config:resource_classes"),
+        "_concurrency_dir_flag": attr.label(default = "//config:concurrency_dir"),
+        "_concurrency_limits_flag": attr.label(default = "//config:concurrency_limits"),
     },
 )
 
@@ -476,6 +499,11 @@ def _merge_toolchain_with_bundle(toolchain, bundle):
         assert_format = toolchain.assert_format,
         use_system_verilog = toolchain.use_system_verilog,
         add_invariant_assertions = toolchain.add_invariant_assertions,
+        direct_tool_invocation = toolchain.direct_tool_invocation,
+        resource_log = toolchain.resource_log,
+        resource_classes = toolchain.resource_classes,
+        concurrency_dir = toolchain.concurrency_dir,
+        concurrency_limits = toolchain.concurrency_limits,
     )
 
 def require_driver_toolchain(ctx):
@@ -544,7 +572,8 @@ def declare_xls_toolchain_toml(
       array_index_bounds_checking: Optional array-bounds-checking override.
 
     Returns:
-      The declared toolchain TOML file.
+      The toolchain's shared TOML file when nothing is overridden, otherwise a
+      TOML file declared for this target.
     """
     resolved_toolchain = require_tools_toolchain(ctx) if toolchain == None else toolchain
 
@@ -553,16 +582,54 @@ def declare_xls_toolchain_toml(
     resolved_gate_format = resolved_toolchain.gate_format if gate_format == None else gate_format
     resolved_assert_format = resolved_toolchain.assert_format if assert_format == None else assert_format
 
+    shared_toml = getattr(resolved_toolchain, "toolchain_toml", None)
+    if (shared_toml != None and
+        resolved_use_system_verilog == resolved_toolchain.use_system_verilog and
+        resolved_add_invariant_assertions == resolved_toolchain.add_invariant_assertions and
+        resolved_gate_format == resolved_toolchain.gate_format and
+        resolved_assert_format == resolved_toolchain.assert_format and
+        not array_index_bounds_checking):
+        return shared_toml
+
+    toolchain_toml = ctx.actions.declare_file("{}_{}.toml".format(ctx.label.name, name))
+    ctx.actions.write(
+        output = toolchain_toml,
+        content = _toolchain_toml_content(
+            resolved_toolchain,
+            gate_format = resolved_gate_format,
+            assert_format = resolved_assert_format,
+            use_system_verilog = resolved_use_system_verilog,
+            add_invariant_assertions = resolved_add_invariant_assertions,
+            array_index_bounds_checking = array_index_bounds_checking,
+        ),
+    )
+    return toolchain_toml
+
+def _toolchain_toml_content(
+        resolved_toolchain,
+        *,
+        gate_format = None,
+        assert_format = None,
+        use_system_verilog = None,
+        add_invariant_assertions = None,
+        array_index_bounds_checking = ""):
+    resolved_gate_format = resolved_toolchain.gate_format if gate_format == None else gate_format
+    resolved_assert_format = resolved_toolchain.assert_format if assert_format == None else assert_format
+    resolved_use_system_verilog = resolved_toolchain.use_system_verilog if use_system_verilog == None else use_system_verilog
+    resolved_add_invariant_assertions = resolved_toolchain.add_invariant_assertions if add_invariant_assertions == None else add_invariant_assertions
+
     lines = [
         "[toolchain]",
         "tool_path = {}".format(_toml_quote(resolved_toolchain.tools_path)),
+    ]
+    lines.extend([
         "",
         "[toolchain.dslx]",
         "dslx_stdlib_path = {}".format(_toml_quote(resolved_toolchain.dslx_stdlib_path)),
         "dslx_path = {}".format(_toml_array(resolved_toolchain.dslx_path)),
         "enable_warnings = {}".format(_toml_array(resolved_toolchain.enable_warnings)),
         "disable_warnings = {}".format(_toml_array(resolved_toolchain.disable_warnings)),
-    ]
+    ])
     lines.extend([
         "",
         "[toolchain.codegen]",
@@ -577,13 +644,7 @@ def declare_xls_toolchain_toml(
         lines.append("add_invariant_assertions = {}".format(resolved_add_invariant_assertions))
     if array_index_bounds_checking:
         lines.append("array_index_bounds_checking = {}".format(array_index_bounds_checking))
-
-    toolchain_toml = ctx.actions.declare_file("{}_{}.toml".format(ctx.label.name, name))
-    ctx.actions.write(
-        output = toolchain_toml,
-        content = "\n".join(lines) + "\n",
-    )
-    return toolchain_toml
+    return "\n".join(lines) + "\n"
 
 def get_toolchain_artifact_inputs(toolchain):
     return getattr(toolchain, "artifact_inputs", [])
@@ -627,6 +688,542 @@ def get_tool_artifact_inputs(toolchain, tool_name):
         return get_toolchain_artifact_inputs(toolchain)
     return [tool_input] + _bundle_runtime_inputs(toolchain)
 
+# Mirrors `_TOOL_CONFIG` in env_helpers.py so direct invocations see exactly the
+# flags the runner would derive from the toolchain TOML.
+_TOOL_BASE_FLAGS = {
+    "dslx_fmt": [],
+    "dslx_interpreter_main": ["--compare=jit", "--alsologtostderr"],
+    "prove_quickcheck_main": ["--alsologtostderr"],
+    "typecheck_main": [],
+}
+
+_TOOLS_WITH_DSLX_CONFIG = [
+    "dslx_interpreter_main",
+    "prove_quickcheck_main",
+    "typecheck_main",
+]
+
+def get_tool_flags(toolchain, tool_name):
+    """Returns the toolchain-derived flags the runner adds for an XLS tool.
+
+    Args:
+      toolchain: The selected XLS toolchain.
+      tool_name: The XLS tool binary name.
+
+    Returns:
+      The list of flags to place ahead of the tool's own arguments.
+    """
+    if tool_name not in _TOOL_BASE_FLAGS:
+        return []
+    flags = []
+    if tool_name in _TOOLS_WITH_DSLX_CONFIG:
+        flags.append("--dslx_stdlib_path={}".format(toolchain.dslx_stdlib_path))
+    flags.extend(_TOOL_BASE_FLAGS[tool_name])
+    if tool_name in _TOOLS_WITH_DSLX_CONFIG:
+        for setting_name, separator in [
+            ("dslx_path", ":"),
+            ("enable_warnings", ","),
+            ("disable_warnings", ","),
+        ]:
+            values = getattr(toolchain, setting_name)
+            if values:
+                flags.append("--{}={}".format(setting_name, separator.join(values)))
+    return flags
+
+def _direct_invocation_env(toolchain):
+    env = {}
+    if toolchain.runtime_library_path:
+        # The exec platform is not known here; each loader ignores the other's variable.
+        env["LD_LIBRARY_PATH"] = toolchain.runtime_library_path
+        env["DYLD_LIBRARY_PATH"] = toolchain.runtime_library_path
+    return env
+
+def _run_direct(ctx, *, executable, arguments, inputs, outputs, env, mnemonic, stdout, progress_message, resource_set):
+    if stdout == None:
+        ctx.actions.run(
+            inputs = inputs,
+            outputs = outputs,
+            executable = executable,
+            arguments = arguments,
+            env = env,
+            mnemonic = mnemonic,
+            progress_message = progress_message,
+            resource_set = resource_set,
+            use_default_shell_env = False,
+        )
+        return
+
+    # Actions cannot redirect stdout themselves; a shell `exec` is still far
+    # cheaper than starting the Python runner.
+    executable_path = executable if type(executable) == "string" else executable.path
+    ctx.actions.run_shell(
+        inputs = inputs,
+        outputs = outputs,
+        tools = [] if type(executable) == "string" else [executable],
+        command = 'out="$1"; shift; exec "$@" > "$out"',
+        arguments = [stdout.path, executable_path] + arguments,
+        env = env,
+        mnemonic = mnemonic,
+        progress_message = progress_message,
+        resource_set = resource_set,
+        use_default_shell_env = False,
+    )
+
+def _use_direct_invocation(toolchain, name):
+    # Tools under a host-wide concurrency limit always go through the runner,
+    # which holds their token, and so does `ir2gates`, whose metrics JSON the
+    # runner annotates with the fraig status.
+    if name == "ir2gates" or _concurrency_pool(toolchain, name):
+        return False
+    return getattr(toolchain, "direct_tool_invocation", "") == "true"
+
+# Mirrors `_TOKEN_POOLS` in env_helpers.py: the tools and driver subcommands
+# whose invocations draw from a host-wide token pool, and the pool each uses.
+_CONCURRENCY_POOLS = {
+    "check_ir_equivalence_main": "check_ir_equivalence_main",
+    "ir-equiv": "check_ir_equivalence_main",
+    "ir2gates": "ir2gates",
+    "prove_quickcheck_main": "prove_quickcheck_main",
+}
+
+def _parse_concurrency_limits(value):
+    limits = {}
+    pools = sorted({pool: None for pool in _CONCURRENCY_POOLS.values()}.keys())
+    for entry in _split_nonempty(value, ","):
+        pool, separator, limit = entry.partition("=")
+        pool = pool.strip()
+        limit = limit.strip()
+        if not separator or pool not in pools or not limit.isdigit() or int(limit) <= 0:
+            fail("@rules_xlsynth//config:concurrency_limits entries must be POOL=N with N > 0 and POOL one of {}, got {}".format(
+                ", ".join(pools),
+                repr(entry),
+            ))
+        limits[pool] = int(limit)
+    return limits
+
+def _concurrency_pool(toolchain, name):
+    pool = _CONCURRENCY_POOLS.get(name, "")
+    if not pool or not getattr(toolchain, "concurrency_dir", ""):
+        return ""
+    return pool if pool in getattr(toolchain, "concurrency_limits", {}) else ""
+
+# The runner speaks Bazel's JSON persistent-worker protocol, so one long-lived
+# runner per mnemonic serves every request instead of a fresh interpreter that
+# re-parses the toolchain TOML for each action.
+_RUNNER_EXECUTION_REQUIREMENTS = {
+    "requires-worker-protocol": "json",
+    "supports-multiplex-workers": "1",
+    "supports-workers": "1",
+}
+
+# Local resource estimates for heavy actions. Bazel only accepts top-level
+# functions as `resource_set` callbacks, so each class is one function. The
+# callback sees the action's input count, not input bytes, and most heavy
+# actions read a single IR file, so every class is a flat estimate; a design
+# that needs more overrides its class.
+def _small_resources(_os, _inputs_size):
+    return {"cpu": 1, "memory": 1024}
+
+def _medium_resources(_os, _inputs_size):
+    return {"cpu": 1, "memory": 4096}
+
+def _large_resources(_os, _inputs_size):
+    return {"cpu": 1, "memory": 16384}
+
+def _parallel_resources(_os, _inputs_size):
+    return {"cpu": 4, "memory": 16384}
+
+def _fanout_resources(_os, _inputs_size):
+    return {"cpu": 4, "memory": 1024}
+
+_RESOURCE_SETS = {
+    "fanout": _fanout_resources,
+    "small": _small_resources,
+    "medium": _medium_resources,
+    "large": _large_resources,
+    "parallel": _parallel_resources,
+}
+
+# CPUs a test of each class reserves through `cpu:N`; test actions take no
+# `resource_set`.
+_RESOURCE_CLASS_CPUS = {
+    "fanout": 4,
+    "small": 1,
+    "medium": 1,
+    "large": 1,
+    "parallel": 4,
+}
+
+RESOURCE_CLASSES = ["default"] + sorted(_RESOURCE_SETS.keys())
+
+# Classes for mnemonics that need more than Bazel's one CPU and 250 MB
+# default. `@rules_xlsynth//config:resource_classes` overrides these per
+# mnemonic, and a rule's `resource_class` overrides both.
+_DEFAULT_RESOURCE_CLASSES = {
+    "DSLX2PIPELINE": "medium",
+    "DSLXFMTBATCH": "fanout",
+    "DSLXSTITCHPIPELINE": "medium",
+    "IR2GATES": "large",
+    "IR2OPT": "medium",
+    "IR2PIPELINE": "medium",
+    "IR2PIPELINESEARCH": "parallel",
+}
+
+def _parse_resource_classes(value):
+    classes = {}
+    for entry in _split_nonempty(value, ","):
+        mnemonic, separator, resource_class = entry.partition("=")
+        if not separator or resource_class not in RESOURCE_CLASSES:
+            fail("@rules_xlsynth//config:resource_classes entries must be MNEMONIC=<one of {}>, got {}".format(
+                ", ".join(RESOURCE_CLASSES),
+                repr(entry),
+            ))
+        classes[mnemonic.strip()] = resource_class
+    return classes
+
+def resource_class_attr():
+    """Returns the `resource_class` attribute for rules that run heavy XLS tools."""
+    return attr.string(
+        doc = "Local resource estimate for this target's XLS actions: one of {}. Empty uses the toolchain's class for each action mnemonic.".format(", ".join(RESOURCE_CLASSES)),
+        default = "",
+        values = [""] + RESOURCE_CLASSES,
+    )
+
+def _resource_class(ctx, toolchain, mnemonic):
+    resource_class = getattr(ctx.attr, "resource_class", "")
+    if resource_class:
+        return resource_class
+    toolchain_classes = getattr(toolchain, "resource_classes", {})
+    if mnemonic in toolchain_classes:
+        return toolchain_classes[mnemonic]
+    return _DEFAULT_RESOURCE_CLASSES.get(mnemonic, "default")
+
+def _resource_set(ctx, toolchain, mnemonic):
+    return _RESOURCE_SETS.get(_resource_class(ctx, toolchain, mnemonic))
+
+def resource_class_cpus(ctx, toolchain, mnemonic):
+    """Returns the CPUs the resource class of `mnemonic` reserves.
+
+    Actions that fan out into a process pool size the pool with this, so they
+    never run more processes than the scheduler accounted for.
+    """
+    return _RESOURCE_CLASS_CPUS.get(_resource_class(ctx, toolchain, mnemonic), 1)
+
+def test_execution_info(ctx, toolchain, mnemonic, minimum_cpus = 1):
+    """Returns the `testing.ExecutionInfo` that reserves CPUs for an XLS test.
+
+    Args:
+      ctx: Rule context of the test rule.
+      toolchain: The selected XLS toolchain.
+      mnemonic: Mnemonic whose toolchain resource class applies to the test.
+      minimum_cpus: CPUs the test needs regardless of its class, such as its
+        number of parallel jobs.
+
+    Returns:
+      A `testing.ExecutionInfo` requiring `cpu:N`, or None for one CPU.
+    """
+    cpus = max(minimum_cpus, _RESOURCE_CLASS_CPUS.get(_resource_class(ctx, toolchain, mnemonic), 1))
+    if cpus <= 1:
+        return None
+    return testing.ExecutionInfo({"cpu:{}".format(cpus): ""})
+
+def runner_setting_arguments(ctx, toolchain, name):
+    """Returns the runner flags for settings that never reach the driver TOML.
+
+    Resource logging and host-wide token pools only concern the runner. Each
+    flag appears only when its setting is on, so default action keys do not
+    depend on the target name.
+
+    Args:
+      ctx: Rule context.
+      toolchain: The selected XLS toolchain.
+      name: Tool or driver subcommand the runner launches.
+
+    Returns:
+      A list of runner arguments.
+    """
+    arguments = []
+    resource_log = getattr(toolchain, "resource_log", "")
+    if resource_log:
+        arguments.extend(["--resource_log", resource_log, "--label", str(ctx.label)])
+    pool = _concurrency_pool(toolchain, name)
+    if pool:
+        arguments.extend([
+            "--concurrency_dir",
+            toolchain.concurrency_dir,
+            "--concurrency_limit",
+            str(toolchain.concurrency_limits[pool]),
+        ])
+    return arguments
+
+def _run_xls_runner(ctx, *, runner, arguments, inputs, outputs, mnemonic, progress_message, dslx_main = None, dslx_srcs = None, resource_set = None):
+    args = ctx.actions.args()
+    args.add(arguments[0])
+    unused_inputs_list = None
+    if dslx_main != None:
+        # The runner scans imports from `dslx_main` and lists the DSLX sources
+        # it never reaches, so edits to unrelated modules do not rerun this
+        # action.
+        unused_inputs_list = ctx.actions.declare_file("{}_{}.unused_inputs".format(ctx.label.name, mnemonic.lower()))
+        outputs = outputs + [unused_inputs_list]
+        args.add("--unused_inputs_list", unused_inputs_list)
+        args.add("--dslx_main", dslx_main)
+        args.add_all(dslx_srcs, before_each = "--dslx_src")
+    args.add_all(arguments[1:])
+
+    # Workers require the request arguments to arrive through a flagfile; the
+    # runner expands it itself when the action does not run in a worker.
+    args.use_param_file("@%s", use_always = True)
+    args.set_param_file_format("multiline")
+
+    # The interpreter flags go on the command line rather than in the
+    # runner's shebang, because `env -S` is missing from busybox and older
+    # coreutils. They precede the flagfile, so workers receive them as
+    # startup arguments.
+    ctx.actions.run(
+        inputs = inputs,
+        outputs = outputs,
+        tools = [runner],
+        executable = "/usr/bin/env",
+        arguments = ["python3", "-I", "-S", runner.path, args],
+        execution_requirements = _RUNNER_EXECUTION_REQUIREMENTS,
+        mnemonic = mnemonic,
+        progress_message = progress_message,
+        resource_set = resource_set,
+        unused_inputs_list = unused_inputs_list,
+        use_default_shell_env = False,
+    )
+
+def run_xls_driver_action(
+        ctx,
+        *,
+        runner,
+        toolchain,
+        toolchain_file,
+        subcommand,
+        arguments,
+        inputs,
+        outputs,
+        mnemonic,
+        stdout = None,
+        progress_message = None,
+        dslx_main = None,
+        dslx_srcs = None,
+        runner_flags = []):
+    """Runs an xlsynth-driver subcommand through the runner.
+
+    Args:
+      ctx: Rule context used to register the action.
+      runner: The runner script file.
+      toolchain: The selected XLS toolchain.
+      toolchain_file: The declared toolchain TOML file.
+      subcommand: The driver subcommand to run.
+      arguments: Arguments forwarded to the driver subcommand.
+      inputs: Action inputs (list or depset), including the toolchain file and artifacts.
+      outputs: Action outputs.
+      mnemonic: Action mnemonic; also keys the persistent worker pool.
+      stdout: Optional output file that receives the driver's stdout.
+      progress_message: Optional progress message.
+      dslx_main: Optional entry DSLX file; enables input pruning over `dslx_srcs`.
+      dslx_srcs: DSLX sources among `inputs` that the runner may report unused.
+      runner_flags: Flags for runner features such as `--status_path`. An
+        action that passes any always runs through the runner, even with
+        direct tool invocation enabled.
+    """
+    if _use_direct_invocation(toolchain, subcommand) and not runner_flags:
+        env = _direct_invocation_env(toolchain)
+
+        # Older driver releases still discover external prover tools through
+        # XLSYNTH_TOOLS even when --toolchain is provided.
+        env["XLSYNTH_TOOLS"] = toolchain.tools_path
+        driver = getattr(toolchain, "driver", None)
+        _run_direct(
+            ctx,
+            executable = driver if driver != None else toolchain.driver_path,
+            arguments = ["--toolchain={}".format(toolchain_file.path), subcommand] + arguments,
+            inputs = inputs,
+            outputs = outputs,
+            env = env,
+            mnemonic = mnemonic,
+            stdout = stdout,
+            progress_message = progress_message,
+            resource_set = _resource_set(ctx, toolchain, mnemonic),
+        )
+        return
+    runner_arguments = [
+        "driver",
+        "--driver_path",
+        toolchain.driver_path,
+        "--runtime_library_path",
+        toolchain.runtime_library_path,
+        "--toolchain",
+        toolchain_file.path,
+    ]
+    if stdout != None:
+        runner_arguments.extend(["--stdout_path", stdout.path])
+    runner_arguments.extend(runner_setting_arguments(ctx, toolchain, subcommand))
+    runner_arguments.extend(runner_flags)
+    _run_xls_runner(
+        ctx,
+        runner = runner,
+        arguments = runner_arguments + [subcommand] + arguments,
+        inputs = inputs,
+        outputs = outputs,
+        mnemonic = mnemonic,
+        progress_message = progress_message,
+        dslx_main = dslx_main,
+        dslx_srcs = dslx_srcs,
+        resource_set = _resource_set(ctx, toolchain, mnemonic),
+    )
+
+def run_xls_tool_action(
+        ctx,
+        *,
+        runner,
+        toolchain,
+        toolchain_file,
+        tool,
+        arguments,
+        inputs,
+        outputs,
+        mnemonic,
+        stdout = None,
+        progress_message = None,
+        dslx_main = None,
+        dslx_srcs = None,
+        runner_flags = []):
+    """Runs an XLS tool binary through the runner.
+
+    Args:
+      ctx: Rule context used to register the action.
+      runner: The runner script file.
+      toolchain: The selected XLS toolchain.
+      toolchain_file: The declared toolchain TOML file.
+      tool: The XLS tool binary name.
+      arguments: Arguments forwarded to the tool.
+      inputs: Action inputs (list or depset), including the toolchain file and artifacts.
+      outputs: Action outputs.
+      mnemonic: Action mnemonic; also keys the persistent worker pool.
+      stdout: Optional output file that receives the tool's stdout.
+      progress_message: Optional progress message.
+      dslx_main: Optional entry DSLX file; enables input pruning over `dslx_srcs`.
+      dslx_srcs: DSLX sources among `inputs` that the runner may report unused.
+      runner_flags: Flags for runner features such as batched formatting. An
+        action that passes any always runs through the runner, even with
+        direct tool invocation enabled.
+    """
+    if _use_direct_invocation(toolchain, tool) and not runner_flags:
+        tool_input = _bundle_tool_input(toolchain, tool)
+        _run_direct(
+            ctx,
+            executable = tool_input if tool_input != None else "{}/{}".format(toolchain.tools_path, tool),
+            arguments = get_tool_flags(toolchain, tool) + arguments,
+            inputs = inputs,
+            outputs = outputs,
+            env = _direct_invocation_env(toolchain),
+            mnemonic = mnemonic,
+            stdout = stdout,
+            progress_message = progress_message,
+            resource_set = _resource_set(ctx, toolchain, mnemonic),
+        )
+        return
+    runner_arguments = [
+        "tool",
+        "--toolchain",
+        toolchain_file.path,
+        "--runtime_library_path",
+        toolchain.runtime_library_path,
+    ]
+    if stdout != None:
+        runner_arguments.extend(["--stdout_path", stdout.path])
+    runner_arguments.extend(runner_setting_arguments(ctx, toolchain, tool))
+    runner_arguments.extend(runner_flags)
+    _run_xls_runner(
+        ctx,
+        runner = runner,
+        arguments = runner_arguments + [tool] + arguments,
+        inputs = inputs,
+        outputs = outputs,
+        mnemonic = mnemonic,
+        progress_message = progress_message,
+        dslx_main = dslx_main,
+        dslx_srcs = dslx_srcs,
+        resource_set = _resource_set(ctx, toolchain, mnemonic),
+    )
+
+def run_xls_report_action(ctx, *, report, kind, manifest, inputs, outputs, mnemonic, output_csv = None, output_json = None, progress_message = None):
+    """Summarizes the outputs of other actions with one of `xls_report.py`'s reports.
+
+    Args:
+      ctx: Rule context used to register the action.
+      report: The `xls_report` executable.
+      kind: The report kind, for example `pipeline_sweep`.
+      manifest: JSON file describing the files to summarize.
+      inputs: Action inputs, including `manifest` and every file it names.
+      outputs: Action outputs.
+      mnemonic: Action mnemonic.
+      output_csv: Optional CSV output file.
+      output_json: Optional JSON output file.
+      progress_message: Optional progress message.
+    """
+    arguments = ["--manifest", manifest.path]
+    if output_csv != None:
+        arguments.extend(["--output_csv", output_csv.path])
+    if output_json != None:
+        arguments.extend(["--output_json", output_json.path])
+    ctx.actions.run(
+        inputs = inputs,
+        outputs = outputs,
+        executable = report,
+        arguments = arguments + [kind],
+        mnemonic = mnemonic,
+        progress_message = progress_message,
+        use_default_shell_env = False,
+    )
+
+def _xlsynth_runner_impl(ctx):
+    runner = ctx.actions.declare_file(ctx.label.name + ".py")
+    ctx.actions.write(output = runner, content = python_runner_source(), is_executable = True)
+    return DefaultInfo(files = depset([runner]), executable = runner)
+
+xlsynth_runner = rule(
+    doc = "Materializes the embedded xlsynth runner once for every rule to share.",
+    implementation = _xlsynth_runner_impl,
+    executable = True,
+)
+
+def xlsynth_runner_attr(cfg = "exec"):
+    """Returns the private `_runner` attribute that points rules at the shared runner.
+
+    Args:
+      cfg: "exec" for build actions; test rules that run the runner from their
+        runfiles use "target".
+
+    Returns:
+      An attr.label for the shared runner.
+    """
+    return attr.label(
+        default = "//:xlsynth_runner",
+        executable = True,
+        cfg = cfg,
+    )
+
+def xls_report_attr(cfg = "exec"):
+    """Returns the private `_report` attribute that points rules at `xls_report`.
+
+    Args:
+      cfg: "exec" for build actions; test and `bazel run` rules that run the
+        report from their runfiles use "target".
+
+    Returns:
+      An attr.label for the `xls_report` binary.
+    """
+    return attr.label(
+        default = "//:xls_report",
+        executable = True,
+        cfg = cfg,
+    )
+
 def _patch_dylib_impl(ctx):
     ctx.actions.run_shell(
         inputs = [ctx.file.src],